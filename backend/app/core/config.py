@@ -1,5 +1,7 @@
 import os
 
+from app.core.cpus import available_cpus_int
+
 # Load environment variables from a .env file
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
 SECRET_KEY = os.getenv("SECRET_KEY", "defaultsecretkey")
@@ -9,4 +11,113 @@ REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
 CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY", "your_cloudinary_api_key")
 CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET", "your_cloudinary_api_secret")
 CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME", "your_cloudinary_cloud_name")
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
\ No newline at end of file
+# Every upload goes under this folder, and reconciliation only lists (and deletes orphans in) this folder
+CLOUDINARY_FOLDER = os.getenv("CLOUDINARY_FOLDER", "photoapp")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+# Upload limits (bytes)
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 10 * 1024 * 1024))
+MIN_UPLOAD_SIZE = int(os.getenv("MIN_UPLOAD_SIZE", 1024))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 64 * 1024))
+
+# Storage backend: "cloudinary" in production, "local" for tests and benchmarks
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary")
+STORAGE_MAX_CONNECTIONS = int(os.getenv("STORAGE_MAX_CONNECTIONS", 20))
+STORAGE_MAX_KEEPALIVE = int(os.getenv("STORAGE_MAX_KEEPALIVE", 10))
+STORAGE_MAX_CONCURRENCY = int(os.getenv("STORAGE_MAX_CONCURRENCY", 10))
+STORAGE_TIMEOUT = float(os.getenv("STORAGE_TIMEOUT", 30))
+STORAGE_CONNECT_TIMEOUT = float(os.getenv("STORAGE_CONNECT_TIMEOUT", 5))
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "./storage")
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL", "http://localhost:8000/media")
+
+# Background upload processing
+UPLOAD_STAGING_DIR = os.getenv("UPLOAD_STAGING_DIR", "./staging")
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 4))
+UPLOAD_QUEUE_MAX = int(os.getenv("UPLOAD_QUEUE_MAX", 1000))
+UPLOAD_JOB_MAX_ATTEMPTS = int(os.getenv("UPLOAD_JOB_MAX_ATTEMPTS", 3))
+UPLOAD_JOB_TTL_SECONDS = int(os.getenv("UPLOAD_JOB_TTL_SECONDS", 24 * 60 * 60))
+
+# Password hashing
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", available_cpus_int()))
+PASSWORD_HASH_QUEUE_MAX = int(os.getenv("PASSWORD_HASH_QUEUE_MAX", 64))
+
+# Authenticated principal cache
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+
+# Refresh token storage: "redis" (keys expire on their own) or "sql" (needs the purge job)
+REFRESH_TOKEN_STORE = os.getenv("REFRESH_TOKEN_STORE", "redis")
+REFRESH_TOKEN_PURGE_INTERVAL_SECONDS = int(os.getenv("REFRESH_TOKEN_PURGE_INTERVAL_SECONDS", 60 * 60))
+REFRESH_TOKEN_PURGE_BATCH_SIZE = int(os.getenv("REFRESH_TOKEN_PURGE_BATCH_SIZE", 1000))
+
+# Database connection pool (ignored by SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 30 * 60))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Read replicas (comma-separated URLs): read-only request sessions go round-robin to the healthy ones,
+# except for a user who wrote in the last DB_READ_YOUR_WRITES_SECONDS; everything else uses DATABASE_URL
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", 5))
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", 30))
+DB_REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("DB_REPLICA_CHECK_INTERVAL_SECONDS", 5))
+
+# Batch uploads
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", 50))
+MAX_BATCH_UPLOAD_SIZE = int(os.getenv("MAX_BATCH_UPLOAD_SIZE", 100 * 1024 * 1024))
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", 4))
+
+# Perceptual-hash similarity search
+SIMILARITY_MAX_DISTANCE = int(os.getenv("SIMILARITY_MAX_DISTANCE", 10))
+SIMILARITY_INDEX_MAX_USERS = int(os.getenv("SIMILARITY_INDEX_MAX_USERS", 1000))
+SIMILARITY_INDEX_TTL_SECONDS = int(os.getenv("SIMILARITY_INDEX_TTL_SECONDS", 5 * 60))
+
+# Edit rendering
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", available_cpus_int()))
+RENDER_QUEUE_MAX = int(os.getenv("RENDER_QUEUE_MAX", 32))
+MAX_RENDER_PIXELS = int(os.getenv("MAX_RENDER_PIXELS", 50_000_000))
+MAX_EDIT_OPERATIONS = int(os.getenv("MAX_EDIT_OPERATIONS", 100))
+
+# Render cache: an in-memory LRU in front of a size-capped directory
+RENDER_CACHE_MEMORY_BYTES = int(os.getenv("RENDER_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", "./render_cache")
+RENDER_CACHE_DISK_BYTES = int(os.getenv("RENDER_CACHE_DISK_BYTES", 1024 * 1024 * 1024))
+RENDER_CACHE_MAX_INTERMEDIATE_BYTES = int(os.getenv("RENDER_CACHE_MAX_INTERMEDIATE_BYTES", 16 * 1024 * 1024))
+
+# Image delivery: originals and thumbnails served by GET /images/{id}/content are kept in a size-capped directory
+CONTENT_CACHE_DIR = os.getenv("CONTENT_CACHE_DIR", "./content_cache")
+CONTENT_CACHE_BYTES = int(os.getenv("CONTENT_CACHE_BYTES", 2 * 1024 * 1024 * 1024))
+CONTENT_THUMBNAIL_WIDTHS = [int(width) for width in os.getenv("CONTENT_THUMBNAIL_WIDTHS", "256,1024").split(",") if width.strip()]
+CONTENT_THUMBNAIL_QUALITY = int(os.getenv("CONTENT_THUMBNAIL_QUALITY", 85))
+
+# Edit history
+HISTORY_SNAPSHOT_INTERVAL = int(os.getenv("HISTORY_SNAPSHOT_INTERVAL", 20))
+HISTORY_STREAM_BATCH_SIZE = int(os.getenv("HISTORY_STREAM_BATCH_SIZE", 500))
+
+# Library export: rows fetched per round trip of the server-side cursor
+IMAGE_EXPORT_BATCH_SIZE = int(os.getenv("IMAGE_EXPORT_BATCH_SIZE", 1000))
+
+# Rate limiting: "redis" syncs local token buckets across replicas, "memory" keeps them per process
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "redis")
+RATE_LIMIT_SYNC_INTERVAL_MS = int(os.getenv("RATE_LIMIT_SYNC_INTERVAL_MS", 250))
+
+# Slow-request sampler: off at 0; otherwise requests slower than this are logged with a per-stage breakdown
+SLOW_REQUEST_THRESHOLD_MS = int(os.getenv("SLOW_REQUEST_THRESHOLD_MS", 0))
+
+# Prometheus scrape endpoint: GET /metrics answers 404 unless this is set, and then only to "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Storage reconciliation: objects and rows younger than the grace period are never treated as orphans
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", 500))
+RECONCILE_GRACE_SECONDS = int(os.getenv("RECONCILE_GRACE_SECONDS", 60 * 60))
+
+# Production serving: run `python -m app.migrate` before starting, unless schema creation on startup is enabled
+DB_CREATE_ON_STARTUP = os.getenv("DB_CREATE_ON_STARTUP", "false").lower() == "true"
+UPLOAD_DRAIN_TIMEOUT_SECONDS = float(os.getenv("UPLOAD_DRAIN_TIMEOUT_SECONDS", 20))
+# Each worker process renews a liveness key this often; jobs held by a process whose key expired are re-queued
+UPLOAD_WORKER_HEARTBEAT_SECONDS = float(os.getenv("UPLOAD_WORKER_HEARTBEAT_SECONDS", 10))
+HEALTH_CHECK_TIMEOUT_SECONDS = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", 2))
@@ -0,0 +1,202 @@
+import asyncio
+import functools
+import hashlib
+import io
+import os
+from typing import Awaitable, BinaryIO, Callable, NamedTuple, Optional
+
+from PIL import Image as PILImage
+
+from app.core.config import CONTENT_CACHE_BYTES, CONTENT_CACHE_DIR, CONTENT_THUMBNAIL_QUALITY, CONTENT_THUMBNAIL_WIDTHS
+from app.core.disk_cache import DiskCache
+from app.core.rendering import render_pool
+from app.core.storage import get_storage
+from app.core.uploads import sniff_image_type
+
+
+class CachedFile(NamedTuple):
+    file: BinaryIO  # Open for reading; the caller closes it
+    size: int
+    content_type: str
+
+
+class ContentCache:
+    """
+    Size-capped disk cache of the originals and thumbnails served by GET /images/{id}/content,
+    shared by every server worker through `DiskCache`.
+
+    Entries are keyed by a SHA-256 of the `public_id` and the variant ("original" or a
+    thumbnail width). Public IDs are never reused, so entries never go stale; they age out
+    least recently used first. A miss streams the original from storage into the cache in
+    chunks, so it is never held in memory, and concurrent misses for the same entry in a
+    worker share one fetch. Thumbnails are rendered from the cached original in the render
+    pool, at the fixed CONTENT_THUMBNAIL_WIDTHS only, which keeps the number of variants bounded.
+
+    Files are returned open: an entry evicted while it is being served stays readable
+    until the response is done with it.
+    """
+
+    def __init__(
+        self,
+        disk_dir: str = CONTENT_CACHE_DIR,
+        disk_bytes: int = CONTENT_CACHE_BYTES,
+        thumbnail_widths: list[int] = CONTENT_THUMBNAIL_WIDTHS,
+        thumbnail_quality: int = CONTENT_THUMBNAIL_QUALITY,
+    ):
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self.thumbnail_widths = thumbnail_widths
+        self.thumbnail_quality = thumbnail_quality
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bytes_fetched = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._disk: Optional[DiskCache] = None
+
+    @property
+    def disk(self) -> DiskCache:
+        if self._disk is None:
+            self._disk = DiskCache(self.disk_dir, self.disk_bytes)
+        return self._disk
+
+    @staticmethod
+    def key(public_id: str, width: Optional[int] = None) -> str:
+        """Cache key, and ETag, of an original or of one of its thumbnails."""
+        variant = f"w{width}" if width else "original"
+        return hashlib.sha256(f"{public_id}:{variant}".encode()).hexdigest()
+
+    def _open(self, key: str) -> Optional[CachedFile]:
+        path = self.disk.path(key)
+        if path is None:
+            return None
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            # Evicted by another worker since the lookup
+            return None
+        return self._describe(file)
+
+    @staticmethod
+    def _describe(file: BinaryIO) -> CachedFile:
+        header = os.pread(file.fileno(), 16, 0)
+        return CachedFile(file, os.fstat(file.fileno()).st_size, sniff_image_type(header) or "application/octet-stream")
+
+    async def _get(self, key: str, fill: Callable[[str], Awaitable[None]]) -> CachedFile:
+        waited = False
+        while True:
+            cached = await asyncio.to_thread(self._open, key)
+            if cached is not None:
+                if not waited:
+                    self.hits += 1
+                return cached
+            task = self._inflight.get(key)
+            if task is None:
+                self.misses += 1
+                task = asyncio.create_task(self._fill(key, fill))
+                self._inflight[key] = task
+                task.add_done_callback(functools.partial(self._settled, key))
+            elif not waited:
+                self.coalesced += 1
+            waited = True
+            # The fill belongs to the cache, not to the request that started it: a client going
+            # away cancels only its own wait, and the others still get the entry
+            if not await asyncio.shield(task):
+                # Too large to keep: every requester fetches a private copy instead
+                return await self._fetch_uncached(key, fill)
+
+    async def _fill(self, key: str, fill: Callable[[str], Awaitable[None]]) -> bool:
+        """Write an entry and move it into the cache; False if it was too large to keep."""
+        tmp_path = await asyncio.to_thread(self.disk.temp_path, key)
+        try:
+            await fill(tmp_path)
+            return await asyncio.to_thread(self.disk.put_file, key, tmp_path)
+        finally:
+            await asyncio.to_thread(_remove, tmp_path)
+
+    def _settled(self, key: str, task: asyncio.Task) -> None:
+        del self._inflight[key]
+        # Mark the exception retrieved so it is not logged when every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch_uncached(self, key: str, fill: Callable[[str], Awaitable[None]]) -> CachedFile:
+        tmp_path = await asyncio.to_thread(self.disk.temp_path, key)
+        try:
+            await fill(tmp_path)
+            # Opened, then unlinked: the file lives until the response closes it
+            file = await asyncio.to_thread(open, tmp_path, "rb")
+            return await asyncio.to_thread(self._describe, file)
+        finally:
+            await asyncio.to_thread(_remove, tmp_path)
+
+    async def original(self, public_id: str) -> CachedFile:
+        """
+        Open the cached original of an image, streaming it in from storage on a miss.
+
+        :raises StorageError: If the image cannot be fetched.
+        """
+        async def fill(tmp_path: str) -> None:
+            out = await asyncio.to_thread(open, tmp_path, "wb")
+            try:
+                async for chunk in get_storage().stream_image(public_id):
+                    await asyncio.to_thread(out.write, chunk)
+                    self.bytes_fetched += len(chunk)
+            finally:
+                await asyncio.to_thread(out.close)
+
+        return await self._get(self.key(public_id), fill)
+
+    @staticmethod
+    def _read_source(original: CachedFile, width: int) -> tuple[bytes, list[dict]]:
+        with original.file:
+            source = original.file.read()
+        # Never upscale: a thumbnail wider than the original is the original re-encoded
+        source_width = PILImage.open(io.BytesIO(source)).width
+        return source, [{"op": "resize", "width": width}] if source_width > width else []
+
+    async def thumbnail(self, public_id: str, width: int) -> CachedFile:
+        """
+        Open a cached JPEG thumbnail of an image, rendering it from the original on a miss.
+
+        :param width: One of `thumbnail_widths`.
+        :raises StorageError: If the original cannot be fetched.
+        :raises PIL.UnidentifiedImageError: If the original cannot be decoded.
+        """
+        async def fill(tmp_path: str) -> None:
+            source, operations = await asyncio.to_thread(self._read_source, await self.original(public_id), width)
+            content, _ = await render_pool.render(source, operations, "jpeg", self.thumbnail_quality)
+            await asyncio.to_thread(_write, tmp_path, content)
+
+        return await self._get(self.key(public_id, width), fill)
+
+    def discard(self, public_ids: list[str]) -> None:
+        """Drop the original and every thumbnail of deleted images. Blocks; call it from a thread."""
+        for public_id in public_ids:
+            for width in [None, *self.thumbnail_widths]:
+                self.disk.discard(self.key(public_id, width))
+
+    def stats(self) -> dict:
+        """Hit, miss and eviction counters of this worker, and the usage of the shared directory."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "bytes_fetched": self.bytes_fetched,
+            "disk": self.disk.stats(),
+        }
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _write(path: str, data: bytes) -> None:
+    with open(path, "wb") as out:
+        out.write(data)
+
+
+content_cache = ContentCache()
@@ -0,0 +1,42 @@
+import math
+import os
+
+
+def _cgroup_quota() -> float | None:
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    # cgroup v1: a quota of -1 means unlimited
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as quota_file, open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as period_file:
+            quota, period = int(quota_file.read()), int(period_file.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> float:
+    """
+    CPUs this process may actually use: the container's CPU limit when one is set, otherwise
+    the CPUs it is allowed to run on. `os.cpu_count()` reports every CPU of the host, which
+    oversizes worker pools in a container limited to a fraction of them.
+
+    :return: A possibly fractional CPU count, at least 1.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_quota()
+    if quota is not None:
+        cpus = min(cpus, quota)
+    return max(1.0, float(cpus))
+
+
+def available_cpus_int() -> int:
+    """`available_cpus()` rounded up, for sizing worker pools."""
+    return math.ceil(available_cpus())
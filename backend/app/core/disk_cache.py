@@ -0,0 +1,198 @@
+import fcntl
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+# An eviction scan trims the cache to this fraction of `max_bytes`, so scans stay rare
+LOW_WATER = 0.9
+# Temp files older than this were left by a write that died mid-way; younger ones may be
+# another worker's write in progress
+STALE_TEMP_SECONDS = 60 * 60
+
+
+class DiskCache:
+    """
+    Size-capped directory of blobs keyed by hex digest, evicted least recently used first.
+
+    Files live under `root/<first two characters of the key>/<key>` and are written to a temp
+    file first, so readers never see a partial entry. The directory is shared by every process
+    that opens it, typically one per server worker: the total size and entry count live in
+    `root/.usage` and are only changed under an exclusive `flock` of `root/.lock`, so the cap
+    holds across workers. Hits touch the mtime. When a write takes the total over `max_bytes`,
+    the directory is scanned and the least recently modified files are removed until it is
+    back under LOW_WATER of the cap; the scan also corrects any drift in the recorded usage.
+    Methods block; call them from a thread.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock_path = os.path.join(self.root, ".lock")
+        self._usage_path = os.path.join(self.root, ".usage")
+        # flock does not exclude threads sharing a descriptor, so threads take this first
+        self._thread_lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        with self._locked():
+            self._usage()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    @contextmanager
+    def _locked(self):
+        # Opened per call: a descriptor inherited across a fork would share the lock with the parent
+        with self._thread_lock, open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _usage(self) -> tuple[int, int]:
+        """Recorded (bytes, entries); rebuilt by a scan when missing or unreadable. Hold the lock."""
+        try:
+            with open(self._usage_path) as file:
+                size, entries = (int(field) for field in file.read().split())
+            return size, entries
+        except (FileNotFoundError, ValueError):
+            return self._scan(self.max_bytes)
+
+    def _write_usage(self, size: int, entries: int) -> None:
+        # Replaced whole, so `stats` can read it without taking the lock
+        tmp_path = f"{self._usage_path}.{os.getpid()}"
+        with open(tmp_path, "w") as file:
+            file.write(f"{size} {entries}")
+        os.replace(tmp_path, self._usage_path)
+
+    def _scan(self, target_bytes: int) -> tuple[int, int]:
+        """Measure the directory, evicting the oldest entries beyond `target_bytes`. Hold the lock."""
+        found = []
+        stale_before = time.time() - STALE_TEMP_SECONDS
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                    if entry.name.endswith(".tmp"):
+                        if stat.st_mtime < stale_before:
+                            os.remove(entry.path)
+                        continue
+                except FileNotFoundError:
+                    # Removed since it was listed: a writer finished or a reader dropped it
+                    continue
+                found.append((stat.st_mtime, entry.path, stat.st_size))
+
+        size = sum(entry_size for _, _, entry_size in found)
+        entries = len(found)
+        if size > target_bytes:
+            for _, path, entry_size in sorted(found):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                size -= entry_size
+                entries -= 1
+                self.evictions += 1
+                if size <= target_bytes:
+                    break
+        self._write_usage(size, entries)
+        return size, entries
+
+    def _add(self, key: str, tmp_path: str, size: int) -> None:
+        path = self._path(key)
+        with self._locked():
+            total, entries = self._usage()
+            try:
+                # Another worker may have stored the same entry meanwhile
+                total -= os.stat(path).st_size
+                entries -= 1
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+            total += size
+            entries += 1
+            if total > self.max_bytes:
+                self._scan(int(self.max_bytes * LOW_WATER))
+            else:
+                self._write_usage(total, entries)
+
+    def path(self, key: str) -> Optional[str]:
+        """
+        Return the file holding an entry, marking it recently used.
+
+        :return: The path, or None on a miss. The file may still be evicted afterwards, so open
+            it straight away and handle FileNotFoundError.
+        """
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Read an entry, or return None on a miss."""
+        path = self.path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store an entry, evicting the least recently used ones beyond `max_bytes`."""
+        if len(data) > self.max_bytes:
+            return
+        tmp_path = self.temp_path(key)
+        with open(tmp_path, "wb") as out:
+            out.write(data)
+        self._add(key, tmp_path, len(data))
+
+    def temp_path(self, key: str) -> str:
+        """Return a fresh temp path next to an entry, for writing it in pieces before `put_file`."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{path}.{uuid.uuid4().hex}.tmp"
+
+    def put_file(self, key: str, tmp_path: str) -> bool:
+        """
+        Move a file written at `temp_path(key)` into the cache.
+
+        :return: False, leaving the file where it is, if it is larger than `max_bytes`.
+        """
+        size = os.path.getsize(tmp_path)
+        if size > self.max_bytes:
+            return False
+        self._add(key, tmp_path, size)
+        return True
+
+    def discard(self, key: str) -> None:
+        """Drop an entry, if present."""
+        path = self._path(key)
+        with self._locked():
+            total, entries = self._usage()
+            try:
+                size = os.stat(path).st_size
+                os.remove(path)
+            except FileNotFoundError:
+                return
+            self._write_usage(total - size, entries - 1)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def stats(self) -> dict:
+        """
+        Usage of the whole directory, across processes; evictions are this process's. Does not
+        wait for the lock, so it is cheap enough to call from the event loop.
+        """
+        try:
+            with open(self._usage_path) as file:
+                total, entries = (int(field) for field in file.read().split())
+        except (FileNotFoundError, ValueError):
+            total, entries = 0, 0
+        return {"entries": entries, "bytes": total, "max_bytes": self.max_bytes, "evictions": self.evictions}
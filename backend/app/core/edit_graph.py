@@ -0,0 +1,380 @@
+import io
+import math
+import struct
+from typing import NamedTuple, Optional, Union
+
+import numpy as np
+from PIL import Image as PILImage, ImageFilter, ImageOps
+
+from app.core.config import MAX_RENDER_PIXELS, RENDER_CACHE_MAX_INTERMEDIATE_BYTES
+
+# Output formats a render can be encoded to, mapped to their Pillow format name and MIME type
+OUTPUT_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+# Header of the uncompressed intermediates cached for edit-chain prefixes: magic, then width and height
+RAW_MAGIC = b"PHRAW1"
+_RAW_HEADER = struct.Struct(">II")
+
+_IDENTITY = np.arange(256, dtype=np.float64)
+_CHANNELS = np.arange(3)
+_CURVE_CHANNELS = {"rgb": (0, 1, 2), "r": (0,), "g": (1,), "b": (2,)}
+# Gaussian kernels are negligible beyond three standard deviations
+_KERNEL_REACH = 3
+
+
+class Crop(NamedTuple):
+    box: tuple[int, int, int, int]  # left, top, right, bottom in the step's input pixels
+    pushable: bool = True  # False for the trim left behind a filter, which must stay after it
+
+
+class Resize(NamedTuple):
+    size: tuple[int, int]
+    box: tuple[float, float, float, float]  # Source region resampled into `size`; a crop folded into the resize
+
+
+class Rotate(NamedTuple):
+    angle: float  # Degrees counter-clockwise, in [0, 360)
+    expand: bool
+
+
+class PointOp(NamedTuple):
+    lut: np.ndarray  # 3 x 256 uint8 lookup table, one row per RGB channel
+
+
+class Blur(NamedTuple):
+    radius: float
+
+
+class Sharpen(NamedTuple):
+    radius: float
+    amount: float
+
+
+Step = Union[Crop, Resize, Rotate, PointOp, Blur, Sharpen]
+
+
+def _rotated_size(size: tuple[int, int], angle: float, expand: bool) -> tuple[int, int]:
+    """Output size of `PIL.Image.rotate`, computed the same way Pillow does."""
+    w, h = size
+    if not expand or angle == 180:
+        return size
+    if angle in (90, 270):
+        return h, w
+    radians = -math.radians(angle)
+    a, b = round(math.cos(radians), 15), round(math.sin(radians), 15)
+    c = a * -w / 2 + b * -h / 2 + w / 2
+    f = -b * -w / 2 + a * -h / 2 + h / 2
+    xs = [a * x + b * y + c for x, y in ((0, 0), (w, 0), (w, h), (0, h))]
+    ys = [-b * x + a * y + f for x, y in ((0, 0), (w, 0), (w, h), (0, h))]
+    return math.ceil(max(xs)) - math.floor(min(xs)), math.ceil(max(ys)) - math.floor(min(ys))
+
+
+def output_size(step: Step, size: tuple[int, int]) -> tuple[int, int]:
+    """Size of the image a step produces from an input of `size`."""
+    if isinstance(step, Crop):
+        left, top, right, bottom = step.box
+        return right - left, bottom - top
+    if isinstance(step, Resize):
+        return step.size
+    if isinstance(step, Rotate):
+        return _rotated_size(size, step.angle, step.expand)
+    return size
+
+
+def _lut(values: np.ndarray, channels=(0, 1, 2)) -> PointOp:
+    lut = np.tile(np.arange(256, dtype=np.uint8), (3, 1))
+    lut[list(channels)] = np.clip(np.rint(values), 0, 255).astype(np.uint8)
+    return PointOp(lut)
+
+
+def _step(operation: dict, size: tuple[int, int]) -> Optional[Step]:
+    """Turn one declarative operation into a concrete step for an input of `size`; None if it is a no-op."""
+    width, height = size
+    op = operation["op"]
+    if op == "crop":
+        left, top = min(operation["x"], width), min(operation["y"], height)
+        right = min(operation["x"] + operation["width"], width)
+        bottom = min(operation["y"] + operation["height"], height)
+        if right <= left or bottom <= top:
+            raise ValueError("Crop falls outside the image")
+        return None if (left, top, right, bottom) == (0, 0, width, height) else Crop((left, top, right, bottom))
+    if op == "resize":
+        new_width, new_height = operation.get("width"), operation.get("height")
+        # A missing dimension keeps the aspect ratio
+        new_width = new_width or max(1, round(width * new_height / height))
+        new_height = new_height or max(1, round(height * new_width / width))
+        return None if (new_width, new_height) == size else Resize((new_width, new_height), (0, 0, width, height))
+    if op == "rotate":
+        angle = operation["angle"] % 360.0
+        return Rotate(angle, operation.get("expand", True)) if angle else None
+    if op == "brightness":
+        return _lut(_IDENTITY * operation["factor"])
+    if op == "contrast":
+        return _lut((_IDENTITY - 128) * operation["factor"] + 128)
+    if op == "curves":
+        xs, ys = zip(*sorted(operation["points"]))
+        return _lut(np.interp(_IDENTITY, xs, ys), _CURVE_CHANNELS[operation.get("channel", "rgb")])
+    if op == "blur":
+        return Blur(operation["radius"])
+    if op == "sharpen":
+        return Sharpen(operation.get("radius", 2.0), operation.get("amount", 1.0))
+    raise ValueError(f"Unknown edit operation: {op!r}")
+
+
+def _input_sizes(steps: list[Step], size: tuple[int, int]) -> list[tuple[int, int]]:
+    sizes = []
+    for step in steps:
+        sizes.append(size)
+        size = output_size(step, size)
+    return sizes
+
+
+def _area(size) -> float:
+    return size[0] * size[1]
+
+
+def _shrinks(resize: Resize) -> bool:
+    left, top, right, bottom = resize.box
+    return resize.size[0] <= right - left and resize.size[1] <= bottom - top
+
+
+def _is_linear(point_op: PointOp) -> bool:
+    """
+    Whether every channel of the table is a straight line, up to rounding, with nothing clipped.
+
+    Only such tables commute with resampling: a curve or a clip applied before neighbouring
+    pixels are averaged gives different pixels than the same table applied after.
+    """
+    lut = point_op.lut.astype(np.float64)
+    line = lut[:, :1] + (lut[:, -1:] - lut[:, :1]) * _IDENTITY / 255
+    return bool(np.all(np.abs(lut - line) <= 1))
+
+
+def _rewrite(prev: Step, cur: Step, size: tuple[int, int]) -> Optional[list[Step]]:
+    """
+    One rewrite of the adjacent pair (prev, cur), or None if they are left as they are.
+
+    :param size: The input size of `prev`.
+    """
+    if isinstance(cur, PointOp):
+        if isinstance(prev, PointOp):
+            # Fuse: one table lookup does the work of both
+            return [PointOp(cur.lut[_CHANNELS[:, None], prev.lut])]
+        if isinstance(prev, Resize) and _area(prev.size) > _area(size) and _is_linear(cur):
+            # Linear point ops commute with resampling; run them on the smaller side of an upscale
+            return [cur, prev]
+        return None
+
+    if isinstance(cur, Resize):
+        if isinstance(prev, PointOp) and _area(cur.size) < _area(size) and _is_linear(prev):
+            return [cur, prev]
+        if isinstance(prev, Resize) and _shrinks(prev) and _shrinks(cur):
+            # Two downscales resample like one; a downscale then an upscale (pixelation) must not merge
+            return [Resize(cur.size, _map_box(cur.box, prev))]
+        return None
+
+    if isinstance(cur, Crop) and cur.pushable:
+        if isinstance(prev, PointOp):
+            return [cur, prev]
+        if isinstance(prev, Crop):
+            left, top = prev.box[:2]
+            l, t, r, b = cur.box
+            return [Crop((left + l, top + t, left + r, top + b), prev.pushable)]
+        if isinstance(prev, Resize):
+            # Crop after resize == resize of the matching source region, so only surviving pixels are resampled
+            return [Resize(output_size(cur, prev.size), _map_box(cur.box, prev))]
+        if isinstance(prev, (Blur, Sharpen)):
+            # Filter only the crop plus a margin the kernel can reach, then trim the margin off
+            margin = math.ceil(prev.radius * _KERNEL_REACH) + 1
+            l, t, r, b = cur.box
+            outer = (max(0, l - margin), max(0, t - margin), min(size[0], r + margin), min(size[1], b + margin))
+            if outer == (0, 0, *size):
+                return None
+            inner = (l - outer[0], t - outer[1], r - outer[0], b - outer[1])
+            return [Crop(outer), prev, Crop(inner, pushable=False)]
+    return None
+
+
+def _map_box(box, resize: Resize) -> tuple[float, float, float, float]:
+    """Map a box in a resize's output pixels onto its input pixels."""
+    left, top, right, bottom = resize.box
+    sx = (right - left) / resize.size[0]
+    sy = (bottom - top) / resize.size[1]
+    return left + box[0] * sx, top + box[1] * sy, left + box[2] * sx, top + box[3] * sy
+
+
+class EditGraph:
+    """
+    Declarative edit chain, evaluated lazily.
+
+    Building the graph only records the operations. `plan` resolves them against the source
+    size and rewrites the chain so it touches as few pixels as possible:
+
+    - adjacent point operations (brightness, contrast, curves) are fused into one lookup table,
+      applied in a single vectorised pass;
+    - crops are pushed towards the source, through point operations and resizes, and through
+      blur/sharpen with a margin the size of the kernel;
+    - resizes fold in the crops around them and consecutive downscales, and point operations
+      that are straight lines move to their smaller side.
+
+    `render` then decodes the source (at reduced scale for JPEGs that are downscaled first),
+    runs the plan and encodes the result.
+    """
+
+    def __init__(self, operations: list[dict]):
+        self.operations = operations
+
+    def plan(self, size: tuple[int, int]) -> list[Step]:
+        """
+        Resolve and optimise the chain for a source of `size`.
+
+        :raises ValueError: If an operation is invalid for the image, or the source or an
+            intermediate image would exceed MAX_RENDER_PIXELS.
+        """
+        if _area(size) > MAX_RENDER_PIXELS:
+            raise ValueError("Image is too large to edit")
+        source_size = size
+        steps = []
+        for operation in self.operations:
+            step = _step(operation, size)
+            if step is not None:
+                steps.append(step)
+                size = output_size(step, size)
+                if _area(size) > MAX_RENDER_PIXELS:
+                    raise ValueError("Edited image would be too large")
+
+        changed = True
+        while changed:
+            changed = False
+            sizes = _input_sizes(steps, source_size)
+            for i in range(1, len(steps)):
+                replacement = _rewrite(steps[i - 1], steps[i], sizes[i - 1])
+                if replacement is not None:
+                    steps[i - 1:i + 1] = replacement
+                    changed = True
+                    break
+        return steps
+
+    @staticmethod
+    def open(source: bytes) -> tuple[PILImage.Image, tuple[int, int]]:
+        """
+        Open an encoded image without decoding its pixels.
+
+        :return: The lazily-decoded image and its upright size. EXIF orientations 5-8 are stored
+            transposed, and edits are planned in the frame the user sees.
+        """
+        image = PILImage.open(io.BytesIO(source))
+        orientation = image.getexif().get(ImageOps.ExifTags.Base.Orientation, 1)
+        return image, image.size[::-1] if orientation in (5, 6, 7, 8) else image.size
+
+    @staticmethod
+    def decode(image: PILImage.Image, size: tuple[int, int], steps: list[Step]) -> tuple[PILImage.Image, list[Step]]:
+        """Decode the source, at reduced scale if the plan starts by downscaling a JPEG."""
+        first = steps[0] if steps else None
+        if isinstance(first, Resize) and image.format == "JPEG":
+            left, top, right, bottom = first.box
+            scale = max(first.size[0] / (right - left), first.size[1] / (bottom - top))
+            if scale < 1:
+                image.draft("RGB", tuple(math.ceil(side * scale) for side in image.size))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        if image.size != size and isinstance(first, Resize):
+            fx = image.size[0] / size[0]
+            fy = image.size[1] / size[1]
+            left, top, right, bottom = first.box
+            box = (left * fx, top * fy, right * fx, bottom * fy)
+            # The decoder may already have produced exactly the requested pixels
+            resize = [] if box == (0, 0, *image.size) and first.size == image.size else [Resize(first.size, box)]
+            steps = [*resize, *steps[1:]]
+        return image, steps
+
+    @staticmethod
+    def apply(image: PILImage.Image, step: Step) -> PILImage.Image:
+        """Run one planned step."""
+        if isinstance(step, Crop):
+            return image.crop(step.box)
+        if isinstance(step, Resize):
+            return image.resize(step.size, PILImage.Resampling.LANCZOS, box=step.box, reducing_gap=3.0)
+        if isinstance(step, Rotate):
+            return image.rotate(step.angle, PILImage.Resampling.BICUBIC, expand=step.expand)
+        if isinstance(step, PointOp):
+            return PILImage.fromarray(step.lut[_CHANNELS, np.asarray(image)])
+        if isinstance(step, Blur):
+            return image.filter(ImageFilter.GaussianBlur(step.radius))
+        if isinstance(step, Sharpen):
+            return image.filter(ImageFilter.UnsharpMask(step.radius, round(step.amount * 100), 0))
+        raise TypeError(f"Unknown step: {step!r}")
+
+    def run(self, source: bytes) -> PILImage.Image:
+        """
+        Apply the chain to a source image and return the result undecoded.
+
+        :param source: The original image bytes, or a raw intermediate from `encode_raw`.
+        """
+        if source.startswith(RAW_MAGIC):
+            return self.transform(decode_raw(source))
+        image, size = self.open(source)
+        image, steps = self.decode(image, size, self.plan(size))
+        for step in steps:
+            image = self.apply(image, step)
+        return image
+
+    def transform(self, image: PILImage.Image) -> PILImage.Image:
+        """Apply the chain to an already decoded RGB image."""
+        for step in self.plan(image.size):
+            image = self.apply(image, step)
+        return image
+
+    def render(self, source: bytes, image_format: str = "jpeg", quality: int = 90) -> bytes:
+        """
+        Apply the chain to a source image and encode the result.
+
+        :param source: The original image bytes, or a raw intermediate from `encode_raw`.
+        :param image_format: One of OUTPUT_FORMATS.
+        :param quality: Encoder quality for JPEG and WebP.
+        :return: The encoded result.
+        """
+        return encode(self.run(source), image_format, quality)
+
+
+def encode(image: PILImage.Image, image_format: str = "jpeg", quality: int = 90) -> bytes:
+    """Encode an RGB image to one of OUTPUT_FORMATS."""
+    out = io.BytesIO()
+    if image_format == "png":
+        image.save(out, OUTPUT_FORMATS[image_format][0])
+    else:
+        image.save(out, OUTPUT_FORMATS[image_format][0], quality=quality)
+    return out.getvalue()
+
+
+def encode_raw(image: PILImage.Image) -> bytes:
+    """Serialise an RGB image uncompressed; far cheaper than PNG for short-lived intermediates."""
+    return RAW_MAGIC + _RAW_HEADER.pack(*image.size) + image.tobytes()
+
+
+def decode_raw(data: bytes) -> PILImage.Image:
+    size = _RAW_HEADER.unpack_from(data, len(RAW_MAGIC))
+    return PILImage.frombytes("RGB", size, data[len(RAW_MAGIC) + _RAW_HEADER.size:])
+
+
+def render_edit(
+    source: bytes, operations: list[dict], image_format: str = "jpeg", quality: int = 90, split: int = 0
+) -> tuple[bytes, Optional[bytes]]:
+    """
+    Process-pool entry point: render `operations` applied to `source`.
+
+    :param split: When positive, the chain is run in two halves at this index and the image
+        between them is returned too, so the prefix can be cached and later edits that only
+        change the tail resume from it. Splitting gives up the optimisations across the split.
+    :return: The encoded result, and the raw prefix intermediate (None when not split or when
+        larger than RENDER_CACHE_MAX_INTERMEDIATE_BYTES).
+    """
+    if split <= 0:
+        return EditGraph(operations).render(source, image_format, quality), None
+    image = EditGraph(operations[:split]).run(source)
+    intermediate = encode_raw(image) if image.width * image.height * 3 <= RENDER_CACHE_MAX_INTERMEDIATE_BYTES else None
+    image = EditGraph(operations[split:]).transform(image)
+    return encode(image, image_format, quality), intermediate
@@ -0,0 +1,85 @@
+from typing import BinaryIO, NamedTuple, Optional
+
+import numpy as np
+from PIL import Image as PILImage, UnidentifiedImageError
+
+# pHash works on a HASH_SAMPLE x HASH_SAMPLE grayscale thumbnail and keeps the lowest HASH_SIZE x HASH_SIZE DCT terms
+HASH_SIZE = 8
+HASH_SAMPLE = 32
+# The color histogram buckets each RGB channel into HISTOGRAM_BINS levels
+HISTOGRAM_BINS = 4
+HISTOGRAM_LENGTH = HISTOGRAM_BINS ** 3
+
+
+class ImageFeatures(NamedTuple):
+    phash: int  # 64-bit perceptual hash; near-identical images differ in few bits
+    histogram: bytes  # HISTOGRAM_LENGTH bytes, each the share of pixels in that RGB bucket scaled to 0-255
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so the 2-D transform of `x` is `D @ x @ D.T`."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(HASH_SAMPLE)
+_BIT_WEIGHTS = (1 << np.arange(HASH_SIZE * HASH_SIZE - 1, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+
+def perceptual_hash(gray: np.ndarray) -> int:
+    """
+    pHash of a HASH_SAMPLE x HASH_SAMPLE grayscale image.
+
+    :param gray: 2-D float array of luminance values.
+    :return: 64-bit hash, one bit per low-frequency DCT coefficient above the median.
+    """
+    low = (_DCT @ gray @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term only encodes overall brightness, so it is left out of the median
+    bits = low > np.median(low[1:])
+    return int(np.sum(_BIT_WEIGHTS[bits], dtype=np.uint64))
+
+
+def color_histogram(rgb: np.ndarray) -> bytes:
+    """
+    Coarse RGB histogram, normalised so images of any size compare directly.
+
+    :param rgb: H x W x 3 uint8 array.
+    """
+    levels = rgb.astype(np.intp) // (256 // HISTOGRAM_BINS)
+    buckets = (levels[..., 0] * HISTOGRAM_BINS + levels[..., 1]) * HISTOGRAM_BINS + levels[..., 2]
+    counts = np.bincount(buckets.ravel(), minlength=HISTOGRAM_LENGTH)
+    return np.rint(counts * 255 / counts.sum()).astype(np.uint8).tobytes()
+
+
+def compute_features(file: BinaryIO) -> Optional[ImageFeatures]:
+    """
+    Decode an image and compute its perceptual hash and color histogram.
+
+    JPEGs are decoded at reduced scale via `draft`, which is much cheaper than a full decode
+    for the tiny thumbnails both features need. The file is rewound afterwards.
+
+    :param file: A validated, rewound file-like object.
+    :return: The features, or None if the image cannot be decoded.
+    """
+    try:
+        with PILImage.open(file) as img:
+            img.draft("RGB", (HASH_SAMPLE * 2, HASH_SAMPLE * 2))
+            rgb = img.convert("RGB")
+            rgb.thumbnail((HASH_SAMPLE * 2, HASH_SAMPLE * 2))
+            gray = rgb.convert("L").resize((HASH_SAMPLE, HASH_SAMPLE), PILImage.Resampling.BILINEAR)
+            features = ImageFeatures(
+                perceptual_hash(np.asarray(gray, dtype=np.float64)),
+                color_histogram(np.asarray(rgb)),
+            )
+    except (UnidentifiedImageError, OSError, ValueError):
+        features = None
+    file.seek(0)
+    return features
+
+
+def hash_to_hex(phash: int) -> str:
+    """Fixed-width hex form of a perceptual hash, as stored on `Image.phash`."""
+    return f"{phash:016x}"
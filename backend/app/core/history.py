@@ -0,0 +1,21 @@
+def diff_operations(old: list, new: list) -> dict:
+    """
+    Encode `new` as a splice of `old`: keep a common prefix and suffix and replace the middle.
+
+    Tweaking, inserting or removing one operation stores just that operation, however long the chain.
+
+    :return: `{"prefix": p, "suffix": s, "insert": [...]}`, see `apply_delta`.
+    """
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    return {"prefix": prefix, "suffix": suffix, "insert": new[prefix:len(new) - suffix]}
+
+
+def apply_delta(operations: list, delta: dict) -> list:
+    """Rebuild the chain a delta from `diff_operations` was computed for."""
+    return operations[:delta["prefix"]] + delta["insert"] + operations[len(operations) - delta["suffix"]:]
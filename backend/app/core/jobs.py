@@ -0,0 +1,285 @@
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import uuid
+from datetime import datetime
+from typing import BinaryIO, Optional
+
+from app.core import config
+from app.core.redis_client import get_redis
+from app.core.similarity import similarity_index
+from app.core.storage import StorageError, get_storage
+from app.crud import image as image_crud
+from app.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Staged files live on this host's disk, so each host drains its own queue. Every server
+# process on the host moves the jobs it takes to its own processing list and keeps a liveness
+# key fresh; the lists of processes whose key expired are handed back to the queue.
+QUEUE_KEY = f"photoapp:uploads:{socket.gethostname()}"
+PROCESSING_KEY = f"{QUEUE_KEY}:processing:{{}}"
+ALIVE_KEY = f"{QUEUE_KEY}:alive:{{}}"
+JOB_KEY = "photoapp:job:{}"
+
+
+class QueueFull(Exception):
+    """Raised when the upload queue already holds UPLOAD_QUEUE_MAX jobs."""
+
+
+def stage_upload(file: BinaryIO) -> str:
+    """
+    Copy an uploaded file into the staging directory so it outlives the request.
+
+    :param file: The validated, rewound file-like object.
+    :return: Path of the staged file.
+    """
+    os.makedirs(config.UPLOAD_STAGING_DIR, exist_ok=True)
+    path = os.path.join(config.UPLOAD_STAGING_DIR, uuid.uuid4().hex)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(file, out, config.UPLOAD_CHUNK_SIZE)
+    return path
+
+
+async def enqueue_upload(user_id: int, image_id: int, public_id: str, path: str) -> str:
+    """
+    Record a new upload job and push it onto the queue.
+
+    :return: The job ID clients poll for status.
+    """
+    redis = get_redis()
+    if await redis.llen(QUEUE_KEY) >= config.UPLOAD_QUEUE_MAX:
+        raise QueueFull()
+
+    job_id = uuid.uuid4().hex
+    key = JOB_KEY.format(job_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={
+            "state": "queued",
+            "user_id": user_id,
+            "image_id": image_id,
+            "public_id": public_id,
+            "path": path,
+            "attempts": 0,
+            "created_at": datetime.utcnow().isoformat(),
+        })
+        pipe.expire(key, config.UPLOAD_JOB_TTL_SECONDS)
+        pipe.lpush(QUEUE_KEY, job_id)
+        await pipe.execute()
+    return job_id
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    """Fetch the state of an upload job, or None if it is unknown or expired."""
+    job = await get_redis().hgetall(JOB_KEY.format(job_id))
+    return job or None
+
+
+async def _finish_image(image_id: int, url: str) -> None:
+    async with SessionLocal() as db:
+        await image_crud.mark_image_processed(db, image_id, url)
+
+
+async def _image_processed(image_id: int) -> bool:
+    async with SessionLocal() as db:
+        image = await image_crud.get_image(db, image_id)
+        return bool(image and image.processed)
+
+
+async def _discard_image(user_id: int, image_id: int) -> None:
+    async with SessionLocal() as db:
+        await image_crud.delete_image(db, image_id)
+    similarity_index.remove(user_id, [image_id])
+
+
+class UploadWorkerPool:
+    """
+    Bounded pool of asyncio workers draining the Redis upload queue.
+
+    Each worker moves a job ID to this process's processing list, uploads the staged file to
+    storage under the public ID reserved at request time, flips `Image.processed` and removes
+    the job from the processing list. Failed uploads, and failures to record them, are retried
+    up to UPLOAD_JOB_MAX_ATTEMPTS times before the job is marked failed and its placeholder row
+    is removed.
+    """
+
+    def __init__(self, workers: int = config.UPLOAD_WORKERS, heartbeat: float = config.UPLOAD_WORKER_HEARTBEAT_SECONDS):
+        self.workers = workers
+        self.heartbeat = heartbeat
+        self.tasks: list[asyncio.Task] = []
+        self.draining = False
+        # Workers holding a job; the others are idle in the blocking pop and can be cancelled
+        self._busy: set[asyncio.Task] = set()
+        self._pid = ""
+
+    @property
+    def processing_key(self) -> str:
+        return PROCESSING_KEY.format(self._pid)
+
+    async def start(self) -> None:
+        # Keyed by the pid of the process actually running the pool, not the one that imported it
+        self._pid = str(os.getpid())
+        # Returns at once: waiting for Redis here would hold up startup, and readiness reports it anyway
+        self.tasks = [asyncio.create_task(self._recover_and_spawn())]
+
+    async def _recover_and_spawn(self) -> None:
+        redis = get_redis()
+        while True:
+            try:
+                # A list under our own pid was left by an earlier process that had the same pid
+                await self._requeue(self.processing_key)
+                await redis.set(ALIVE_KEY.format(self._pid), 1, ex=int(self.heartbeat * 3))
+                await self._recover()
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Upload queue unavailable, retrying: %s", exc)
+                await asyncio.sleep(1)
+        # Only once the liveness key is set, or a sibling process could hand a job a worker just took back to the queue
+        self.tasks += [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self._keep_alive()))
+
+    async def _requeue(self, processing_key: str) -> None:
+        redis = get_redis()
+        while await redis.rpoplpush(processing_key, QUEUE_KEY):
+            pass
+
+    async def _recover(self) -> None:
+        """Re-queue the jobs of processes on this host that stopped renewing their liveness key."""
+        redis = get_redis()
+        prefix = PROCESSING_KEY.format("")
+        # Also matches the single per-host list of earlier releases, whose empty pid is never alive
+        async for key in redis.scan_iter(match=f"{QUEUE_KEY}:processing*"):
+            pid = key[len(prefix):]
+            if pid != self._pid and not await redis.exists(ALIVE_KEY.format(pid)):
+                logger.warning("Re-queueing the upload jobs left in %s by a stopped process", key)
+                await self._requeue(key)
+
+    async def _keep_alive(self) -> None:
+        redis = get_redis()
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            try:
+                await redis.set(ALIVE_KEY.format(self._pid), 1, ex=int(self.heartbeat * 3))
+                await self._recover()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Upload worker heartbeat failed: %s", exc)
+
+    async def stop(self, drain_timeout: float = config.UPLOAD_DRAIN_TIMEOUT_SECONDS) -> None:
+        """
+        Stop taking jobs and give the uploads in progress up to `drain_timeout` seconds to finish.
+
+        Jobs still running after that are cancelled and stay in this process's processing
+        list, which another process on the host hands back to the queue.
+        """
+        self.draining = True
+        for task in self.tasks:
+            if task not in self._busy:
+                task.cancel()
+        if self.tasks:
+            _, pending = await asyncio.wait(self.tasks, timeout=drain_timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning("Cancelled %d upload jobs still running after %.0f s", len(pending), drain_timeout)
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.draining = False
+        # Let a sibling process hand back the jobs cancelled above without waiting for the key to expire
+        try:
+            await get_redis().delete(ALIVE_KEY.format(self._pid))
+        except Exception as exc:
+            logger.warning("Could not clear the upload worker liveness key: %s", exc)
+
+    async def _run(self) -> None:
+        redis = get_redis()
+        task = asyncio.current_task()
+        while not self.draining:
+            try:
+                job_id = await redis.blmove(QUEUE_KEY, self.processing_key, timeout=5, src="RIGHT", dest="LEFT")
+                if job_id is None:
+                    # Idle; back off briefly in case the Redis server does not honour the block timeout
+                    await asyncio.sleep(0.2)
+                    continue
+                self._busy.add(task)
+                try:
+                    try:
+                        await self._process(job_id)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception:
+                        # Hand the job back rather than leave it in the processing list until the next restart
+                        logger.exception("Upload job %s errored, re-queueing it", job_id)
+                        await redis.lpush(QUEUE_KEY, job_id)
+                    await redis.lrem(self.processing_key, 1, job_id)
+                finally:
+                    self._busy.discard(task)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Upload worker error")
+                await asyncio.sleep(1)
+
+    async def _process(self, job_id: str) -> None:
+        redis = get_redis()
+        key = JOB_KEY.format(job_id)
+        job = await redis.hgetall(key)
+        # Expired, or a duplicate delivery of a job that already settled: running it again could
+        # only undo its outcome
+        if not job or job.get("state") in ("done", "failed"):
+            return
+        attempts = await redis.hincrby(key, "attempts", 1)
+        await redis.hset(key, "state", "processing")
+
+        try:
+            with open(job["path"], "rb") as file:
+                result = await get_storage().upload_image(file, public_id=job["public_id"])
+            # Remembered across attempts, so a job failing later knows the object must be removed
+            await redis.hset(key, "uploaded", 1)
+            job["uploaded"] = "1"
+            await _finish_image(int(job["image_id"]), result["url"])
+        except asyncio.CancelledError:
+            raise
+        except FileNotFoundError as exc:
+            # A duplicate delivery of a job that already finished: the first run removed the staged file
+            if await _image_processed(int(job["image_id"])):
+                await redis.hset(key, "state", "done")
+                return
+            await self._fail(job_id, job, exc)
+        except Exception as exc:
+            # Storage and database errors alike; uploading again under the same public ID is harmless
+            if attempts < config.UPLOAD_JOB_MAX_ATTEMPTS:
+                await redis.hset(key, "state", "queued")
+                await redis.lpush(QUEUE_KEY, job_id)
+                return
+            await self._fail(job_id, job, exc)
+        else:
+            await redis.hset(key, "state", "done")
+
+        try:
+            os.remove(job["path"])
+        except FileNotFoundError:
+            pass
+
+    async def _fail(self, job_id: str, job: dict, exc: Exception) -> None:
+        logger.warning("Upload job %s failed: %s", job_id, exc)
+        try:
+            await _discard_image(int(job["user_id"]), int(job["image_id"]))
+        except Exception:
+            # Still mark the job failed, so clients polling it stop waiting
+            logger.exception("Could not remove the image record of failed upload job %s", job_id)
+        if job.get("uploaded"):
+            try:
+                await get_storage().delete_image(job["public_id"])
+            except Exception:
+                # Left for the reconcile job, which deletes objects no record points to
+                logger.exception("Could not remove the stored object of failed upload job %s", job_id)
+        await get_redis().hset(JOB_KEY.format(job_id), mapping={"state": "failed", "error": "Failed to upload image to storage"})
+
+
+upload_workers = UploadWorkerPool()
@@ -0,0 +1,283 @@
+import contextvars
+import functools
+import hmac
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import anyio.to_thread
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import METRICS_TOKEN, SLOW_REQUEST_THRESHOLD_MS
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response.",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requests being handled.",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds",
+    "Time spent in instrumented stages of request handling (storage calls, hashing, token checks, queries).",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+SLOW_REQUESTS = Counter(
+    "http_slow_requests",
+    "Requests slower than SLOW_REQUEST_THRESHOLD_MS.",
+    ["method", "route"],
+)
+STARTUP_SECONDS = Gauge(
+    "app_startup_seconds",
+    "Cold start of a worker: importing the app, then running its startup hooks.",
+    ["phase"],
+    multiprocess_mode="max",
+)
+UPLOAD_DEDUP_HITS = Counter(
+    "upload_dedup_hits",
+    "Uploads answered with an existing image of the user instead of a new storage upload.",
+)
+UPLOAD_DEDUP_BYTES = Counter(
+    "upload_dedup_bytes_saved",
+    "Bytes of deduplicated uploads that were not stored again.",
+)
+
+# Stage totals of the request being handled, only tracked while the slow-request sampler is on
+_breakdown: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("metrics_breakdown", default=None)
+
+
+def observe(stage: str, seconds: float) -> None:
+    """Record time spent in a stage, both overall and against the current request."""
+    STAGE_LATENCY.labels(stage).observe(seconds)
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        total, count = breakdown.get(stage, (0.0, 0))
+        breakdown[stage] = (total + seconds, count + 1)
+
+
+def record_dedup(size: int) -> None:
+    """Count an upload of `size` bytes that was deduplicated."""
+    UPLOAD_DEDUP_HITS.inc()
+    UPLOAD_DEDUP_BYTES.inc(size)
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block as `stage`; works around awaits as well as blocking code."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def timed(stage: str):
+    """Decorator timing every call of a coroutine function as `stage`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(stage):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_engine(engine) -> None:
+    """
+    Time every statement an engine runs (stage `db.query`) and every session commit,
+    flush included (stage `db.commit`).
+    """
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        observe("db.query", time.perf_counter() - conn.info["query_start"].pop())
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def _on_error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            observe("db.query", time.perf_counter() - starts.pop())
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    session.info["commit_start"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    start = session.info.pop("commit_start", None)
+    if start is not None:
+        observe("db.commit", time.perf_counter() - start)
+
+
+class PoolCollector:
+    """
+    Gauges read at scrape time: saturation of the worker threads, the DB pool and the process
+    pools, and the counters and sizes of the caches.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    @staticmethod
+    def _families() -> tuple:
+        return (
+            GaugeMetricFamily("threadpool_threads", "Worker threads of the sync-route threadpool.", labels=["state"]),
+            GaugeMetricFamily("db_pool_connections", "Connections of the database pool.", labels=["state"]),
+            GaugeMetricFamily("process_pool_tasks", "Tasks of the CPU-bound process pools.", labels=["pool", "state"]),
+            CounterMetricFamily("cache_lookups", "Cache lookups of this worker by outcome.", labels=["cache", "outcome"]),
+            GaugeMetricFamily("cache_bytes", "Size of each cache tier; disk tiers are shared by all workers.", labels=["cache", "tier", "state"]),
+        )
+
+    def describe(self):
+        return self._families()
+
+    def collect(self):
+        threads, connections, workers, lookups, cache_bytes = self._families()
+        # The limiter belongs to the event loop; it is only readable from the loop's thread
+        try:
+            limiter = anyio.to_thread.current_default_thread_limiter()
+            threads.add_metric(["busy"], limiter.borrowed_tokens)
+            threads.add_metric(["limit"], limiter.total_tokens)
+        except RuntimeError:
+            pass
+        yield threads
+
+        pool = self.engine.pool
+        for state in ("checkedout", "checkedin", "overflow", "size"):
+            reading = getattr(pool, state, None)
+            if reading is not None:
+                connections.add_metric([state], reading())
+        yield connections
+
+        # Imported here: both modules pull in the app config and would otherwise import this one early
+        from app.core.rendering import render_pool
+        from app.core.security import password_hasher
+        for name, stats in (("password_hash", password_hasher.stats()), ("render", render_pool.stats())):
+            workers.add_metric([name, "in_flight"], stats["in_flight"])
+            workers.add_metric([name, "queued"], stats["queue_depth"])
+            workers.add_metric([name, "capacity"], stats["capacity"])
+        yield workers
+
+        from app.core.content_cache import content_cache
+        from app.core.render_cache import render_cache
+        render, content = render_cache.stats(), content_cache.stats()
+        for outcome in ("hits", "disk_hits", "misses", "prefix_hits", "coalesced"):
+            lookups.add_metric(["render", outcome], render[outcome])
+        for outcome in ("hits", "misses", "coalesced"):
+            lookups.add_metric(["content", outcome], content[outcome])
+        yield lookups
+        for name, tier, stats in (("render", "memory", render["memory"]), ("render", "disk", render["disk"]), ("content", "disk", content["disk"])):
+            cache_bytes.add_metric([name, tier, "used"], stats["bytes"])
+            cache_bytes.add_metric([name, tier, "capacity"], stats["max_bytes"])
+        yield cache_bytes
+
+
+_pool_collector: Optional[PoolCollector] = None
+
+
+def register_pool_collector(engine) -> None:
+    global _pool_collector
+    _pool_collector = PoolCollector(engine)
+    REGISTRY.register(_pool_collector)
+
+
+def scrape_allowed(authorization: Optional[str]) -> bool:
+    """Whether an Authorization header carries METRICS_TOKEN; always False while no token is configured."""
+    if not METRICS_TOKEN or authorization is None:
+        return False
+    return hmac.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode())
+
+
+def render_metrics() -> bytes:
+    """
+    Current metrics in the Prometheus text format.
+
+    Under a multi-process server with PROMETHEUS_MULTIPROC_DIR set, the histograms of all
+    workers are merged; the saturation gauges always describe the worker serving the scrape.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    if _pool_collector is not None:
+        registry.register(_pool_collector)
+    return generate_latest(registry)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency per route template, plus the time spent
+    receiving the body (stage `request.body`, which includes multipart parsing as the form
+    parser consumes the stream).
+
+    With SLOW_REQUEST_THRESHOLD_MS set, requests slower than the threshold are counted and
+    logged with their per-stage breakdown.
+    """
+
+    def __init__(self, app, threshold_ms: int = SLOW_REQUEST_THRESHOLD_MS):
+        self.app = app
+        self.threshold = threshold_ms / 1000
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        start = time.perf_counter()
+        status = 500
+        body_done = False
+        token = _breakdown.set({}) if self.threshold else None
+
+        async def timed_receive():
+            nonlocal body_done
+            message = await receive()
+            if not body_done and message["type"] == "http.request" and not message.get("more_body", False):
+                body_done = True
+                observe("request.body", time.perf_counter() - start)
+            return message
+
+        async def status_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.labels(method).inc()
+        try:
+            await self.app(scope, timed_receive, status_send)
+        finally:
+            REQUESTS_IN_PROGRESS.labels(method).dec()
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot blow up the series count
+            route = route.path if route is not None else "<unmatched>"
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(elapsed)
+            if token is not None:
+                breakdown = _breakdown.get()
+                _breakdown.reset(token)
+                if elapsed >= self.threshold:
+                    self._sample(method, route, status, elapsed, breakdown)
+
+    @staticmethod
+    def _sample(method: str, route: str, status: int, elapsed: float, breakdown: dict) -> None:
+        SLOW_REQUESTS.labels(method, route).inc()
+        stages = {stage: {"ms": round(total * 1000, 2), "calls": calls} for stage, (total, calls) in breakdown.items()}
+        logger.warning("Slow request %s %s (%s) took %.0f ms: %s", method, route, status, elapsed * 1000, stages)
@@ -0,0 +1,29 @@
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(created_at: datetime, image_id: int) -> str:
+    """
+    Build an opaque cursor pointing just past an image in a newest-first listing.
+
+    :param created_at: Creation time of the last image of the page.
+    :param image_id: ID of the last image of the page.
+    :return: URL-safe cursor string.
+    """
+    raw = json.dumps([created_at.isoformat(), image_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Decode a cursor built by `encode_cursor`.
+
+    :raises ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, image_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(image_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.core.config import PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS
+
+
+class PrincipalCache:
+    """
+    LRU cache of authenticated users keyed by access token.
+
+    An entry lives for at most `ttl` seconds and never past the token's own `exp`, so a cached
+    principal is only served while the token would still validate. Cached users are detached
+    from any session; only their loaded column attributes should be read.
+    """
+
+    def __init__(self, max_size: int = PRINCIPAL_CACHE_SIZE, ttl: int = PRINCIPAL_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._tokens_by_user: dict[int, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        """
+        Return the cached user for a token, or None on a miss or expired entry.
+
+        :param token: The raw JWT access token.
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token: str, user, exp: float) -> None:
+        """
+        Cache a user for a token.
+
+        :param token: The raw JWT access token.
+        :param user: The user the token authenticates, detached from its session.
+        :param exp: The token's expiry as a Unix timestamp.
+        """
+        expires_at = min(exp, time.time() + self.ttl)
+        with self._lock:
+            self._remove(token)
+            self._entries[token] = (expires_at, user)
+            self._tokens_by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_token(self, token: str) -> None:
+        """Drop a single token, e.g. on logout."""
+        with self._lock:
+            self._remove(token)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop every token of a user, e.g. when the user is deleted or changes credentials."""
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, token: str) -> None:
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_user.get(entry[1].id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry[1].id]
+
+
+principal_cache = PrincipalCache()
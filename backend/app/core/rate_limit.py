@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwt
+
+from app.core import config
+from app.core.metrics import span
+from app.core.principal_cache import principal_cache
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "photoapp:ratelimit:"
+
+# Folds each replica's consumption since its last sync into a shared token bucket per key
+# and returns the tokens left. Refill uses the Redis clock, so replica clock skew does not
+# matter. ARGV holds (capacity, tokens per millisecond, consumed) for each key in turn.
+SYNC_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local left = {}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local consumed = tonumber(ARGV[i * 3])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - consumed
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate) + 1000)
+    left[i] = tostring(tokens)
+end
+return left
+"""
+
+
+class _Bucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated", "consumed", "dirty")
+
+    def __init__(self, capacity: int, rate: float, now: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = now
+        self.consumed = 0
+        self.dirty = False
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class RateLimitStore:
+    """
+    Token buckets deciding every request locally, kept in step across replicas through Redis.
+
+    A request only touches an in-process bucket. Every RATE_LIMIT_SYNC_INTERVAL_MS a
+    background task sends the tokens each active bucket consumed since the last sync to Redis
+    in one Lua script call, which applies them to a shared bucket and returns what is left;
+    that replaces the local balance. A key can therefore be over-admitted by at most what the
+    other replicas let through during one sync interval. Shared buckets that went negative
+    stay negative until they refill, so an overshoot is paid back rather than forgotten.
+
+    With RATE_LIMIT_BACKEND=memory, or while Redis is unreachable, the buckets are simply
+    per process; syncing resumes once Redis answers again.
+    """
+
+    def __init__(
+        self,
+        backend: str = config.RATE_LIMIT_BACKEND,
+        sync_interval_ms: int = config.RATE_LIMIT_SYNC_INTERVAL_MS,
+    ):
+        self.backend = backend
+        self.sync_interval = sync_interval_ms / 1000
+        self.allowed = 0
+        self.limited = 0
+        self.syncs = 0
+        self.sync_errors = 0
+        self.degraded = False
+        self._buckets: dict[str, _Bucket] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def hit(self, key: str, times: int, seconds: float) -> float:
+        """
+        Take one token from a bucket.
+
+        :param key: The bucket key (policy and identity).
+        :param times: Bucket capacity.
+        :param seconds: Time for an empty bucket to refill completely.
+        :return: 0 when the request is allowed, otherwise the seconds until a token is available.
+        """
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(times, times / seconds, now)
+        else:
+            bucket.refill(now)
+        bucket.dirty = True
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            bucket.consumed += 1
+            self.allowed += 1
+            return 0
+        self.limited += 1
+        return (1 - bucket.tokens) / bucket.rate
+
+    def _prune(self, now: float) -> None:
+        # A bucket that has refilled completely is indistinguishable from a new one, and any
+        # consumption it has not synced yet has refilled in the shared bucket as well
+        for key, bucket in list(self._buckets.items()):
+            if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.capacity:
+                del self._buckets[key]
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.backend == "redis":
+            # Hand the last interval's consumption to the other replicas
+            try:
+                await self.sync()
+            except Exception:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            self._prune(time.monotonic())
+            if self.backend != "redis":
+                continue
+            try:
+                await self.sync()
+                if self.degraded:
+                    logger.info("Rate limiter reconnected to Redis")
+                    self.degraded = False
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.sync_errors += 1
+                if not self.degraded:
+                    logger.warning("Rate limiter falling back to per-process buckets: %s", exc)
+                    self.degraded = True
+
+    async def sync(self) -> None:
+        """Push local consumption of every bucket used since the last sync to Redis and pull back the shared balance."""
+        batch = [(key, bucket, bucket.consumed) for key, bucket in self._buckets.items() if bucket.dirty]
+        if not batch:
+            return
+        keys, args = [], []
+        for key, bucket, consumed in batch:
+            keys.append(KEY_PREFIX + key)
+            args += [bucket.capacity, bucket.rate / 1000, consumed]
+            bucket.consumed -= consumed
+            bucket.dirty = False
+        try:
+            left = await get_redis().register_script(SYNC_SCRIPT)(keys=keys, args=args)
+        except BaseException:
+            # Nothing reached Redis; keep the consumption for the next attempt
+            for _, bucket, consumed in batch:
+                bucket.consumed += consumed
+                bucket.dirty = True
+            raise
+        now = time.monotonic()
+        for (_, bucket, _), tokens in zip(batch, left):
+            # Requests admitted while the script ran are not in the shared balance yet
+            bucket.tokens = min(bucket.capacity, float(tokens)) - bucket.consumed
+            bucket.updated = now
+        self.syncs += 1
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "degraded": self.degraded,
+            "keys": len(self._buckets),
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "syncs": self.syncs,
+            "sync_errors": self.sync_errors,
+        }
+
+
+rate_limits = RateLimitStore()
+
+
+def _client_identity(request: Request) -> str:
+    """The authenticated user's ID when the request carries a valid access token, else the client IP."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        user = principal_cache.get(token)
+        if user is not None:
+            return f"user:{user.id}"
+        try:
+            with span("jwt.decode"):
+                payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.ALGORITHM])
+            if payload.get("type") == "access" and payload.get("sub") is not None:
+                return f"user:{payload['sub']}"
+        except JWTError:
+            pass
+    forwarded = request.headers.get("X-Forwarded-For")
+    if forwarded:
+        return "ip:" + forwarded.split(",")[0].strip()
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+class RateLimiter:
+    """
+    Route dependency allowing `times` requests per `seconds` to each user.
+
+    Signed-in users are limited by user ID, so one user cannot dodge the limit by switching
+    networks and users behind one NAT do not share it; anonymous requests are limited by
+    client IP. Each route has its own budget unless routes name a shared `bucket`.
+
+    :param times: Requests allowed in a burst.
+    :param seconds: Time over which the full budget refills.
+    :param bucket: Name of a budget shared by every route that uses it.
+    """
+
+    def __init__(self, times: int, seconds: float, bucket: Optional[str] = None):
+        self.times = times
+        self.seconds = seconds
+        self.bucket = bucket
+
+    async def __call__(self, request: Request):
+        if not config.RATE_LIMIT_ENABLED:
+            return
+        policy = self.bucket
+        if policy is None:
+            route = request.scope.get("route")
+            policy = f"{request.method}:{route.path if route else request.url.path}"
+        retry_after = rate_limits.hit(f"{policy}:{_client_identity(request)}", self.times, self.seconds)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too Many Requests",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
@@ -0,0 +1,159 @@
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.core import config
+from app.core.redis_client import get_redis
+from app.core.similarity import similarity_index
+from app.core.storage import get_storage
+from app.crud import edit as edit_crud
+from app.crud import image as image_crud
+from app.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY = "photoapp:reconcile:checkpoint"
+COUNTERS = (
+    "objects_scanned", "objects_orphaned", "objects_deleted",
+    "rows_scanned", "rows_orphaned", "rows_deleted",
+    "skipped_recent", "failed",
+)
+
+
+def _object_created_at(resource: dict) -> Optional[datetime]:
+    try:
+        created_at = datetime.fromisoformat(resource["created_at"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return created_at if created_at.tzinfo else created_at.replace(tzinfo=timezone.utc)
+
+
+async def _save_checkpoint(phase: str, position: str, counts: dict) -> None:
+    await get_redis().hset(CHECKPOINT_KEY, mapping={"phase": phase, "position": position, **counts})
+
+
+async def _reconcile_objects(page: list, cutoff: datetime, counts: dict, dry_run: bool) -> None:
+    """Delete the objects of one storage page that no image record points to."""
+    public_ids = sorted(resource["public_id"] for resource in page)
+    async with SessionLocal() as db:
+        known = await image_crud.get_existing_public_ids(db, public_ids)
+    orphans = []
+    for resource in page:
+        if resource["public_id"] in known:
+            continue
+        # Synchronous uploads store the object just before inserting its row
+        created_at = _object_created_at(resource)
+        if created_at is None or created_at > cutoff:
+            counts["skipped_recent"] += 1
+            continue
+        orphans.append(resource["public_id"])
+
+    counts["objects_scanned"] += len(page)
+    counts["objects_orphaned"] += len(orphans)
+    if orphans and not dry_run:
+        failed = await get_storage().delete_images(orphans)
+        counts["objects_deleted"] += len(orphans) - len(failed)
+        counts["failed"] += len(failed)
+
+
+async def _reconcile_rows(rows: list, cutoff: datetime, pending_cutoff: datetime, counts: dict, dry_run: bool) -> None:
+    """Delete the image records of one chunk whose storage object is gone."""
+    candidates = []
+    for row in rows:
+        # Unprocessed rows may still have an upload job queued; it gives up within the job TTL
+        if row.created_at > (cutoff if row.processed else pending_cutoff):
+            counts["skipped_recent"] += 1
+        else:
+            candidates.append(row)
+    present = await get_storage().find_images([row.public_id for row in candidates]) if candidates else set()
+    orphans = [row for row in candidates if row.public_id not in present]
+
+    counts["rows_scanned"] += len(rows)
+    counts["rows_orphaned"] += len(orphans)
+    if orphans and not dry_run:
+        image_ids = [row.id for row in orphans]
+        async with SessionLocal() as db:
+            counts["rows_deleted"] += await image_crud.delete_images(db, image_ids)
+            await edit_crud.delete_edits_by_images(db, image_ids)
+            await edit_crud.delete_history_by_images(db, image_ids)
+        by_user = defaultdict(list)
+        for row in orphans:
+            by_user[row.user_id].append(row.id)
+        for user_id, user_image_ids in by_user.items():
+            similarity_index.remove(user_id, user_image_ids)
+
+
+async def reconcile(
+    batch_size: int = config.RECONCILE_BATCH_SIZE,
+    grace_seconds: int = config.RECONCILE_GRACE_SECONDS,
+    dry_run: bool = False,
+    restart: bool = False,
+) -> dict:
+    """
+    Bring storage and the `images` table back in line, one batch at a time.
+
+    The first phase pages through the whole storage listing and deletes objects no record
+    points to (left by uploads that failed after storing). The second walks the table in
+    public ID order and deletes records whose object is gone (left by deletes interrupted
+    between storage and the database). Each page or chunk is looked up on the other side with
+    one query or batched storage call, so memory does not grow with the size of either side.
+
+    Progress is checkpointed in Redis after every batch, and a run picks up where the last
+    one stopped unless `restart` is set. Dry runs neither read nor write the checkpoint.
+
+    :param batch_size: Storage page size and table chunk size.
+    :param grace_seconds: Objects and processed rows younger than this are left alone.
+    :param dry_run: Only count the orphans, delete nothing.
+    :param restart: Discard any checkpoint and start a new pass.
+    :return: The counters of the pass (accumulated across resumed runs) and the run's duration.
+    """
+    started = time.perf_counter()
+    redis = get_redis()
+    storage = get_storage()
+    checkpoint = {}
+    if restart and not dry_run:
+        await redis.delete(CHECKPOINT_KEY)
+    elif not dry_run:
+        checkpoint = await redis.hgetall(CHECKPOINT_KEY)
+    phase = checkpoint.get("phase", "objects")
+    position = checkpoint.get("position", "")
+    counts = {name: int(checkpoint.get(name, 0)) for name in COUNTERS}
+    if checkpoint:
+        logger.info("Resuming reconciliation in the %s phase at %r", phase, position)
+
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=grace_seconds)
+    # Database timestamps are naive UTC
+    row_cutoff = cutoff.replace(tzinfo=None)
+    pending_cutoff = (now - timedelta(seconds=max(grace_seconds, config.UPLOAD_JOB_TTL_SECONDS))).replace(tzinfo=None)
+
+    if phase == "objects":
+        cursor = position or None
+        while True:
+            page, cursor = await storage.list_images(cursor, batch_size)
+            await _reconcile_objects(page, cutoff, counts, dry_run)
+            if cursor is None:
+                break
+            if not dry_run:
+                await _save_checkpoint("objects", cursor, counts)
+        phase, position = "rows", ""
+        if not dry_run:
+            await _save_checkpoint(phase, position, counts)
+
+    while True:
+        async with SessionLocal() as db:
+            rows = await image_crud.get_images_by_public_id_page(db, position, batch_size)
+        if not rows:
+            break
+        await _reconcile_rows(rows, row_cutoff, pending_cutoff, counts, dry_run)
+        position = rows[-1].public_id
+        if not dry_run:
+            await _save_checkpoint("rows", position, counts)
+
+    if not dry_run:
+        await redis.delete(CHECKPOINT_KEY)
+    report = {**counts, "dry_run": dry_run, "seconds": round(time.perf_counter() - started, 3)}
+    logger.info("Reconciliation finished: %s", report)
+    return report
@@ -0,0 +1,25 @@
+from typing import Optional
+import redis.asyncio as aioredis
+from app.core.config import REDIS_URL
+
+_redis: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> aioredis.Redis:
+    """
+    Return the process-wide Redis client, creating its connection pool on first use.
+
+    :return: An asyncio Redis client that decodes responses to str.
+    """
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+    return _redis
+
+
+async def close_redis() -> None:
+    """Close the Redis connection pool, if one was created."""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
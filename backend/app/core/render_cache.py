@@ -0,0 +1,177 @@
+import asyncio
+import functools
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from app.core.config import (
+    RENDER_CACHE_MEMORY_BYTES,
+    RENDER_CACHE_DIR,
+    RENDER_CACHE_DISK_BYTES,
+)
+from app.core.disk_cache import DiskCache
+from app.core.rendering import render_pool
+
+# Geometry steps at the end of a chain gain most from being planned together with what comes
+# before them, so chains ending in one are rendered whole rather than split for prefix caching
+_UNSPLIT_TAILS = {"crop", "resize"}
+
+
+class RenderCache:
+    """
+    Content-addressed cache of rendered edits.
+
+    Entries are keyed by a SHA-256 of the source `public_id` and the canonical JSON of the
+    edit operations (plus output format and quality for final renders). Public IDs are never
+    reused, so entries never go stale; they simply age out. Lookups go to a bounded
+    in-memory LRU first, then to a size-capped `DiskCache`. Concurrent requests for the same
+    key share one render.
+
+    When a chain misses, it is rendered in two halves around its last operation and the raw
+    intermediate is cached under the prefix's key. A later chain sharing that prefix (the
+    usual case while a user tweaks the newest adjustment) resumes from the longest cached
+    prefix instead of from the original.
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int = RENDER_CACHE_MEMORY_BYTES,
+        disk_dir: str = RENDER_CACHE_DIR,
+        disk_bytes: int = RENDER_CACHE_DISK_BYTES,
+    ):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self.memory_size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.prefix_hits = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._disk: Optional[DiskCache] = None
+
+    @property
+    def disk(self) -> DiskCache:
+        if self._disk is None:
+            self._disk = DiskCache(self.disk_dir, self.disk_bytes)
+        return self._disk
+
+    @staticmethod
+    def key(public_id: str, operations: list[dict], image_format: Optional[str] = None, quality: Optional[int] = None) -> str:
+        """Cache key of a render; without a format it names the raw intermediate of a prefix."""
+        canonical = json.dumps(
+            {"source": public_id, "operations": operations, "format": image_format, "quality": quality},
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _remember(self, key: str, data: bytes) -> None:
+        # Entries over a quarter of the budget would flush too much; they live on disk only
+        if len(data) > self.memory_bytes // 4:
+            return
+        self.memory_size += len(data) - len(self._memory.pop(key, b""))
+        self._memory[key] = data
+        while self.memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self.memory_size -= len(evicted)
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[bytes]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return data
+        data = await asyncio.to_thread(self.disk.get, key)
+        if data is not None:
+            self._remember(key, data)
+            self.disk_hits += 1
+            return data
+        return None
+
+    async def put(self, key: str, data: bytes) -> None:
+        self._remember(key, data)
+        await asyncio.to_thread(self.disk.put, key, data)
+
+    async def render(
+        self,
+        public_id: str,
+        operations: list[dict],
+        image_format: str,
+        quality: int,
+        load_source: Callable[[], Awaitable[bytes]],
+    ) -> bytes:
+        """
+        Return a render from the cache, rendering it in the process pool on a miss.
+
+        :param public_id: Storage public ID of the source image.
+        :param operations: The edit operations, as stored on `Edit.operations`.
+        :param image_format: Output format, one of `edit_graph.OUTPUT_FORMATS`.
+        :param quality: Encoder quality for JPEG and WebP.
+        :param load_source: Fetches the original bytes; only awaited when no cached prefix applies.
+        """
+        key = self.key(public_id, operations, image_format, quality)
+        cached = await self.get(key)
+        if cached is not None:
+            return cached
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._fill(key, public_id, operations, image_format, quality, load_source))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._settled, key))
+        # The render belongs to the cache, not to the request that started it: a client going away
+        # cancels only its own wait, and the others still get the result
+        return await asyncio.shield(task)
+
+    async def _fill(self, key, public_id, operations, image_format, quality, load_source) -> bytes:
+        content = await self._render(public_id, operations, image_format, quality, load_source)
+        await self.put(key, content)
+        return content
+
+    def _settled(self, key: str, task: asyncio.Task) -> None:
+        del self._inflight[key]
+        # Mark the exception retrieved so it is not logged when every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    async def _render(self, public_id, operations, image_format, quality, load_source) -> bytes:
+        source, start = None, 0
+        for split in range(len(operations) - 1, 0, -1):
+            source = await self.get(self.key(public_id, operations[:split]))
+            if source is not None:
+                self.prefix_hits += 1
+                start = split
+                break
+        if source is None:
+            source = await load_source()
+
+        tail = operations[start:]
+        split = len(tail) - 1 if len(tail) > 1 and tail[-1]["op"] not in _UNSPLIT_TAILS else 0
+        content, intermediate = await render_pool.render(source, tail, image_format, quality, split)
+        if intermediate is not None:
+            await self.put(self.key(public_id, operations[:start + split]), intermediate)
+        return content
+
+    def stats(self) -> dict:
+        """Hit, miss and eviction counters of both tiers."""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "prefix_hits": self.prefix_hits,
+            "coalesced": self.coalesced,
+            "memory": {"entries": len(self._memory), "bytes": self.memory_size, "max_bytes": self.memory_bytes, "evictions": self.evictions},
+            "disk": self.disk.stats(),
+        }
+
+
+render_cache = RenderCache()
@@ -0,0 +1,77 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+from app.core.config import RENDER_WORKERS, RENDER_QUEUE_MAX
+from app.core.edit_graph import render_edit
+
+
+class RenderPool:
+    """
+    Runs edit rendering in a dedicated process pool, off the API event loop and its GIL.
+
+    At most `max_pending` renders may be queued or running at once; beyond that callers are
+    rejected with 503 straight away instead of piling up behind a burst of heavy edits.
+    """
+
+    def __init__(self, workers: int = RENDER_WORKERS, max_pending: int = RENDER_QUEUE_MAX):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        """Spawn the worker processes ahead of the first render."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            for _ in range(self.workers):
+                self._executor.submit(int)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def render(
+        self, source: bytes, operations: list[dict], image_format: str = "jpeg", quality: int = 90, split: int = 0
+    ) -> tuple[bytes, Optional[bytes]]:
+        """
+        Render an edit chain applied to a source image.
+
+        :param source: The original image bytes, or a raw intermediate of a cached prefix.
+        :param operations: The edit operations, as stored on `Edit.operations`.
+        :param image_format: Output format, one of `edit_graph.OUTPUT_FORMATS`.
+        :param quality: Encoder quality for JPEG and WebP.
+        :param split: Index to also return the intermediate at; see `edit_graph.render_edit`.
+        :return: The encoded result and the intermediate, if one was requested and kept.
+        :raises ValueError: If the chain cannot be applied to this image.
+        """
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": "1"},
+            )
+        self.start()
+        self.pending += 1
+        try:
+            return await asyncio.wrap_future(
+                self._executor.submit(render_edit, source, operations, image_format, quality, split)
+            )
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        """Current load of the render pool, for capacity planning."""
+        return {
+            "workers": self.workers,
+            "in_flight": self.pending,
+            "queue_depth": max(0, self.pending - self.workers),
+            "capacity": self.max_pending,
+        }
+
+
+render_pool = RenderPool()
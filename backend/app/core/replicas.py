@@ -0,0 +1,156 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core import config
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+RECENT_WRITE_KEY = "photoapp:recent-write:{}"
+
+
+class ReplicaSet:
+    """
+    Round-robin over the read replicas currently believed healthy.
+
+    A replica leaves the rotation for `retry_seconds` when a connection to it fails, and a
+    background check pings every replica each `check_interval` seconds, taking failing ones
+    out and putting recovered ones back. With no healthy replica, reads go to the primary.
+    """
+
+    def __init__(
+        self,
+        engines: list[AsyncEngine],
+        retry_seconds: float = config.DB_REPLICA_RETRY_SECONDS,
+        check_interval: float = config.DB_REPLICA_CHECK_INTERVAL_SECONDS,
+        check_timeout: float = config.HEALTH_CHECK_TIMEOUT_SECONDS,
+    ):
+        self.engines = engines
+        self.retry_seconds = retry_seconds
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self._down_until = {engine.sync_engine: 0.0 for engine in engines}
+        self._counter = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    def choose(self) -> Optional[AsyncEngine]:
+        """Return the next healthy replica in turn, or None when all of them are down."""
+        now = time.monotonic()
+        healthy = [engine for engine in self.engines if self._down_until[engine.sync_engine] <= now]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def mark_down(self, sync_engine) -> None:
+        if self._down_until.get(sync_engine, 0.0) <= time.monotonic():
+            logger.warning("Read replica %s is unavailable, routing its reads elsewhere", sync_engine.url.render_as_string(hide_password=True))
+        self._down_until[sync_engine] = time.monotonic() + self.retry_seconds
+
+    def mark_up(self, sync_engine) -> None:
+        self._down_until[sync_engine] = 0.0
+
+    async def _ping(self, engine: AsyncEngine) -> None:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def check(self) -> None:
+        """Ping every replica concurrently and update which ones are in rotation."""
+        outcomes = await asyncio.gather(
+            *(asyncio.wait_for(self._ping(engine), self.check_timeout) for engine in self.engines),
+            return_exceptions=True,
+        )
+        for engine, outcome in zip(self.engines, outcomes):
+            if isinstance(outcome, Exception):
+                self.mark_down(engine.sync_engine)
+            else:
+                self.mark_up(engine.sync_engine)
+
+    def start(self) -> None:
+        if self.engines and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Read replica health check failed")
+            await asyncio.sleep(self.check_interval)
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {"url": engine.url.render_as_string(hide_password=True), "healthy": self._down_until[engine.sync_engine] <= now}
+            for engine in self.engines
+        ]
+
+
+class RecentWrites:
+    """
+    Users who committed a write in the last `window` seconds, whose reads stay on the primary.
+
+    Kept in process, for a user's next request landing on the same worker, and in Redis with a
+    TTL, for every other worker and pod. When Redis is unavailable only the local record is
+    consulted: a read may briefly miss a write made through another worker, rather than every
+    read falling back onto the primary.
+    """
+
+    def __init__(self, window: float = config.DB_READ_YOUR_WRITES_SECONDS):
+        self.window = window
+        self.degraded = False
+        self._local: dict[int, float] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def record(self, user_id: int) -> None:
+        """Note a committed write; called from a synchronous session hook, so Redis is updated in the background."""
+        now = time.monotonic()
+        if len(self._local) > 10000:
+            self._local = {uid: until for uid, until in self._local.items() if until > now}
+        self._local[user_id] = now + self.window
+        try:
+            task = asyncio.get_running_loop().create_task(self._publish(user_id))
+        except RuntimeError:
+            return
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _publish(self, user_id: int) -> None:
+        try:
+            await get_redis().set(RECENT_WRITE_KEY.format(user_id), 1, px=int(self.window * 1000))
+            self.degraded = False
+        except Exception as exc:
+            self._degrade(exc)
+
+    async def is_recent(self, user_id: int) -> bool:
+        until = self._local.get(user_id)
+        if until is not None and until > time.monotonic():
+            return True
+        try:
+            recent = bool(await get_redis().exists(RECENT_WRITE_KEY.format(user_id)))
+            self.degraded = False
+            return recent
+        except Exception as exc:
+            self._degrade(exc)
+            return False
+
+    def _degrade(self, exc: Exception) -> None:
+        if not self.degraded:
+            logger.warning("Read-your-writes tracking degraded to this process only: %s", exc)
+        self.degraded = True
+
+
+recent_writes = RecentWrites()
@@ -0,0 +1,102 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.core.metrics import span
+from app.core.config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_MAX
+
+# Hashes made with any other cost are flagged as needing an update, so they get rehashed on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated process pool so hashing never holds the GIL of the API worker.
+
+    At most `max_pending` calls may be queued or running at once; beyond that callers are
+    rejected with 503 straight away instead of piling up behind a login burst.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_QUEUE_MAX):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        """Spawn the worker processes ahead of the first request."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            for _ in range(self.workers):
+                self._executor.submit(int)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _submit(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": "1"},
+            )
+        self.start()
+        self.pending += 1
+        try:
+            return await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password with the current bcrypt cost.
+
+        :param password: The plain-text password.
+        :return: The bcrypt hash.
+        """
+        with span("password.hash"):
+            return await self._submit(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        """
+        Verify a password against its stored hash.
+
+        :param password: The plain-text password.
+        :param hashed_password: The stored bcrypt hash.
+        :return: Tuple of whether the password matches and, if the hash was made with outdated
+            cost parameters, a replacement hash to store (None otherwise).
+        """
+        with span("password.verify"):
+            return await self._submit(_verify_and_update, password, hashed_password)
+
+    def stats(self) -> dict:
+        """Current load of the hashing pool, for capacity planning."""
+        return {
+            "workers": self.workers,
+            "in_flight": self.pending,
+            "queue_depth": max(0, self.pending - self.workers),
+            "capacity": self.max_pending,
+        }
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,139 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import SIMILARITY_INDEX_MAX_USERS, SIMILARITY_INDEX_TTL_SECONDS
+from app.core.features import HISTOGRAM_LENGTH
+from app.models.image import Image
+
+
+class _UserIndex:
+    """
+    Packed perceptual hashes and histograms of one user's images in growable NumPy arrays.
+
+    Adds append in amortised O(1) and removals swap the last row into the hole, so the live
+    rows always stay contiguous and a query is a single vectorised XOR + popcount over them.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.hashes = np.empty(capacity, dtype=np.uint64)
+        self.histograms = np.empty((capacity, HISTOGRAM_LENGTH), dtype=np.uint8)
+        self.size = 0
+        self.positions: dict[int, int] = {}
+        self.loaded_at = time.monotonic()
+
+    def add(self, image_id: int, phash: int, histogram: bytes) -> None:
+        if image_id in self.positions:
+            self.remove(image_id)
+        if self.size == len(self.ids):
+            capacity = len(self.ids) * 2
+            self.ids = np.resize(self.ids, capacity)
+            self.hashes = np.resize(self.hashes, capacity)
+            self.histograms = np.resize(self.histograms, (capacity, HISTOGRAM_LENGTH))
+        row = self.size
+        self.ids[row] = image_id
+        self.hashes[row] = phash
+        self.histograms[row] = np.frombuffer(histogram, dtype=np.uint8)
+        self.positions[image_id] = row
+        self.size += 1
+
+    def remove(self, image_id: int) -> None:
+        row = self.positions.pop(image_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            self.ids[row] = self.ids[last]
+            self.hashes[row] = self.hashes[last]
+            self.histograms[row] = self.histograms[last]
+            self.positions[int(self.ids[row])] = row
+        self.size = last
+
+    def search(self, phash: int, histogram: Optional[bytes], max_distance: int, limit: int) -> list[tuple[int, int, float]]:
+        distances = np.bitwise_count(self.hashes[:self.size] ^ np.uint64(phash))
+        rows = np.flatnonzero(distances <= max_distance)
+        if len(rows) > limit:
+            # Only rows tied with or closer than the limit-th best hash can make the cut
+            cutoff = np.partition(distances[rows], limit - 1)[limit - 1]
+            rows = rows[distances[rows] <= cutoff]
+        if histogram is not None and len(rows):
+            # L1 distance between normalised histograms, scaled to 0 (same colors) .. 1 (disjoint colors)
+            query = np.frombuffer(histogram, dtype=np.uint8).astype(np.int16)
+            color = np.abs(self.histograms[rows].astype(np.int16) - query).sum(axis=1) / 510
+        else:
+            color = np.zeros(len(rows))
+        # Closest hashes first, color distance breaks ties
+        order = np.lexsort((color, distances[rows]))[:limit]
+        return [(int(self.ids[rows[i]]), int(distances[rows[i]]), float(color[i])) for i in order]
+
+
+class SimilarityIndex:
+    """
+    In-memory, per-user index of perceptual hashes for near-duplicate search.
+
+    A user's index is loaded from the database on their first search and then kept current by
+    `add` / `remove` calls from the upload and delete paths. Users are evicted LRU beyond
+    `max_users`, and an index older than `ttl` seconds is reloaded so changes made by other
+    worker processes are eventually picked up. Updates for users not loaded are ignored;
+    their next search loads fresh rows anyway.
+    """
+
+    def __init__(self, max_users: int = SIMILARITY_INDEX_MAX_USERS, ttl: int = SIMILARITY_INDEX_TTL_SECONDS):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._users: OrderedDict[int, _UserIndex] = OrderedDict()
+
+    async def _load(self, db: AsyncSession, user_id: int) -> _UserIndex:
+        index = self._users.get(user_id)
+        if index is not None and time.monotonic() - index.loaded_at < self.ttl:
+            self._users.move_to_end(user_id)
+            return index
+
+        rows = (await db.execute(
+            select(Image.id, Image.phash, Image.color_histogram)
+            .where(Image.user_id == user_id, Image.phash.is_not(None))
+        )).all()
+        index = _UserIndex(capacity=max(64, len(rows)))
+        for image_id, phash, histogram in rows:
+            index.add(image_id, int(phash, 16), histogram)
+
+        self._users[user_id] = index
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return index
+
+    def add(self, image: Image) -> None:
+        """Index a newly stored image, if its owner's index is loaded and it has features."""
+        index = self._users.get(image.user_id)
+        if index is not None and image.phash is not None:
+            index.add(image.id, int(image.phash, 16), image.color_histogram)
+
+    def remove(self, user_id: int, image_ids: list[int]) -> None:
+        """Drop deleted images from their owner's index."""
+        index = self._users.get(user_id)
+        if index is not None:
+            for image_id in image_ids:
+                index.remove(image_id)
+
+    async def search(self, db: AsyncSession, image: Image, max_distance: int, limit: int) -> list[tuple[int, int, float]]:
+        """
+        Find the owner's images whose perceptual hash is within `max_distance` bits of `image`'s.
+
+        :return: Up to `limit` tuples of (image ID, Hamming distance, color distance), closest
+            first, excluding `image` itself.
+        """
+        index = await self._load(db, image.user_id)
+        matches = index.search(int(image.phash, 16), image.color_histogram, max_distance, limit + 1)
+        return [match for match in matches if match[0] != image.id][:limit]
+
+    def clear(self) -> None:
+        self._users.clear()
+
+
+similarity_index = SimilarityIndex()
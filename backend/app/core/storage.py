@@ -0,0 +1,408 @@
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import AsyncIterator, BinaryIO, Optional
+
+import httpx
+
+from app.core import config
+from app.core.metrics import span, timed
+
+
+class StorageError(Exception):
+    """Raised when the storage backend fails to complete an operation."""
+
+
+class StorageBackend(ABC):
+    """Async interface every image storage backend implements."""
+
+    @abstractmethod
+    async def upload_image(self, file: BinaryIO, public_id: Optional[str] = None) -> dict:
+        """
+        Upload an image and return its resource details.
+
+        :param file: The file-like object containing the image data to upload.
+        :param public_id: Optional identifier to store the image under; generated when omitted.
+        :return: Dictionary with at least the `public_id` and `url` of the uploaded image.
+        """
+
+    def new_public_id(self) -> str:
+        """Generate an identifier to store a new image under."""
+        return uuid.uuid4().hex
+
+    @abstractmethod
+    async def delete_image(self, public_id: str) -> None:
+        """
+        Delete an image using its public ID.
+
+        :param public_id: The public ID of the image to delete.
+        """
+
+    async def delete_images(self, public_ids: list[str]) -> set[str]:
+        """
+        Delete many images. Backends with a batch API override this to save round-trips.
+
+        :param public_ids: The public IDs of the images to delete.
+        :return: The public IDs that could not be deleted.
+        """
+        results = await asyncio.gather(*(self.delete_image(public_id) for public_id in public_ids), return_exceptions=True)
+        return {public_id for public_id, result in zip(public_ids, results) if isinstance(result, Exception)}
+
+    @abstractmethod
+    async def read_image(self, public_id: str) -> bytes:
+        """
+        Download the original bytes of a stored image.
+
+        :param public_id: The public ID of the image.
+        :return: The image file contents.
+        """
+
+    @abstractmethod
+    def stream_image(self, public_id: str, chunk_size: int = config.UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """
+        Download the original bytes of a stored image in chunks, without holding it in memory.
+
+        :param public_id: The public ID of the image.
+        :param chunk_size: Maximum number of bytes per chunk.
+        :return: Async iterator over the file contents.
+        """
+
+    @abstractmethod
+    def get_image_url(self, public_id: str) -> str:
+        """
+        Get the URL of a stored image. Never makes a network call.
+
+        :param public_id: The public ID of the image.
+        :return: URL of the image.
+        """
+
+    @abstractmethod
+    async def get_image_metadata(self, public_id: str) -> dict:
+        """
+        Get metadata of a stored image.
+
+        :param public_id: The public ID of the image.
+        :return: Dictionary containing metadata of the image.
+        """
+
+    @abstractmethod
+    async def list_images(self, cursor: Optional[str] = None, limit: int = 500) -> tuple[list, Optional[str]]:
+        """
+        List one page of stored images.
+
+        :param cursor: Cursor returned by the previous page, or None for the first page.
+        :param limit: Maximum number of images in the page.
+        :return: Tuple of the list of image dictionaries and the cursor of the next page (None when done).
+        """
+
+    @abstractmethod
+    async def find_images(self, public_ids: list[str]) -> set[str]:
+        """
+        Check which of the given images exist in storage, in as few calls as the backend allows.
+
+        :param public_ids: The public IDs to look up.
+        :return: The public IDs that exist.
+        :raises StorageError: If the lookup fails; a failure never reports an image as missing.
+        """
+
+    async def close(self) -> None:
+        """Release any pooled resources held by the backend."""
+
+
+class CloudinaryStorage(StorageBackend):
+    """
+    Cloudinary backend talking to the REST API over a shared keep-alive connection pool.
+
+    A semaphore caps the number of in-flight requests so a burst of uploads queues here
+    instead of opening unbounded connections to Cloudinary. Images are stored under `folder`,
+    and listing is limited to it, so reconciliation never sees (or deletes) other assets of
+    the account.
+    """
+
+    DELETE_BATCH_SIZE = 100
+
+    def __init__(
+        self,
+        cloud_name: str = config.CLOUDINARY_CLOUD_NAME,
+        api_key: str = config.CLOUDINARY_API_KEY,
+        api_secret: str = config.CLOUDINARY_API_SECRET,
+        folder: str = config.CLOUDINARY_FOLDER,
+        max_connections: int = config.STORAGE_MAX_CONNECTIONS,
+        max_keepalive: int = config.STORAGE_MAX_KEEPALIVE,
+        max_concurrency: int = config.STORAGE_MAX_CONCURRENCY,
+        timeout: float = config.STORAGE_TIMEOUT,
+        connect_timeout: float = config.STORAGE_CONNECT_TIMEOUT,
+    ):
+        self.cloud_name = cloud_name
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.folder = folder.strip("/")
+        self.client = httpx.AsyncClient(
+            base_url=f"https://api.cloudinary.com/v1_1/{cloud_name}",
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _signed(self, params: dict) -> dict:
+        """Add the timestamp, API key and SHA-1 signature Cloudinary expects on write calls."""
+        params = {**params, "timestamp": int(time.time())}
+        to_sign = "&".join(f"{key}={params[key]}" for key in sorted(params))
+        signature = hashlib.sha1((to_sign + self.api_secret).encode()).hexdigest()
+        return {**params, "signature": signature, "api_key": self.api_key}
+
+    async def _request(self, method: str, url: str, **kwargs) -> dict:
+        async with self.semaphore:
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                response.raise_for_status()
+            except httpx.HTTPError as exc:
+                raise StorageError(f"Cloudinary {method} {url} failed: {exc}") from exc
+        return response.json()
+
+    def new_public_id(self) -> str:
+        return f"{self.folder}/{uuid.uuid4().hex}" if self.folder else uuid.uuid4().hex
+
+    @timed("storage.upload")
+    async def upload_image(self, file: BinaryIO, public_id: Optional[str] = None) -> dict:
+        params = {"public_id": public_id or self.new_public_id()}
+        # httpx streams the file object in chunks, so the body is never copied into memory
+        return await self._request("POST", "/image/upload", data=self._signed(params), files={"file": ("upload", file)})
+
+    @timed("storage.delete")
+    async def delete_image(self, public_id: str) -> None:
+        await self._request("POST", "/image/destroy", data=self._signed({"public_id": public_id}))
+
+    async def _delete_chunk(self, public_ids: list[str]) -> set[str]:
+        try:
+            response = await self._request(
+                "DELETE", "/resources/image/upload",
+                params=[("public_ids[]", public_id) for public_id in public_ids],
+                auth=(self.api_key, self.api_secret),
+            )
+        except StorageError:
+            return set(public_ids)
+        # Already-missing assets count as deleted
+        outcome = response.get("deleted", {})
+        return {public_id for public_id in public_ids if outcome.get(public_id) not in ("deleted", "not_found")}
+
+    @timed("storage.delete_many")
+    async def delete_images(self, public_ids: list[str]) -> set[str]:
+        # The Admin API deletes up to DELETE_BATCH_SIZE assets per call
+        chunks = [public_ids[i:i + self.DELETE_BATCH_SIZE] for i in range(0, len(public_ids), self.DELETE_BATCH_SIZE)]
+        failed = await asyncio.gather(*(self._delete_chunk(chunk) for chunk in chunks))
+        return set().union(*failed)
+
+    @timed("storage.read")
+    async def read_image(self, public_id: str) -> bytes:
+        url = self.get_image_url(public_id)
+        async with self.semaphore:
+            try:
+                response = await self.client.get(url)
+                response.raise_for_status()
+            except httpx.HTTPError as exc:
+                raise StorageError(f"Cloudinary GET {url} failed: {exc}") from exc
+        return response.content
+
+    async def stream_image(self, public_id: str, chunk_size: int = config.UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        url = self.get_image_url(public_id)
+        with span("storage.stream"):
+            async with self.semaphore:
+                try:
+                    async with self.client.stream("GET", url) as response:
+                        response.raise_for_status()
+                        async for chunk in response.aiter_bytes(chunk_size):
+                            yield chunk
+                except httpx.HTTPError as exc:
+                    raise StorageError(f"Cloudinary GET {url} failed: {exc}") from exc
+
+    def get_image_url(self, public_id: str) -> str:
+        return f"https://res.cloudinary.com/{self.cloud_name}/image/upload/{public_id}"
+
+    @timed("storage.metadata")
+    async def get_image_metadata(self, public_id: str) -> dict:
+        return await self._request("GET", f"/resources/image/upload/{public_id}", auth=(self.api_key, self.api_secret))
+
+    @timed("storage.list")
+    async def list_images(self, cursor: Optional[str] = None, limit: int = 500) -> tuple[list, Optional[str]]:
+        # Everything listed is a deletion candidate for reconciliation, so never list the whole account
+        if not self.folder:
+            raise StorageError("Listing needs CLOUDINARY_FOLDER; the account may hold assets this app does not own")
+        params = {"max_results": limit, "prefix": f"{self.folder}/"}
+        if cursor:
+            params["next_cursor"] = cursor
+        response = await self._request("GET", "/resources/image/upload", params=params, auth=(self.api_key, self.api_secret))
+        return response.get("resources", []), response.get("next_cursor")
+
+    async def _find_chunk(self, public_ids: list[str]) -> set[str]:
+        response = await self._request(
+            "GET", "/resources/image/upload",
+            params=[("public_ids[]", public_id) for public_id in public_ids] + [("max_results", len(public_ids))],
+            auth=(self.api_key, self.api_secret),
+        )
+        return {resource["public_id"] for resource in response.get("resources", [])}
+
+    @timed("storage.find")
+    async def find_images(self, public_ids: list[str]) -> set[str]:
+        # The Admin API looks up to DELETE_BATCH_SIZE assets by ID per call
+        chunks = [public_ids[i:i + self.DELETE_BATCH_SIZE] for i in range(0, len(public_ids), self.DELETE_BATCH_SIZE)]
+        found = await asyncio.gather(*(self._find_chunk(chunk) for chunk in chunks))
+        return set().union(*found)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class LocalStorage(StorageBackend):
+    """
+    Filesystem backend standing in for Cloudinary in tests and benchmarks.
+
+    Objects live under `root/<first two characters of the public id>/<public id>` so no single
+    directory grows too large, and listing walks the shards in sorted order.
+    Blocking file I/O runs in worker threads.
+    """
+
+    PUBLIC_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{3,128}$")
+
+    def __init__(self, root: str = config.LOCAL_STORAGE_DIR, base_url: str = config.LOCAL_STORAGE_URL):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, public_id: str) -> str:
+        if not self.PUBLIC_ID_PATTERN.match(public_id):
+            raise StorageError(f"Invalid public id: {public_id!r}")
+        return os.path.join(self.root, public_id[:2], public_id)
+
+    def _describe(self, public_id: str, stat: os.stat_result) -> dict:
+        return {
+            "public_id": public_id,
+            "url": self.get_image_url(public_id),
+            "bytes": stat.st_size,
+            "created_at": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).isoformat(),
+        }
+
+    def _write(self, file: BinaryIO, public_id: str) -> dict:
+        path = self._path(public_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as out:
+            shutil.copyfileobj(file, out, config.UPLOAD_CHUNK_SIZE)
+        os.replace(tmp_path, path)
+        return self._describe(public_id, os.stat(path))
+
+    @timed("storage.upload")
+    async def upload_image(self, file: BinaryIO, public_id: Optional[str] = None) -> dict:
+        return await asyncio.to_thread(self._write, file, public_id or self.new_public_id())
+
+    def _remove(self, public_id: str) -> None:
+        try:
+            os.remove(self._path(public_id))
+        except FileNotFoundError:
+            pass
+
+    def _remove_many(self, public_ids: list[str]) -> set[str]:
+        failed = set()
+        for public_id in public_ids:
+            try:
+                self._remove(public_id)
+            except (OSError, StorageError):
+                failed.add(public_id)
+        return failed
+
+    @timed("storage.delete")
+    async def delete_image(self, public_id: str) -> None:
+        await asyncio.to_thread(self._remove, public_id)
+
+    @timed("storage.delete_many")
+    async def delete_images(self, public_ids: list[str]) -> set[str]:
+        return await asyncio.to_thread(self._remove_many, public_ids)
+
+    def _read(self, public_id: str) -> bytes:
+        with open(self._path(public_id), "rb") as file:
+            return file.read()
+
+    @timed("storage.read")
+    async def read_image(self, public_id: str) -> bytes:
+        try:
+            return await asyncio.to_thread(self._read, public_id)
+        except FileNotFoundError as exc:
+            raise StorageError(f"Image {public_id!r} not found") from exc
+
+    async def stream_image(self, public_id: str, chunk_size: int = config.UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        with span("storage.stream"):
+            try:
+                file = await asyncio.to_thread(open, self._path(public_id), "rb")
+            except FileNotFoundError as exc:
+                raise StorageError(f"Image {public_id!r} not found") from exc
+            try:
+                while chunk := await asyncio.to_thread(file.read, chunk_size):
+                    yield chunk
+            finally:
+                file.close()
+
+    def get_image_url(self, public_id: str) -> str:
+        return f"{self.base_url}/{public_id}"
+
+    @timed("storage.metadata")
+    async def get_image_metadata(self, public_id: str) -> dict:
+        try:
+            stat = await asyncio.to_thread(os.stat, self._path(public_id))
+        except FileNotFoundError as exc:
+            raise StorageError(f"Image {public_id!r} not found") from exc
+        return self._describe(public_id, stat)
+
+    def _list(self, cursor: Optional[str], limit: int) -> tuple[list, Optional[str]]:
+        resources = []
+        for shard in sorted(os.listdir(self.root)):
+            if cursor and shard < cursor[:2]:
+                continue
+            shard_dir = os.path.join(self.root, shard)
+            for public_id in sorted(os.listdir(shard_dir)):
+                if public_id.endswith(".tmp") or (cursor and public_id <= cursor):
+                    continue
+                resources.append(self._describe(public_id, os.stat(os.path.join(shard_dir, public_id))))
+                if len(resources) == limit:
+                    return resources, public_id
+        return resources, None
+
+    @timed("storage.list")
+    async def list_images(self, cursor: Optional[str] = None, limit: int = 500) -> tuple[list, Optional[str]]:
+        return await asyncio.to_thread(self._list, cursor, limit)
+
+    def _find(self, public_ids: list[str]) -> set[str]:
+        return {public_id for public_id in public_ids if os.path.exists(self._path(public_id))}
+
+    @timed("storage.find")
+    async def find_images(self, public_ids: list[str]) -> set[str]:
+        return await asyncio.to_thread(self._find, public_ids)
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Return the process-wide storage backend selected by STORAGE_BACKEND, creating it on first use."""
+    global _storage
+    if _storage is None:
+        if config.STORAGE_BACKEND == "local":
+            _storage = LocalStorage()
+        elif config.STORAGE_BACKEND == "cloudinary":
+            _storage = CloudinaryStorage()
+        else:
+            raise StorageError(f"Unknown storage backend: {config.STORAGE_BACKEND!r}")
+    return _storage
+
+
+async def close_storage() -> None:
+    """Close the storage backend's connection pool, if one was created."""
+    global _storage
+    if _storage is not None:
+        await _storage.close()
+        _storage = None
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, or_, select, update
+
+from app.core import config
+from app.core.redis_client import get_redis
+from app.db import SessionLocal
+from app.models.user import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshTokenStore(ABC):
+    """Tracks which refresh token IDs (jti) are still valid."""
+
+    @abstractmethod
+    async def add(self, jti: str, user_id: int, expires_at: datetime) -> None:
+        """
+        Record a newly issued refresh token.
+
+        :param jti: The token identifier.
+        :param user_id: The ID of the user the token belongs to.
+        :param expires_at: When the token expires (naive UTC).
+        """
+
+    @abstractmethod
+    async def rotate(self, old_jti: str, new_jti: str, user_id: int, expires_at: datetime) -> bool:
+        """
+        Atomically revoke a refresh token and record its replacement.
+
+        :return: False, with nothing changed, if the old token is unknown, revoked, expired or
+            belongs to another user.
+        """
+
+    @abstractmethod
+    async def revoke(self, jti: str, user_id: int) -> None:
+        """Revoke a single refresh token of a user."""
+
+    @abstractmethod
+    async def revoke_all(self, user_id: int) -> None:
+        """Revoke every refresh token of a user."""
+
+
+# Keeps a user's jti set alive as long as their longest-lived token
+ADD_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+redis.call('SADD', KEYS[2], ARGV[3])
+if redis.call('PTTL', KEYS[2]) < tonumber(ARGV[2]) then
+    redis.call('PEXPIRE', KEYS[2], ARGV[2])
+end
+return 1
+"""
+
+ROTATE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[3], ARGV[3])
+redis.call('SET', KEYS[2], ARGV[1], 'PX', ARGV[2])
+redis.call('SADD', KEYS[3], ARGV[4])
+if redis.call('PTTL', KEYS[3]) < tonumber(ARGV[2]) then
+    redis.call('PEXPIRE', KEYS[3], ARGV[2])
+end
+return 1
+"""
+
+REVOKE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    redis.call('SREM', KEYS[2], ARGV[2])
+end
+return 1
+"""
+
+REVOKE_ALL_SCRIPT = """
+local jtis = redis.call('SMEMBERS', KEYS[1])
+for _, jti in ipairs(jtis) do
+    redis.call('DEL', ARGV[1] .. jti)
+end
+redis.call('DEL', KEYS[1])
+return #jtis
+"""
+
+
+class RedisRefreshTokenStore(RefreshTokenStore):
+    """
+    Refresh tokens as Redis keys whose TTL matches the token expiry, so nothing needs purging.
+
+    `photoapp:rt:<jti>` holds the owning user ID and `photoapp:rt:user:<user_id>` the set of that
+    user's jtis for revoke-all. Every multi-key change runs as a single Lua script.
+    """
+
+    TOKEN_KEY = "photoapp:rt:"
+    USER_KEY = "photoapp:rt:user:{}"
+
+    @staticmethod
+    async def _run(script: str, keys: list, args: list):
+        return await get_redis().register_script(script)(keys=keys, args=args)
+
+    @staticmethod
+    def _ttl_ms(expires_at: datetime) -> int:
+        return max(1, int((expires_at - datetime.utcnow()).total_seconds() * 1000))
+
+    async def add(self, jti: str, user_id: int, expires_at: datetime) -> None:
+        await self._run(
+            ADD_SCRIPT,
+            [self.TOKEN_KEY + jti, self.USER_KEY.format(user_id)],
+            [user_id, self._ttl_ms(expires_at), jti],
+        )
+
+    async def rotate(self, old_jti: str, new_jti: str, user_id: int, expires_at: datetime) -> bool:
+        rotated = await self._run(
+            ROTATE_SCRIPT,
+            [self.TOKEN_KEY + old_jti, self.TOKEN_KEY + new_jti, self.USER_KEY.format(user_id)],
+            [user_id, self._ttl_ms(expires_at), old_jti, new_jti],
+        )
+        return rotated == 1
+
+    async def revoke(self, jti: str, user_id: int) -> None:
+        await self._run(REVOKE_SCRIPT, [self.TOKEN_KEY + jti, self.USER_KEY.format(user_id)], [user_id, jti])
+
+    async def revoke_all(self, user_id: int) -> None:
+        await self._run(REVOKE_ALL_SCRIPT, [self.USER_KEY.format(user_id)], [self.TOKEN_KEY])
+
+
+class SqlRefreshTokenStore(RefreshTokenStore):
+    """
+    Fallback store on the `refresh_tokens` table.
+
+    Rotation is a conditional UPDATE followed by the INSERT in the same transaction. Expired and
+    revoked rows are not cleaned up by themselves; run `purge_expired_tokens` periodically.
+    """
+
+    async def add(self, jti: str, user_id: int, expires_at: datetime) -> None:
+        async with SessionLocal() as db:
+            db.add(RefreshToken(jti=jti, user_id=user_id, expires_at=expires_at))
+            await db.commit()
+
+    async def rotate(self, old_jti: str, new_jti: str, user_id: int, expires_at: datetime) -> bool:
+        async with SessionLocal() as db:
+            result = await db.execute(
+                update(RefreshToken)
+                .where(
+                    RefreshToken.jti == old_jti,
+                    RefreshToken.user_id == user_id,
+                    RefreshToken.revoked == False,  # noqa: E712
+                    RefreshToken.expires_at > datetime.utcnow(),
+                )
+                .values(revoked=True)
+            )
+            if result.rowcount != 1:
+                await db.rollback()
+                return False
+            db.add(RefreshToken(jti=new_jti, user_id=user_id, expires_at=expires_at))
+            await db.commit()
+            return True
+
+    async def _revoke(self, user_id: int, jti: Optional[str] = None) -> None:
+        async with SessionLocal() as db:
+            query = update(RefreshToken).where(RefreshToken.user_id == user_id)
+            if jti is not None:
+                query = query.where(RefreshToken.jti == jti)
+            await db.execute(query.values(revoked=True))
+            await db.commit()
+
+    async def revoke(self, jti: str, user_id: int) -> None:
+        await self._revoke(user_id, jti)
+
+    async def revoke_all(self, user_id: int) -> None:
+        await self._revoke(user_id)
+
+
+async def purge_expired_tokens(batch_size: int = config.REFRESH_TOKEN_PURGE_BATCH_SIZE) -> int:
+    """
+    Delete expired and revoked rows from `refresh_tokens` in batches of `batch_size`.
+
+    Each batch is its own short transaction so the table is never locked for long.
+
+    :return: Number of rows deleted.
+    """
+    deleted = 0
+    async with SessionLocal() as db:
+        while True:
+            ids = (await db.scalars(
+                select(RefreshToken.id)
+                .where(or_(RefreshToken.expires_at <= datetime.utcnow(), RefreshToken.revoked == True))  # noqa: E712
+                .limit(batch_size)
+            )).all()
+            if not ids:
+                return deleted
+            await db.execute(delete(RefreshToken).where(RefreshToken.id.in_(ids)))
+            await db.commit()
+            deleted += len(ids)
+
+
+async def purge_expired_tokens_periodically(interval: int = config.REFRESH_TOKEN_PURGE_INTERVAL_SECONDS) -> None:
+    """Background task running `purge_expired_tokens` every `interval` seconds."""
+    while True:
+        try:
+            deleted = await purge_expired_tokens()
+            logger.info("Purged %d refresh tokens", deleted)
+        except Exception:
+            logger.exception("Refresh token purge failed")
+        await asyncio.sleep(interval)
+
+
+_store: Optional[RefreshTokenStore] = None
+
+
+def get_token_store() -> RefreshTokenStore:
+    """Return the refresh token store selected by REFRESH_TOKEN_STORE."""
+    global _store
+    if _store is None:
+        _store = SqlRefreshTokenStore() if config.REFRESH_TOKEN_STORE == "sql" else RedisRefreshTokenStore()
+    return _store
+
+
+if __name__ == "__main__":
+    # One-off purge, e.g. from cron or after switching REFRESH_TOKEN_STORE to redis
+    print(f"Purged {asyncio.run(purge_expired_tokens())} refresh tokens")
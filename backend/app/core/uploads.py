@@ -0,0 +1,134 @@
+import hashlib
+from typing import BinaryIO, NamedTuple, Optional
+from fastapi import HTTPException, status
+from app.core.config import MAX_UPLOAD_SIZE, MIN_UPLOAD_SIZE, UPLOAD_CHUNK_SIZE
+
+# Leading bytes of every image format we accept, mapped to its MIME type
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"GIF87a": "image/gif",
+    b"GIF89a": "image/gif",
+}
+
+# Room left on top of MAX_UPLOAD_SIZE for the multipart boundaries and part headers
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+class UploadScan(NamedTuple):
+    size: int
+    content_type: str
+    content_hash: str  # Hex SHA-256 of the file contents
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self, limit: int = MAX_UPLOAD_SIZE):
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image file is too large. Maximum size is {limit // (1024 * 1024)}MB.",
+        )
+
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """
+    Detect the image format from its magic bytes.
+
+    :param header: The first bytes of the file.
+    :return: The MIME type of the image, or None if the format is not supported.
+    """
+    for signature, content_type in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return content_type
+    return None
+
+
+def scan_upload(file: BinaryIO, chunk_size: int = UPLOAD_CHUNK_SIZE) -> UploadScan:
+    """
+    Validate an uploaded file by reading it in chunks, without holding it in memory.
+
+    The content hash is computed in the same pass, and the file is rewound afterwards so the
+    same buffer can be handed to storage as-is.
+
+    :param file: The spooled file backing an UploadFile.
+    :param chunk_size: Number of bytes read per iteration.
+    :return: The file size in bytes, the sniffed MIME type and the SHA-256 of the contents.
+    """
+    file.seek(0)
+    header = file.read(chunk_size)
+    content_type = sniff_image_type(header)
+    if content_type is None:
+        raise HTTPException(status_code=400, detail="Invalid image file type. Only JPEG, PNG, and GIF are allowed.")
+
+    digest = hashlib.sha256(header)
+    size = len(header)
+    while size <= MAX_UPLOAD_SIZE:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    if size > MAX_UPLOAD_SIZE:
+        raise UploadTooLarge()
+    if size < MIN_UPLOAD_SIZE:
+        raise HTTPException(status_code=400, detail="Image file is too small. Minimum size is 1KB.")
+
+    file.seek(0)
+    return UploadScan(size, content_type, digest.hexdigest())
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware that caps the request body of upload routes while it is being received.
+
+    A declared Content-Length over the limit is rejected before any byte is read, and chunked
+    bodies are counted as they stream in, so an oversized upload is refused as soon as it
+    crosses the limit instead of after the multipart parser has spooled all of it.
+    """
+
+    def __init__(self, app, limits: dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                return await self._reject(send)
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise UploadTooLarge()
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except UploadTooLarge:
+            if response_started:
+                raise
+            await self._reject(send)
+
+    async def _reject(self, send):
+        exc = UploadTooLarge()
+        body = ('{"detail":"%s"}' % exc.detail).encode()
+        await send({
+            "type": "http.response.start",
+            "status": exc.status_code,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,200 @@
+from app.schemas.edit import EditCreate
+from app.models.edit import Edit, EditHistoryEntry, EditHistoryHead
+from app.core.config import HISTORY_SNAPSHOT_INTERVAL
+from app.core.history import apply_delta, diff_operations
+from sqlalchemy import delete, false, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
+
+async def create_edit(db: AsyncSession, user_id: int, edit_in: EditCreate) -> Edit:
+    """Create a new edit of an image."""
+    now = datetime.utcnow()
+    edit = Edit(
+        user_id=user_id,
+        image_id=edit_in.image_id,
+        operations=[operation.model_dump(mode="json") for operation in edit_in.operations],
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(edit)
+    await db.commit()
+    await db.refresh(edit)
+    return edit
+
+async def get_edit(db: AsyncSession, edit_id: int) -> Optional[Edit]:
+    """Fetch an edit by its ID."""
+    return await db.get(Edit, edit_id)
+
+async def get_edits_by_image(db: AsyncSession, image_id: int) -> List[Edit]:
+    """Fetch all edits of an image, oldest first."""
+    result = await db.scalars(select(Edit).where(Edit.image_id == image_id).order_by(Edit.id))
+    return result.all()
+
+async def update_edit_operations(db: AsyncSession, edit: Edit, operations: list[dict]) -> Edit:
+    """Replace the operations of an edit."""
+    edit.operations = operations
+    edit.updated_at = datetime.utcnow()
+    await db.commit()
+    await db.refresh(edit)
+    return edit
+
+async def delete_edit(db: AsyncSession, edit: Edit) -> Edit:
+    """Delete an edit."""
+    await db.delete(edit)
+    await db.commit()
+    return edit
+
+async def delete_edits_by_images(db: AsyncSession, image_ids: List[int]) -> int:
+    """Delete every edit of the given images with a single statement."""
+    if not image_ids:
+        return 0
+    result = await db.execute(delete(Edit).where(Edit.image_id.in_(image_ids)))
+    await db.commit()
+    return result.rowcount
+
+async def get_history_head(db: AsyncSession, image_id: int) -> Optional[EditHistoryHead]:
+    """Fetch the undo/redo pointer of an image's edit history, if it has one."""
+    return await db.get(EditHistoryHead, image_id)
+
+async def get_history_entry(db: AsyncSession, image_id: int, seq: int) -> Optional[EditHistoryEntry]:
+    """Fetch one version of an image's edit history."""
+    return await db.scalar(
+        select(EditHistoryEntry).where(EditHistoryEntry.image_id == image_id, EditHistoryEntry.seq == seq)
+    )
+
+async def get_history_page(db: AsyncSession, image_id: int, after_seq: int = 0, limit: int = 500) -> List[EditHistoryEntry]:
+    """Fetch the history entries of an image with a version number above `after_seq`, oldest first."""
+    result = await db.scalars(
+        select(EditHistoryEntry)
+        .where(EditHistoryEntry.image_id == image_id, EditHistoryEntry.seq > after_seq)
+        .order_by(EditHistoryEntry.seq)
+        .limit(limit)
+    )
+    return result.all()
+
+def _chain_columns(entry) -> tuple:
+    return entry.seq, entry.parent_seq, entry.snapshot, entry.payload
+
+async def get_history_operations(db: AsyncSession, image_id: int, seq: int) -> Optional[list]:
+    """
+    Rebuild the operations of an image at a given version.
+
+    Only the version's parent chain back to its nearest snapshot is read, with a recursive query
+    (at most HISTORY_SNAPSHOT_INTERVAL entries), however long the history and however many
+    branches undo-then-change left next to it.
+    Returns None if the version does not exist.
+    """
+    if seq == 0:
+        return []
+    chain = (
+        select(*_chain_columns(EditHistoryEntry))
+        .where(EditHistoryEntry.image_id == image_id, EditHistoryEntry.seq == seq)
+        .cte("chain", recursive=True)
+    )
+    parent = aliased(EditHistoryEntry)
+    chain = chain.union_all(
+        select(*_chain_columns(parent))
+        .join(chain, parent.seq == chain.c.parent_seq)
+        .where(parent.image_id == image_id, chain.c.snapshot == false())
+    )
+    # Newest first: the requested version, then each parent up to the snapshot
+    rows = (await db.execute(select(chain.c.snapshot, chain.c.payload).order_by(chain.c.seq.desc()))).all()
+    if not rows or not rows[-1].snapshot:
+        return None
+    operations = rows[-1].payload
+    for row in reversed(rows[:-1]):
+        operations = apply_delta(operations, row.payload)
+    return operations
+
+async def get_redo_seq(db: AsyncSession, image_id: int, seq: int) -> Optional[int]:
+    """The version redo moves to from `seq`: its most recently created child, if any."""
+    return await db.scalar(
+        select(EditHistoryEntry.seq)
+        .where(EditHistoryEntry.image_id == image_id, EditHistoryEntry.parent_seq == seq)
+        .order_by(EditHistoryEntry.seq.desc())
+        .limit(1)
+    )
+
+async def _move_history_head(db: AsyncSession, image_id: int, from_seq: int, to_seq: int) -> bool:
+    result = await db.execute(
+        update(EditHistoryHead)
+        .where(EditHistoryHead.image_id == image_id, EditHistoryHead.head_seq == from_seq)
+        .values(head_seq=to_seq, updated_at=datetime.utcnow())
+    )
+    return result.rowcount == 1
+
+async def move_history_head(db: AsyncSession, image_id: int, from_seq: int, to_seq: int) -> bool:
+    """
+    Point an image's history at another version, for undo and redo. No entry is touched.
+
+    The move only happens if the head is still at `from_seq`, so concurrent moves cannot
+    silently overwrite each other. Returns False if it was not.
+    """
+    moved = await _move_history_head(db, image_id, from_seq, to_seq)
+    await db.commit()
+    return moved
+
+async def append_history(db: AsyncSession, image_id: int, operations: list) -> Optional[EditHistoryHead]:
+    """
+    Record a new version of an image's operations, made from the current head, and move the head to it.
+
+    The entry stores a delta against its parent, or the full operations every HISTORY_SNAPSHOT_INTERVAL
+    steps. Versions after the head stay in place, so undone branches remain reachable.
+    Returns None, with nothing changed, if the head moved concurrently.
+    """
+    try:
+        return await _append_history(db, image_id, operations)
+    except IntegrityError:
+        # Another first append created the head, or took the version number, before this one
+        await db.rollback()
+        return None
+
+async def _append_history(db: AsyncSession, image_id: int, operations: list) -> Optional[EditHistoryHead]:
+    head = await db.get(EditHistoryHead, image_id)
+    if head is None:
+        head = EditHistoryHead(image_id=image_id, head_seq=0, tip_seq=0)
+        db.add(head)
+        await db.flush()
+
+    parent_seq = head.head_seq
+    parent = await get_history_entry(db, image_id, parent_seq) if parent_seq else None
+    parent_operations = await get_history_operations(db, image_id, parent_seq)
+    if operations == parent_operations:
+        await db.commit()
+        return head
+
+    # Hand out the version number atomically, so concurrent appends never collide
+    seq = await db.scalar(
+        update(EditHistoryHead)
+        .where(EditHistoryHead.image_id == image_id)
+        .values(tip_seq=EditHistoryHead.tip_seq + 1)
+        .returning(EditHistoryHead.tip_seq)
+    )
+    snapshot = parent is None or parent.depth + 1 >= HISTORY_SNAPSHOT_INTERVAL
+    db.add(EditHistoryEntry(
+        image_id=image_id,
+        seq=seq,
+        parent_seq=parent_seq,
+        base_seq=seq if snapshot else parent.base_seq,
+        depth=0 if snapshot else parent.depth + 1,
+        snapshot=snapshot,
+        payload=operations if snapshot else diff_operations(parent_operations, operations),
+        created_at=datetime.utcnow(),
+    ))
+    if not await _move_history_head(db, image_id, parent_seq, seq):
+        await db.rollback()
+        return None
+    await db.commit()
+    await db.refresh(head)
+    return head
+
+async def delete_history_by_images(db: AsyncSession, image_ids: List[int]) -> None:
+    """Delete the edit history of the given images."""
+    if not image_ids:
+        return
+    await db.execute(delete(EditHistoryEntry).where(EditHistoryEntry.image_id.in_(image_ids)))
+    await db.execute(delete(EditHistoryHead).where(EditHistoryHead.image_id.in_(image_ids)))
+    await db.commit()
@@ -1,35 +1,143 @@
 from app.schemas.image import ImageCreate, ImageOut
 from app.models.image import Image
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import Row, delete, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, List, Optional, Sequence
 from datetime import datetime
 
-def create_image(db: Session, image_in: ImageCreate) -> Image:
+async def create_image(db: AsyncSession, image_in: ImageCreate) -> Image:
     """Create a new image record in the database."""
+    now = datetime.utcnow()
     image = Image(
         user_id=image_in.user_id,
         url=image_in.url,
         public_id=image_in.public_id,
-        created_at=datetime.utcnow().isoformat(),
-        updated_at=datetime.utcnow().isoformat()
+        content_hash=image_in.content_hash,
+        phash=image_in.phash,
+        color_histogram=image_in.color_histogram,
+        processed=image_in.processed,
+        created_at=now,
+        updated_at=now
     )
     db.add(image)
-    db.commit()
-    db.refresh(image)
+    await db.commit()
+    await db.refresh(image)
     return image
-def get_image(db: Session, image_id: int) -> Optional[Image]:
+async def create_images(db: AsyncSession, images_in: List[ImageCreate]) -> List[Image]:
+    """Insert many image records in a single statement and transaction."""
+    if not images_in:
+        return []
+    now = datetime.utcnow()
+    result = await db.scalars(
+        insert(Image).returning(Image),
+        [{**image_in.model_dump(), "created_at": now, "updated_at": now} for image_in in images_in],
+    )
+    images = result.all()
+    await db.commit()
+    return images
+async def get_image(db: AsyncSession, image_id: int) -> Optional[Image]:
     """Fetch an image by its ID."""
-    return db.query(Image).filter(Image.id == image_id).first()
+    return await db.get(Image, image_id)
+
+async def get_image_by_hash(db: AsyncSession, user_id: int, content_hash: str) -> Optional[Image]:
+    """Fetch a user's image with the given content hash, if they already uploaded the same bytes."""
+    return await db.scalar(
+        select(Image).where(Image.user_id == user_id, Image.content_hash == content_hash).limit(1)
+    )
+
+async def get_images_by_hashes(db: AsyncSession, user_id: int, content_hashes: List[str]) -> List[Image]:
+    """Fetch a user's images matching any of the given content hashes in one query."""
+    if not content_hashes:
+        return []
+    result = await db.scalars(
+        select(Image).where(Image.user_id == user_id, Image.content_hash.in_(content_hashes))
+    )
+    return result.all()
+
+async def get_images_by_ids(db: AsyncSession, image_ids: List[int]) -> List[Image]:
+    """Fetch many images by ID in one query; missing IDs are simply absent from the result."""
+    result = await db.scalars(select(Image).where(Image.id.in_(image_ids)))
+    return result.all()
+
+async def get_images_by_user(db: AsyncSession, user_id: int, skip = 0, limit = 20) -> List[ImageOut]:
+    """Fetch all images uploaded by a specific user, newest first (offset pagination)."""
+    result = await db.scalars(
+        select(Image)
+        .where(Image.user_id == user_id)
+        .order_by(Image.created_at.desc(), Image.id.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.all()
+
+async def get_images_page(db: AsyncSession, user_id: int, after: Optional[tuple[datetime, int]] = None, limit = 20) -> List[Image]:
+    """Fetch a page of a user's images, newest first, strictly after the (created_at, id) keyset position."""
+    query = select(Image).where(Image.user_id == user_id)
+    if after is not None:
+        query = query.where(tuple_(Image.created_at, Image.id) < tuple_(*after))
+    result = await db.scalars(query.order_by(Image.created_at.desc(), Image.id.desc()).limit(limit))
+    return result.all()
 
-def get_images_by_user(db: Session, user_id: int, skip = 0, limit = 20) -> List[ImageOut]:
-    """Fetch all images uploaded by a specific user."""
-    return db.query(Image).filter(Image.user_id == user_id).offset(skip).limit(limit).all()
+async def stream_images_by_user(db: AsyncSession, user_id: int, after_id: int = 0, batch_size: int = 1000) -> AsyncIterator[Sequence[Row]]:
+    """
+    Stream a user's images in ID order, from a server-side cursor, `batch_size` rows at a time.
 
-def delete_image(db: Session, image_id: int) -> Optional[Image]:
+    Plain rows rather than ORM objects are read, so nothing accumulates in the session however
+    large the library is. The session's connection stays checked out until the stream ends.
+    """
+    result = await db.stream(
+        select(
+            Image.id, Image.user_id, Image.url, Image.public_id, Image.processed,
+            Image.phash, Image.created_at, Image.updated_at,
+        )
+        .where(Image.user_id == user_id, Image.id > after_id)
+        .order_by(Image.id)
+        .execution_options(yield_per=batch_size)
+    )
+    async for batch in result.partitions():
+        yield batch
+
+async def get_existing_public_ids(db: AsyncSession, public_ids: List[str]) -> set[str]:
+    """Return which of the given storage public IDs have an image record, in one query."""
+    if not public_ids:
+        return set()
+    result = await db.scalars(select(Image.public_id).where(Image.public_id.in_(public_ids)))
+    return set(result.all())
+
+async def get_images_by_public_id_page(db: AsyncSession, after: str = "", limit: int = 500) -> Sequence[Row]:
+    """Fetch (id, user_id, public_id, processed, created_at) of all users' images in public ID order, after `after`."""
+    result = await db.execute(
+        select(Image.id, Image.user_id, Image.public_id, Image.processed, Image.created_at)
+        .where(Image.public_id > after)
+        .order_by(Image.public_id)
+        .limit(limit)
+    )
+    return result.all()
+
+async def mark_image_processed(db: AsyncSession, image_id: int, url: str) -> Optional[Image]:
+    """Record the final storage URL of an image and flag it as processed."""
+    image = await db.get(Image, image_id)
+    if image:
+        image.url = url
+        image.processed = True
+        image.updated_at = datetime.utcnow()
+        await db.commit()
+        await db.refresh(image)
+    return image
+
+async def delete_image(db: AsyncSession, image_id: int) -> Optional[Image]:
     """Delete an image by its ID."""
-    image = db.query(Image).filter(Image.id == image_id).first()
+    image = await db.get(Image, image_id)
     if image:
-        db.delete(image)
-        db.commit()
+        await db.delete(image)
+        await db.commit()
         return image
-    return None
\ No newline at end of file
+    return None
+
+async def delete_images(db: AsyncSession, image_ids: List[int]) -> int:
+    """Delete many images by ID with a single DELETE ... WHERE id IN (...) statement."""
+    if not image_ids:
+        return 0
+    result = await db.execute(delete(Image).where(Image.id.in_(image_ids)))
+    await db.commit()
+    return result.rowcount
@@ -1,31 +1,131 @@
-from sqlalchemy import create_engine
+import contextvars
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
 from app.core import config
+from app.core.replicas import ReplicaSet, recent_writes
+
+
+def async_database_url(url: str) -> str:
+    """Map a plain database URL onto its asyncio driver (aiosqlite for SQLite, asyncpg for Postgres)."""
+    for prefix, driver in (("sqlite://", "sqlite+aiosqlite://"), ("postgresql://", "postgresql+asyncpg://"), ("postgres://", "postgresql+asyncpg://")):
+        if url.startswith(prefix):
+            return driver + url[len(prefix):]
+    return url
+
+
+def engine_options(url: str) -> dict:
+    """Pool settings from config; SQLite connections are cheap and not pooled the same way."""
+    if url.startswith("sqlite"):
+        return {"pool_pre_ping": config.DB_POOL_PRE_PING}
+    return {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+    }
+
 
 # Database URL from config
-DATABASE_URL = config.DATABASE_URL
+DATABASE_URL = async_database_url(config.DATABASE_URL)
+
+# Create the SQLAlchemy async engine
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+# Create a configured "AsyncSession" class; objects stay readable after commit
+SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Read replicas, if any; only sessions from ReadSessionLocal ever use them
+replica_engines = [create_async_engine(url, **engine_options(url)) for url in map(async_database_url, config.DATABASE_REPLICA_URLS)]
+replicas = ReplicaSet(replica_engines)
+
+# Set once the request's user is known: their commits are recorded, and right after one their reads use the primary
+request_user_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("db_request_user_id", default=None)
+read_from_primary: contextvars.ContextVar[bool] = contextvars.ContextVar("db_read_from_primary", default=False)
+
+
+class RoutingSession(Session):
+    """
+    Session for read-only work that runs on a read replica.
+
+    The replica is picked on first use rather than when the session is created, so that
+    dependencies resolved after it (get_current_user) can still send it to the primary.
+    The session keeps that bind for its lifetime; should it write anyway, it is moved to
+    the primary for good.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        bind = self.info.get("bind")
+        if bind is None:
+            replica = None if read_from_primary.get() else replicas.choose()
+            bind = self.info["bind"] = (replica or engine).sync_engine
+        if bind is not engine.sync_engine and (self._flushing or isinstance(clause, UpdateBase)):
+            bind = self.info["bind"] = engine.sync_engine
+        return bind
 
-# Create the SQLAlchemy engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
-# Create a configured "Session" class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+ReadSessionLocal = async_sessionmaker(class_=AsyncSession, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False)
 
 # Base class for declarative models
 Base = declarative_base()
 
 # Dependency to get the database session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
+
+# Dependency to get a session for read-only work, served by a replica when there are any
+async def get_read_db():
+    async with ReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def route_reads_for(user_id: int) -> None:
+    """Route the rest of the request for a user: to the primary if they wrote in the last DB_READ_YOUR_WRITES_SECONDS."""
+    if replicas.engines:
+        request_user_id.set(user_id)
+        read_from_primary.set(await recent_writes.is_recent(user_id))
+
+
+def _note_flush(session, flush_context):
+    session.info["wrote"] = True
+
+def _note_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+def _note_commit(session):
+    user_id = request_user_id.get()
+    if session.info.pop("wrote", False) and user_id is not None:
+        recent_writes.record(user_id)
+
+def _note_rollback(session):
+    session.info.pop("wrote", None)
+
+def _note_replica_error(context):
+    # Connection failures take the replica out of rotation until it answers a health check again
+    if context.is_disconnect or context.connection is None:
+        replicas.mark_down(context.engine)
+
+# Read-your-writes bookkeeping is only needed once there are replicas to read stale data from
+if replica_engines:
+    event.listen(Session, "after_flush", _note_flush)
+    event.listen(Session, "do_orm_execute", _note_statement)
+    event.listen(Session, "after_commit", _note_commit)
+    event.listen(Session, "after_rollback", _note_rollback)
+    for replica_engine in replica_engines:
+        event.listen(replica_engine.sync_engine, "handle_error", _note_replica_error)
 
 # Create all tables in the database (if they don't exist)
-def init_db():
-    Base.metadata.create_all(bind=engine)
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
 
+# Dispose of pooled connections on shutdown
+async def close_db():
+    await replicas.stop()
+    for replica_engine in replica_engines:
+        await replica_engine.dispose()
+    await engine.dispose()
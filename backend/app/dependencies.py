@@ -1,30 +1,41 @@
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import SECRET_KEY, ALGORITHM
+from app.core.metrics import span
+from app.core.principal_cache import principal_cache
 from app.crud.user import get_user_by_id
-from app.models.user import RefreshToken
-from app.db import get_db
+from app.db import SessionLocal, get_db, get_read_db, replicas, route_reads_for
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 """ Below is the code for getting the current user from the access token.
 This function decodes the JWT token, checks its validity, and retrieves the user from the database.
+Users are cached per token (see app.core.principal_cache), so repeated requests with the same token
+skip both the JWT decode and the database lookup. Once the user is known, the request's read-only sessions are routed
+(to the primary if the user wrote within the read-your-writes window, to a replica otherwise).
 Field Descriptions:
 - `token`: The JWT access token provided by the user.
 - `db`: A database session dependency that provides access to the database.
 Returns:
 - The user object if the token is valid and the user exists in the database.
 """
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_read_db)):
+    # 0) Hot path: token already validated and its user loaded
+    user = principal_cache.get(token)
+    if user is not None:
+        await route_reads_for(user.id)
+        return user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with span("jwt.decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         raise credentials_exception
 
@@ -37,8 +48,17 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         raise credentials_exception
 
     # 2) Look up the user from DB
-    user = get_user_by_id(db, user_id)
+    await route_reads_for(int(user_id))
+    user = await get_user_by_id(db, user_id)
+    if user is None and replicas.engines:
+        # An account created moments ago may not have reached the replica yet
+        async with SessionLocal() as primary_db:
+            user = await get_user_by_id(primary_db, user_id)
     if user is None:
         raise credentials_exception
 
+    # 3) Detach the user so later commits in this session cannot expire the cached copy
+    if user in db:
+        db.expunge(user)
+    principal_cache.put(token, user, payload["exp"])
     return user
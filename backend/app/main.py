@@ -1,15 +1,32 @@
-from fastapi import FastAPI
+import time
+
+# Taken before anything else is imported, to measure cold start
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Header, HTTPException, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routers import auth, images, edits, history
-from fastapi_limiter import FastAPILimiter
-from app.core.config import REDIS_URL
-import redis.asyncio as aioredis
+from app.routers import auth, images, edits, history, health
+from app.core.uploads import UploadSizeLimitMiddleware, MULTIPART_OVERHEAD
+from app.core.storage import close_storage
+from app.core.redis_client import close_redis
+from app.core.rate_limit import rate_limits
+from app.core.metrics import STARTUP_SECONDS, MetricsMiddleware, instrument_engine, register_pool_collector, render_metrics, scrape_allowed
+from app.core.jobs import upload_workers
+from app.core.security import password_hasher
+from app.core.rendering import render_pool
+from app.core.token_store import purge_expired_tokens_periodically
+from app.core.config import MAX_UPLOAD_SIZE, MAX_BATCH_UPLOAD_SIZE, REFRESH_TOKEN_STORE, DB_CREATE_ON_STARTUP
+import asyncio
+import logging
+from typing import Optional
 
 # Import database initialization / event handlers
-from app import db, core
+from app import db, core, migrate
 from dotenv import load_dotenv
 load_dotenv()
+
+logger = logging.getLogger(__name__)
 app = FastAPI(
     title="ML Photo Editor API",
     version="0.1.0",
@@ -21,25 +38,88 @@ app.add_middleware(
     allow_origins=["*"],  # in prod, lock this down
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Cursor of the next page of GET /images
 )
 
+# Reject oversized uploads while the body is still streaming in
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/images/upload": MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD,
+        "/images/upload/async": MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD,
+        "/images/batch": MAX_BATCH_UPLOAD_SIZE + MULTIPART_OVERHEAD,
+    },
+)
+
+# Outermost, so request latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
+
+# Query and commit timings, and pool saturation gauges for /metrics
+instrument_engine(db.engine)
+for replica_engine in db.replica_engines:
+    instrument_engine(replica_engine)
+register_pool_collector(db.engine)
+
 # Each router file defines an APIRouter() and some path operations
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(images.router, prefix="/images", tags=["images"])
-#app.include_router(edits.router, prefix="/edits", tags=["edits"])
-#app.include_router(history.router, prefix="/history", tags=["history"])
+app.include_router(edits.router, prefix="/edits", tags=["edits"])
+app.include_router(history.router, prefix="/history", tags=["history"])
+app.include_router(health.router, prefix="/health", tags=["health"])
+
+# With a preloading server this runs once in the master, before the workers are forked
+_import_seconds = time.perf_counter() - _import_started
 
-# Startup event: create tables or connect to any services
+# Startup event: connect to any services. Keep it short: it delays every worker, and the pod is not ready until it returns.
 @app.on_event("startup")
 async def startup_event():
-    # Initialize the database
-    db.init_db()
-    redis = aioredis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
-    await FastAPILimiter.init(redis)
-    pass
+    started = time.perf_counter()
+    # Schema creation belongs to the migrate step (python -m app.migrate); only dev setups do it here
+    if DB_CREATE_ON_STARTUP:
+        await migrate.upgrade()
+    # Keep unhealthy read replicas out of rotation
+    db.replicas.start()
+    # Rate limits are decided in process; Redis is only needed to share them across replicas
+    await rate_limits.start()
+    # Spawn the bcrypt worker processes before the first login
+    password_hasher.start()
+    render_pool.start()
+    # Start draining the background upload queue
+    await upload_workers.start()
+    # Expired refresh tokens only need purging when they live in SQL
+    if REFRESH_TOKEN_STORE == "sql":
+        app.state.token_purge_task = asyncio.create_task(purge_expired_tokens_periodically())
+
+    startup_seconds = time.perf_counter() - started
+    STARTUP_SECONDS.labels("import").set(_import_seconds)
+    STARTUP_SECONDS.labels("startup").set(startup_seconds)
+    logger.info("Worker ready: app imported in %.0f ms, started in %.0f ms", _import_seconds * 1000, startup_seconds * 1000)
+
+# Shutdown event: runs once the server has stopped accepting connections and finished in-flight requests;
+# queued uploads being processed get UPLOAD_DRAIN_TIMEOUT_SECONDS to finish before pooled connections are released
+@app.on_event("shutdown")
+async def shutdown_event():
+    if getattr(app.state, "token_purge_task", None):
+        app.state.token_purge_task.cancel()
+    await upload_workers.stop()
+    await rate_limits.stop()
+    password_hasher.shutdown()
+    render_pool.shutdown()
+    await close_storage()
+    await close_redis()
+    await db.close_db()
 
 
 # Root endpoint for health check
 @app.get("/")
 def read_root():
     return {"message": "ML Photo Editor API is running."}
+
+
+# Prometheus scrape endpoint. Pool, queue and cache readings describe the server's load, so only a scraper holding
+# METRICS_TOKEN gets them; everyone else, and everyone while no token is configured, sees no such route
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    if not scrape_allowed(authorization):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
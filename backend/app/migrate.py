@@ -0,0 +1,149 @@
+"""
+Create or upgrade the database schema: `python -m app.migrate`.
+
+Run once per deploy before the servers start (the Kubernetes `photoapp-migrate` Job and
+the docker-compose `migrate` service do this), instead of on every worker boot.
+Missing tables are created. Tables created by an earlier release are brought up to the
+models by the upgrade steps below. Each step checks the live schema first, so running
+them again changes nothing.
+
+`--backfill-features` then hashes the images stored before similarity search existed. It
+reads each of them from storage, so run it once, on its own, after the upgrade; a user's
+backfilled images show up in search once their cached similarity index expires.
+"""
+import argparse
+import asyncio
+import io
+import logging
+import time
+
+from sqlalchemy import Connection, DateTime, Table, inspect, select, text, update
+
+# Register every model on Base.metadata
+from app.models import edit, image, user  # noqa: F401
+from app import db
+from app.core import features
+from app.core.storage import StorageError, close_storage, get_storage
+
+logger = logging.getLogger(__name__)
+
+
+def _create_index(conn: Connection, table: Table, name: str) -> None:
+    index = next(index for index in table.indexes if index.name == name)
+    index.create(conn, checkfirst=True)
+
+
+def _add_columns(conn: Connection, table: Table, *names: str) -> None:
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    preparer = conn.dialect.identifier_preparer
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        conn.execute(text(
+            f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} "
+            f"{column.type.compile(conn.dialect)}"
+        ))
+
+
+def _images_timestamps_to_datetime(conn: Connection) -> None:
+    # created_at and updated_at used to be ISO 8601 strings ("2024-05-01T12:00:00.123456")
+    columns = {column["name"]: column["type"] for column in inspect(conn).get_columns("images")}
+    for name in ("created_at", "updated_at"):
+        if isinstance(columns[name], DateTime):
+            continue
+        if conn.dialect.name == "postgresql":
+            conn.execute(text(f"ALTER TABLE images ALTER COLUMN {name} TYPE TIMESTAMP USING {name}::timestamp"))
+        elif conn.dialect.name == "sqlite":
+            # SQLite has no column types to change; rewrite the values in the format DateTime reads and compares
+            conn.execute(text(
+                f"UPDATE images SET {name} = replace({name}, 'T', ' ') || CASE WHEN length({name}) = 19 THEN '.000000' ELSE '' END "
+                f"WHERE {name} LIKE '%T%'"
+            ))
+        else:
+            raise RuntimeError(f"No upgrade of images.{name} for the {conn.dialect.name} dialect")
+
+
+def _upgrade(conn: Connection) -> None:
+    images = image.Image.__table__
+    # Keyset pagination of GET /images
+    _images_timestamps_to_datetime(conn)
+    _create_index(conn, images, "ix_images_user_created_id")
+    # Upload deduplication; images stored before it have no hash and are never matched
+    _add_columns(conn, images, "content_hash")
+    _create_index(conn, images, "ix_images_user_content_hash")
+    # Similarity search; images stored before it stay out of it until --backfill-features
+    _add_columns(conn, images, "phash", "color_histogram")
+    # Library export
+    _create_index(conn, images, "ix_images_user_id_id")
+
+
+async def upgrade() -> None:
+    """Create missing tables and upgrade existing ones, in one transaction where the database allows."""
+    async with db.engine.begin() as conn:
+        await conn.run_sync(db.Base.metadata.create_all)
+        await conn.run_sync(_upgrade)
+
+
+async def _image_features(public_id: str):
+    try:
+        data = await get_storage().read_image(public_id)
+    except StorageError as exc:
+        logger.warning("Skipping image %s: %s", public_id, exc)
+        return None
+    return await asyncio.to_thread(features.compute_features, io.BytesIO(data))
+
+
+async def backfill_features(batch_size: int = 100) -> int:
+    """
+    Compute the perceptual hash and color histogram of images that have none, in ID order.
+
+    Images that cannot be fetched or decoded are skipped and stay without features.
+
+    :return: The number of images updated.
+    """
+    Image = image.Image
+    after_id, updated = 0, 0
+    while True:
+        async with db.SessionLocal() as session:
+            rows = (await session.execute(
+                select(Image.id, Image.public_id)
+                .where(Image.phash.is_(None), Image.id > after_id)
+                .order_by(Image.id)
+                .limit(batch_size)
+            )).all()
+            if not rows:
+                return updated
+            after_id = rows[-1].id
+            # Fetches run concurrently, bounded by the storage client's own concurrency limit
+            results = await asyncio.gather(*(_image_features(row.public_id) for row in rows))
+            for row, image_features in zip(rows, results):
+                if image_features is not None:
+                    await session.execute(
+                        update(Image).where(Image.id == row.id)
+                        .values(phash=features.hash_to_hex(image_features.phash), color_histogram=image_features.histogram)
+                    )
+                    updated += 1
+            await session.commit()
+        print(f"Backfilled features up to image {after_id} ({updated} updated)")
+
+
+async def migrate(args: argparse.Namespace) -> None:
+    started = time.perf_counter()
+    try:
+        await upgrade()
+        print(f"Schema is up to date ({time.perf_counter() - started:.2f} s)")
+        if args.backfill_features:
+            updated = await backfill_features(args.batch_size)
+            print(f"Backfilled the features of {updated} images ({time.perf_counter() - started:.2f} s)")
+    finally:
+        await close_storage()
+        await db.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m app.migrate", description="Create or upgrade the database schema.")
+    parser.add_argument("--backfill-features", action="store_true", help="Then hash the images stored before similarity search existed.")
+    parser.add_argument("--batch-size", type=int, default=100, help="Images fetched and updated per transaction when backfilling.")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(migrate(parser.parse_args()))
@@ -0,0 +1,44 @@
+from sqlalchemy import Column, Integer, Boolean, DateTime, JSON, Index, UniqueConstraint
+from app.db import Base
+from datetime import datetime
+
+class Edit(Base):
+    __tablename__ = "edits"
+    __table_args__ = (
+        # Serves listing an image's edits: WHERE image_id = ? ORDER BY id
+        Index("ix_edits_image_id", "image_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)  # Foreign key to User table
+    image_id = Column(Integer, nullable=False)  # Foreign key to Image table; the source the edits apply to
+    operations = Column(JSON, nullable=False, default=list)  # Ordered list of edit operations, see schemas.edit
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Timestamp of when the edit was created
+    updated_at = Column(DateTime, nullable=True)  # Timestamp of the last change to the operations
+
+class EditHistoryEntry(Base):
+    __tablename__ = "edit_history"
+    __table_args__ = (
+        # One version number per image; serves keyset listing: WHERE image_id = ? AND seq > ? ORDER BY seq
+        UniqueConstraint("image_id", "seq", name="uq_edit_history_image_seq"),
+        # Serves redo: the newest child of the current version, WHERE image_id = ? AND parent_seq = ? ORDER BY seq DESC
+        Index("ix_edit_history_image_parent_seq", "image_id", "parent_seq", "seq"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    image_id = Column(Integer, nullable=False)  # Foreign key to Image table
+    seq = Column(Integer, nullable=False)  # Version number, increasing per image; entries are never modified
+    parent_seq = Column(Integer, nullable=False)  # Version this one was made from; 0 is the unedited image
+    base_seq = Column(Integer, nullable=False)  # Nearest snapshot on the parent chain (this entry itself if a snapshot)
+    depth = Column(Integer, nullable=False)  # Number of deltas since base_seq
+    snapshot = Column(Boolean, nullable=False, default=False)  # Whether `payload` is the full operation list
+    payload = Column(JSON, nullable=False)  # Full operations for snapshots, otherwise a delta against the parent
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class EditHistoryHead(Base):
+    __tablename__ = "edit_history_heads"
+
+    image_id = Column(Integer, primary_key=True)  # Foreign key to Image table
+    head_seq = Column(Integer, nullable=False, default=0)  # Current version; undo and redo only move this pointer
+    tip_seq = Column(Integer, nullable=False, default=0)  # Highest version number handed out
+    updated_at = Column(DateTime, nullable=True)
@@ -1,13 +1,25 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index, LargeBinary
 from app.db import Base
+from datetime import datetime
 
 class Image(Base):
     __tablename__ = "images"
+    __table_args__ = (
+        # Serves keyset pagination: WHERE user_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC
+        Index("ix_images_user_created_id", "user_id", "created_at", "id"),
+        # Serves upload deduplication: WHERE user_id = ? AND content_hash = ?
+        Index("ix_images_user_content_hash", "user_id", "content_hash"),
+        # Serves the library export: WHERE user_id = ? AND id > ? ORDER BY id
+        Index("ix_images_user_id_id", "user_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False)  # Foreign key to User table
     url = Column(String, nullable=False)  # URL of the image
     public_id = Column(String, unique=True, nullable=False)  # Unique identifier for the image in Cloudinary
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of the uploaded bytes, used to deduplicate re-uploads
+    phash = Column(String(16), nullable=True)  # 64-bit perceptual hash in hex, None if the image could not be decoded
+    color_histogram = Column(LargeBinary, nullable=True)  # 64-bucket RGB histogram, one byte per bucket
     processed = Column(Boolean, default=False)  # Whether the image has been processed
-    created_at = Column(String, nullable=False)  # Timestamp of when the image was uploaded
-    updated_at = Column(String, nullable=True)  # Timestamp of the last update to the image
\ No newline at end of file
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Timestamp of when the image was uploaded
+    updated_at = Column(DateTime, nullable=True)  # Timestamp of the last update to the image
@@ -0,0 +1,38 @@
+"""
+Reconcile storage with the image records: `python -m app.reconcile [--dry-run] [--restart]`.
+
+Deletes storage objects no record points to and records whose object is gone, checkpointing
+after every batch so an interrupted run resumes where it stopped (see app.core.reconcile).
+Meant to run from a scheduled job, one at a time.
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+# Register every model on Base.metadata
+from app.models import edit, image, user  # noqa: F401
+from app import db
+from app.core import config
+from app.core.reconcile import reconcile
+from app.core.redis_client import close_redis
+from app.core.storage import close_storage
+
+
+async def main(args: argparse.Namespace) -> dict:
+    try:
+        return await reconcile(args.batch_size, args.grace_seconds, args.dry_run, args.restart)
+    finally:
+        await close_storage()
+        await close_redis()
+        await db.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m app.reconcile", description="Delete orphaned storage objects and image records.")
+    parser.add_argument("--dry-run", action="store_true", help="Count the orphans without deleting anything.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of an unfinished run.")
+    parser.add_argument("--batch-size", type=int, default=config.RECONCILE_BATCH_SIZE)
+    parser.add_argument("--grace-seconds", type=int, default=config.RECONCILE_GRACE_SECONDS)
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(asyncio.run(main(parser.parse_args()))))
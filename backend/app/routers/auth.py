@@ -1,14 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app import schemas, crud
-from app.dependencies import get_current_user, get_db
+from app.dependencies import get_current_user, get_db, oauth2_scheme
+from app.core.metrics import span
+from app.core.principal_cache import principal_cache
+from app.core.security import password_hasher
+from app.core.token_store import get_token_store
 from app.core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 from datetime import datetime, timedelta
 from jose import jwt
-from app.models.user import RefreshToken
 import uuid
-from fastapi_limiter.depends import RateLimiter
+from app.core.rate_limit import RateLimiter
 from jose import JWTError
 
 router = APIRouter()
@@ -34,21 +37,21 @@ Returns:
 - A JSON response containing the access token and token type if the signup is successful.
 """
 @router.post("/signup", response_model=schemas.auth.TokenPair, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-def signup(user_in: schemas.auth.UserCreate, db: Session = Depends(get_db)):
-    existing_user = crud.user.get_user(db, user_in.email)
+async def signup(user_in: schemas.auth.UserCreate, db: AsyncSession = Depends(get_db)):
+    existing_user = await crud.user.get_user(db, user_in.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    user = crud.user.create_user(db, user_in)
+    hashed_password = await password_hasher.hash(user_in.password)
+    user = await crud.user.create_user(db, user_in, hashed_password)
     subject = str(user.id)
 
     # 1) Create access token
     access_token = create_access_token(subject)
 
-    # 2) Create refresh token + store its jti in DB
+    # 2) Create refresh token + store its jti in the token store
     refresh_token, jti, expires_at = create_refresh_token(subject)
-    db.add(RefreshToken(jti=jti, user_id=user.id, expires_at=expires_at))
-    db.commit()
+    await get_token_store().add(jti, user.id, expires_at)
 
     return {
         "access_token": access_token,
@@ -67,8 +70,8 @@ Returns:
 - A JSON response containing the access token and token type if the login is successful.
 """
 @router.post("/login", response_model=schemas.auth.TokenPair, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.user.authenticate_user(db, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await crud.user.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -80,9 +83,8 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     access_token = create_access_token(subject)
     refresh_token, jti, expires_at = create_refresh_token(subject)
 
-    # Save refresh token in DB
-    db.add(RefreshToken(jti=jti, user_id=user.id, expires_at=expires_at))
-    db.commit()
+    # Save refresh token in the token store
+    await get_token_store().add(jti, user.id, expires_at)
 
     return {
         "access_token": access_token,
@@ -90,14 +92,14 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
         "token_type": "bearer"
     }
 
-@router.post("/refresh", response_model=schemas.auth.Token, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
-def refresh_token(
+@router.post("/refresh", response_model=schemas.auth.TokenPair, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def refresh_token(
     refresh: schemas.auth.RefreshTokenIn,  # simple schema with one field
-    db: Session = Depends(get_db)
 ):
     # 1) Decode & verify JWT (signature + expiry)
     try:
-        payload = jwt.decode(refresh.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+        with span("jwt.decode"):
+            payload = jwt.decode(refresh.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
@@ -110,35 +112,33 @@ def refresh_token(
     if user_id is None or jti is None:
         raise HTTPException(status_code=401, detail="Malformed token")
 
-    # 3) Look up the jti in the DB, check it's not revoked or expired
-    db_token = db.query(RefreshToken).filter(RefreshToken.jti == jti).first()
-    if not db_token or db_token.revoked or db_token.expires_at < datetime.utcnow():
+    # 3) Revoke the old jti and store the new one in one atomic step;
+    #    fails if the old token is unknown, already revoked or expired
+    new_refresh, new_jti, new_exp = create_refresh_token(user_id)
+    if not await get_token_store().rotate(jti, new_jti, int(user_id), new_exp):
         raise HTTPException(status_code=401, detail="Refresh token invalid or expired")
 
     # 4) Issue a new access token
     new_access = create_access_token(subject=user_id)
-    db_token.revoked = True
-    new_refresh, new_jti, new_exp = create_refresh_token(user_id)
-    db.add(RefreshToken(jti=new_jti, user_id=user_id, expires_at=new_exp))
-    db.commit()
     return {"access_token": new_access, "refresh_token": new_refresh, "token_type": "bearer"}
 """
 Below is the code for user logout.
 Field Descriptions:
 - `refresh`: An instance of `schemas.auth.RefreshTokenIn` containing the refresh token.
-- `db`: A database session dependency that provides access to the database.
+- `token`: The access token of the request, dropped from the principal cache.
 Returns:
 - A JSON response indicating the refresh token has been revoked and the user has been logged out.
 """
 @router.post("/logout", dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
-def logout(
+async def logout(
     refresh: schemas.auth.RefreshTokenIn,
-    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
     current_user = Depends(get_current_user)   # ensure user is logged in
 ):
     # Decode to get jti
     try:
-        payload = jwt.decode(refresh.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+        with span("jwt.decode"):
+            payload = jwt.decode(refresh.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
@@ -146,10 +146,22 @@ def logout(
     if jti is None:
         raise HTTPException(status_code=400, detail="Token missing jti")
 
-    # Mark it revoked in DB
-    db_token = db.query(RefreshToken).filter(RefreshToken.jti == jti, RefreshToken.user_id == current_user.id).first()
-    if db_token:
-        db_token.revoked = True
-        db.commit()
+    # Revoke it in the token store
+    await get_token_store().revoke(jti, current_user.id)
+    principal_cache.invalidate_token(token)
+
+    return {"message": "Refresh token revoked, user logged out"}
+
+"""
+Below is the code for logging out of every session. The path is POST /auth/logout-all.
+Field Descriptions:
+- `current_user`: The authenticated user whose refresh tokens are all revoked.
+Returns:
+- A JSON response indicating every refresh token of the user has been revoked.
+"""
+@router.post("/logout-all", dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def logout_all(current_user = Depends(get_current_user)):
+    await get_token_store().revoke_all(current_user.id)
+    principal_cache.invalidate_user(current_user.id)
 
-    return {"message": "Refresh token revoked, user logged out"}
\ No newline at end of file
+    return {"message": "All refresh tokens revoked, user logged out everywhere"}
\ No newline at end of file
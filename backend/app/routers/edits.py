@@ -0,0 +1,177 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from PIL import UnidentifiedImageError
+from app import models
+from app.crud import edit as edit_crud
+from app.crud import image as image_crud
+from app.core.edit_graph import OUTPUT_FORMATS
+from app.core.render_cache import render_cache
+from app.core.storage import StorageError, get_storage
+from app.dependencies import get_current_user
+from app.schemas import edit as edit_schemas
+from app.db import get_db, get_read_db
+from app.core.rate_limit import RateLimiter
+from typing import Literal
+router = APIRouter()
+
+
+async def _get_owned_image(db: AsyncSession, image_id: int, user: models.user.User) -> models.image.Image:
+    image = await image_crud.get_image(db, image_id)
+    if not image:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    if image.user_id != user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to access this image")
+    return image
+
+
+async def _get_owned_edit(db: AsyncSession, edit_id: int, user: models.user.User) -> models.edit.Edit:
+    edit = await edit_crud.get_edit(db, edit_id)
+    if not edit:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Edit not found")
+    if edit.user_id != user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to access this edit")
+    return edit
+
+
+async def _render(image: models.image.Image, operations: list[dict], image_format: str, quality: int) -> Response:
+    """Serve a render from the render cache, rendering it in the process pool on a miss."""
+    async def load_source() -> bytes:
+        try:
+            return await get_storage().read_image(image.public_id)
+        except StorageError:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Failed to fetch image from storage")
+
+    try:
+        content = await render_cache.render(image.public_id, operations, image_format, quality, load_source)
+    except UnidentifiedImageError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Source image cannot be decoded")
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+    return Response(content=content, media_type=OUTPUT_FORMATS[image_format][1])
+
+
+"""
+Below is the code for creating an edit. The path is POST /edits.
+An edit is an ordered chain of operations (crop, resize, rotate, brightness, contrast, curves, blur, sharpen) applied
+to one of the user's images. Nothing is rendered when it is saved; see GET /edits/{edit_id}/render.
+Field Descriptions:
+- `edit_in`: An instance of `schemas.edit.EditCreate` with the source image ID and the operations.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A JSON response containing the saved edit.
+"""
+@router.post("/", response_model=edit_schemas.EditOut, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def create_edit(
+    edit_in: edit_schemas.EditCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    await _get_owned_image(db, edit_in.image_id, current_user)
+    return await edit_crud.create_edit(db, current_user.id, edit_in)
+
+"""
+Below is the code for listing the edits of an image. The path is GET /edits?image_id=...
+Field Descriptions:
+- `image_id`: The ID of the source image.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A JSON response containing the image's edits, oldest first.
+"""
+@router.get("/", response_model=list[edit_schemas.EditOut], dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def list_edits(
+    image_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    await _get_owned_image(db, image_id, current_user)
+    return await edit_crud.get_edits_by_image(db, image_id)
+
+"""
+Below is the code for previewing an edit without saving it. The path is POST /edits/preview.
+Field Descriptions:
+- `edit_in`: An instance of `schemas.edit.EditCreate` with the source image ID and the operations to try.
+- `format`: Output format (jpeg, png or webp).
+- `quality`: Encoder quality for jpeg and webp.
+Returns:
+- The rendered image.
+"""
+# Interactive: an editor previews as the user drags a slider. Renders are cached, and the render pool's
+# bounded queue sheds bursts with 503, so the per-user limit only has to stop runaway clients
+@router.post("/preview", response_class=Response, dependencies=[Depends(RateLimiter(times=60, seconds=60))] )
+async def preview_edit(
+    edit_in: edit_schemas.EditCreate,
+    image_format: Literal["jpeg", "png", "webp"] = Query("jpeg", alias="format"),
+    quality: int = Query(90, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    image = await _get_owned_image(db, edit_in.image_id, current_user)
+    return await _render(image, [operation.model_dump(mode="json") for operation in edit_in.operations], image_format, quality)
+
+"""
+Below is the code for edit retrieval. The path is GET /edits/{edit_id}.
+Field Descriptions:
+- `edit_id`: The ID of the edit to retrieve.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A JSON response containing the edit.
+"""
+@router.get("/{edit_id}", response_model=edit_schemas.EditOut, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def get_edit(edit_id: int, db: AsyncSession = Depends(get_read_db), current_user: models.user.User = Depends(get_current_user)):
+    return await _get_owned_edit(db, edit_id, current_user)
+
+"""
+Below is the code for changing an edit. The path is PUT /edits/{edit_id}. The whole operation chain is replaced.
+Field Descriptions:
+- `edit_id`: The ID of the edit to change.
+- `edit_in`: An instance of `schemas.edit.EditUpdate` with the new operations.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A JSON response containing the updated edit.
+"""
+@router.put("/{edit_id}", response_model=edit_schemas.EditOut, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def update_edit(
+    edit_id: int,
+    edit_in: edit_schemas.EditUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    edit = await _get_owned_edit(db, edit_id, current_user)
+    return await edit_crud.update_edit_operations(db, edit, [operation.model_dump(mode="json") for operation in edit_in.operations])
+
+"""
+Below is the code for edit deletion. The path is DELETE /edits/{edit_id}. The source image is left untouched.
+Field Descriptions:
+- `edit_id`: The ID of the edit to delete.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A JSON response containing the deleted edit.
+"""
+@router.delete("/{edit_id}", response_model=edit_schemas.EditOut, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def delete_edit(edit_id: int, db: AsyncSession = Depends(get_db), current_user: models.user.User = Depends(get_current_user)):
+    edit = await _get_owned_edit(db, edit_id, current_user)
+    return await edit_crud.delete_edit(db, edit)
+
+"""
+Below is the code for rendering an edit. The path is GET /edits/{edit_id}/render.
+The chain is planned lazily against the source image (point operations fused, crops and resizes pushed towards the
+source) and rendered in a process pool, so heavy edits never block the API. Renders are cached by source and canonical
+operations; concurrent identical requests render once, and chains sharing a cached prefix resume from it.
+Field Descriptions:
+- `edit_id`: The ID of the edit to render.
+- `format`: Output format (jpeg, png or webp).
+- `quality`: Encoder quality for jpeg and webp.
+Returns:
+- The rendered image.
+"""
+@router.get("/{edit_id}/render", response_class=Response, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def render_edit(
+    edit_id: int,
+    image_format: Literal["jpeg", "png", "webp"] = Query("jpeg", alias="format"),
+    quality: int = Query(90, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    edit = await _get_owned_edit(db, edit_id, current_user)
+    image = await _get_owned_image(db, edit.image_id, current_user)
+    return await _render(image, edit.operations, image_format, quality)
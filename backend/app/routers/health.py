@@ -0,0 +1,55 @@
+import asyncio
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from app.core.config import HEALTH_CHECK_TIMEOUT_SECONDS
+from app.core.redis_client import get_redis
+from app.db import SessionLocal, replicas
+router = APIRouter()
+
+
+async def _check_db() -> None:
+    async with SessionLocal() as db:
+        await db.execute(text("SELECT 1"))
+
+
+async def _check_redis() -> None:
+    await get_redis().ping()
+
+
+"""
+Below is the code for the liveness probe. The path is GET /health/live.
+It touches no dependency, so an outage of the database or Redis never gets healthy pods restarted; it only fails when
+the worker's event loop is stuck.
+Returns:
+- A JSON response with status "ok".
+"""
+@router.get("/live")
+async def live():
+    return {"status": "ok"}
+
+"""
+Below is the code for the readiness probe. The path is GET /health/ready.
+The database and Redis are checked concurrently, each bounded by HEALTH_CHECK_TIMEOUT_SECONDS. The server only starts
+accepting connections once the startup hooks have run, so a pod is never reported ready half initialised.
+Read replicas are listed but never make the pod unready: their reads fall back to the primary.
+Returns:
+- A JSON response with the state of each dependency and replica; the status code is 503 when the database or Redis is
+unavailable.
+"""
+@router.get("/ready")
+async def ready():
+    checks = {"database": _check_db(), "redis": _check_redis()}
+    outcomes = await asyncio.gather(
+        *(asyncio.wait_for(check, HEALTH_CHECK_TIMEOUT_SECONDS) for check in checks.values()),
+        return_exceptions=True,
+    )
+    results = {
+        name: "ok" if outcome is None else f"unavailable: {type(outcome).__name__}"
+        for name, outcome in zip(checks, outcomes)
+    }
+    ok = all(result == "ok" for result in results.values())
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ok else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if ok else "not_ready", "checks": results, "replicas": replicas.stats()},
+    )
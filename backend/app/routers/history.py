@@ -0,0 +1,186 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.crud import edit as edit_crud
+from app.crud import image as image_crud
+from app.core.config import HISTORY_STREAM_BATCH_SIZE
+from app.dependencies import get_current_user
+from app.schemas import edit as edit_schemas
+from app.db import ReadSessionLocal, get_db, get_read_db
+from app.core.rate_limit import RateLimiter
+from typing import Optional
+import json
+router = APIRouter()
+
+
+async def _check_owner(db: AsyncSession, image_id: int, user: models.user.User) -> None:
+    image = await image_crud.get_image(db, image_id)
+    if not image:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    if image.user_id != user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to access this image")
+
+
+async def _state(db: AsyncSession, image_id: int, head: Optional[models.edit.EditHistoryHead]) -> dict:
+    head_seq = head.head_seq if head else 0
+    return {
+        "image_id": image_id,
+        "head_seq": head_seq,
+        "tip_seq": head.tip_seq if head else 0,
+        "operations": await edit_crud.get_history_operations(db, image_id, head_seq),
+        "can_undo": head_seq > 0,
+        "can_redo": await edit_crud.get_redo_seq(db, image_id, head_seq) is not None,
+    }
+
+
+def _entry_line(entry: models.edit.EditHistoryEntry) -> str:
+    line = {
+        "seq": entry.seq,
+        "parent_seq": entry.parent_seq,
+        "snapshot": entry.snapshot,
+        "created_at": entry.created_at.isoformat(),
+    }
+    line["operations" if entry.snapshot else "delta"] = entry.payload
+    return json.dumps(line) + "\n"
+
+
+"""
+Below is the code for streaming the edit history of an image. The path is GET /history/{image_id}.
+Entries are written as newline-delimited JSON, oldest first, fetched in keyset batches of HISTORY_STREAM_BATCH_SIZE so
+that histories with thousands of steps are never held in memory. Snapshot entries carry the full `operations`; the
+others carry a `delta` against their parent version (keep `prefix` operations and the last `suffix`, put `insert`
+in between).
+Field Descriptions:
+- `image_id`: The ID of the image.
+- `after`: Only stream versions after this one; pass the last `seq` received to resume an interrupted stream.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A newline-delimited JSON stream of history entries.
+"""
+@router.get("/{image_id}", response_class=StreamingResponse, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def stream_history(
+    image_id: int,
+    after: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    await _check_owner(db, image_id, current_user)
+
+    async def entries():
+        # The request's session is closed once the handler returns, so the stream opens its own
+        async with ReadSessionLocal() as stream_db:
+            last_seq = after
+            while True:
+                page = await edit_crud.get_history_page(stream_db, image_id, last_seq, HISTORY_STREAM_BATCH_SIZE)
+                for entry in page:
+                    yield _entry_line(entry)
+                if len(page) < HISTORY_STREAM_BATCH_SIZE:
+                    return
+                last_seq = page[-1].seq
+                stream_db.expunge_all()
+
+    return StreamingResponse(entries(), media_type="application/x-ndjson")
+
+"""
+Below is the code for reading the current state of an image's edit history. The path is GET /history/{image_id}/current.
+Field Descriptions:
+- `image_id`: The ID of the image.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A JSON response with the current and latest version numbers, the operations at the current version and whether
+undo and redo are possible.
+"""
+@router.get("/{image_id}/current", response_model=edit_schemas.HistoryStateOut, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def get_history_state(image_id: int, db: AsyncSession = Depends(get_read_db), current_user: models.user.User = Depends(get_current_user)):
+    await _check_owner(db, image_id, current_user)
+    return await _state(db, image_id, await edit_crud.get_history_head(db, image_id))
+
+"""
+Below is the code for rebuilding any version of an image's edits. The path is GET /history/{image_id}/versions/{seq}.
+The version is rebuilt from its nearest snapshot, so at most HISTORY_SNAPSHOT_INTERVAL deltas are replayed.
+Field Descriptions:
+- `image_id`: The ID of the image.
+- `seq`: The version number; 0 is the unedited image.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A JSON list of the operations at that version.
+"""
+@router.get("/{image_id}/versions/{seq}", response_model=list[edit_schemas.EditOperation], dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def get_history_version(
+    image_id: int,
+    seq: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    await _check_owner(db, image_id, current_user)
+    operations = await edit_crud.get_history_operations(db, image_id, seq)
+    if operations is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Version not found")
+    return operations
+
+"""
+Below is the code for recording a new step in an image's edit history. The path is POST /history/{image_id}.
+The new version is made from the current one. As in most editors, making a change after an undo starts a new branch
+and redo follows it, but the undone versions are kept and stay readable.
+Field Descriptions:
+- `image_id`: The ID of the image.
+- `step`: An instance of `schemas.edit.HistoryAppend` with the full operation chain after the change.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A JSON response with the new state of the history.
+"""
+# Steps, undos and redos follow the user's clicks in an editor, so the limit is sized for interactive use
+@router.post("/{image_id}", response_model=edit_schemas.HistoryStateOut, dependencies=[Depends(RateLimiter(times=120, seconds=60))] )
+async def append_history(
+    image_id: int,
+    step: edit_schemas.HistoryAppend,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    await _check_owner(db, image_id, current_user)
+    head = await edit_crud.append_history(db, image_id, [operation.model_dump(mode="json") for operation in step.operations])
+    if head is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="History changed concurrently, reload and retry")
+    return await _state(db, image_id, head)
+
+"""
+Below is the code for undo. The path is POST /history/{image_id}/undo. Only the current-version pointer moves.
+Field Descriptions:
+- `image_id`: The ID of the image.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A JSON response with the new state of the history.
+"""
+@router.post("/{image_id}/undo", response_model=edit_schemas.HistoryStateOut, dependencies=[Depends(RateLimiter(times=120, seconds=60))] )
+async def undo(image_id: int, db: AsyncSession = Depends(get_db), current_user: models.user.User = Depends(get_current_user)):
+    await _check_owner(db, image_id, current_user)
+    head = await edit_crud.get_history_head(db, image_id)
+    if head is None or head.head_seq == 0:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Nothing to undo")
+    entry = await edit_crud.get_history_entry(db, image_id, head.head_seq)
+    # The head can name an entry that is gone if the image's history was deleted meanwhile
+    if entry is None or not await edit_crud.move_history_head(db, image_id, head.head_seq, entry.parent_seq):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="History changed concurrently, reload and retry")
+    await db.refresh(head)
+    return await _state(db, image_id, head)
+
+"""
+Below is the code for redo. The path is POST /history/{image_id}/redo. Only the current-version pointer moves.
+Field Descriptions:
+- `image_id`: The ID of the image.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A JSON response with the new state of the history.
+"""
+@router.post("/{image_id}/redo", response_model=edit_schemas.HistoryStateOut, dependencies=[Depends(RateLimiter(times=120, seconds=60))] )
+async def redo(image_id: int, db: AsyncSession = Depends(get_db), current_user: models.user.User = Depends(get_current_user)):
+    await _check_owner(db, image_id, current_user)
+    head = await edit_crud.get_history_head(db, image_id)
+    redo_seq = await edit_crud.get_redo_seq(db, image_id, head.head_seq) if head else None
+    if redo_seq is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Nothing to redo")
+    if not await edit_crud.move_history_head(db, image_id, head.head_seq, redo_seq):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="History changed concurrently, reload and retry")
+    await db.refresh(head)
+    return await _state(db, image_id, head)
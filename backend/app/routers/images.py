@@ -1,61 +1,340 @@
-from fastapi import APIRouter, Depends, UploadFile, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, UploadFile, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from PIL import UnidentifiedImageError
 from app import models
+from app.crud import edit as edit_crud
 from app.crud import image as image_crud
-from app.core import cloudinary_client
+from app.core import features, jobs, pagination, uploads
+from app.core.content_cache import content_cache
+from app.core.metrics import record_dedup, span
+from app.core.similarity import similarity_index
+from app.core.storage import StorageError, get_storage
+from app.core.config import MAX_BATCH_FILES, BATCH_UPLOAD_CONCURRENCY, IMAGE_EXPORT_BATCH_SIZE, SIMILARITY_MAX_DISTANCE, UPLOAD_CHUNK_SIZE
 from app.dependencies import get_current_user
 from app.schemas import image as image_schemas
-from app.db import get_db
-import io
-from fastapi_limiter.depends import RateLimiter
+from app.db import ReadSessionLocal, get_db, get_read_db
+from app.core.rate_limit import RateLimiter
+import asyncio
+import json
+import os
+from typing import BinaryIO, Optional
 router = APIRouter()
 
+
+def _feature_fields(image_features: Optional[features.ImageFeatures]) -> dict:
+    """ImageCreate fields for the computed features; empty when the image could not be decoded."""
+    if image_features is None:
+        return {}
+    return {"phash": features.hash_to_hex(image_features.phash), "color_histogram": image_features.histogram}
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against a strong ETag."""
+    if not if_none_match:
+        return False
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _byte_range(range_header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    Parse a `Range` header into the inclusive first and last byte to serve.
+
+    Only a single byte range is honoured; other units, multiple ranges and malformed headers
+    return None, which serves the whole file as HTTP allows.
+
+    :raises HTTPException: 416 if the range starts past the end of the file.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, dash, last = range_header[len("bytes="):].strip().partition("-")
+    if not dash or not (first or last) or any(part and not part.isdecimal() for part in (first, last)):
+        return None
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # Suffix range: the last N bytes; "-0" asks for none
+        start, end = (max(0, size - int(last)) if int(last) else size), size - 1
+    if start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+async def _file_chunks(file: BinaryIO, start: int, length: int):
+    try:
+        await asyncio.to_thread(file.seek, start)
+        while length > 0:
+            chunk = await asyncio.to_thread(file.read, min(UPLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
 """
 Below is the code for image upload. The path is POST /images/upload.
-This endpoint allows users to upload images to the application, which are then stored in Cloudinary and the database.
+This endpoint allows users to upload images to the application, which are then stored in the storage backend (Cloudinary) and the database.
 Field Descriptions:
-- `image_in`: A multipart form data UploadFile containing the image file and metadata. The data is first checked for authentication, ensuring it is not larger than 10MB or smaller than 1KB.
-The format should be a valid image type (e.g., JPEG, PNG). 
+- `image_in`: A multipart form data UploadFile containing the image file and metadata. The data is first checked for authentication, then read in chunks to ensure it is not larger than 10MB or smaller than 1KB.
+The format is detected from the file's magic bytes and should be a valid image type (e.g., JPEG, PNG, GIF).
 - `db`: A database session dependency that provides access to the database.
 Returns:
-- A JSON response containing the image details if the upload is successful.
+- A JSON response containing the image details if the upload is successful. If the user already uploaded the same bytes,
+the existing image is returned with `deduplicated` set and nothing is stored again.
 """
 @router.post("/upload", response_model=image_schemas.ImageOut, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
-def upload_image(
+async def upload_image(
     image_in: UploadFile,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.user.User = Depends(get_current_user),
 ):
-    contents = image_in.file.read()
-    size = len(contents)
-    if size > 10 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Image file is too large. Maximum size is 10MB.")
-    if size < 1024:
-        raise HTTPException(status_code=400, detail="Image file is too small. Minimum size is 1KB.")
-
-    # Validate content type
-    if image_in.content_type not in ["image/jpeg", "image/png", "image/gif"]:
-        raise HTTPException(status_code=400, detail="Invalid image file type. Only JPEG, PNG, and GIF are allowed.")
-
-    # Upload to Cloudinary
-    upload_response = cloudinary_client.upload_image(io.BytesIO(contents))
-    if not upload_response:
-        raise HTTPException(status_code=500, detail="Failed to upload image to Cloudinary")
+    # Read the spooled body in chunks: enforces the size limits, sniffs the real format and hashes the contents
+    with span("upload.scan"):
+        scan = await run_in_threadpool(uploads.scan_upload, image_in.file)
+
+    # Same bytes uploaded before: answer with the existing image instead of storing a copy
+    existing = await image_crud.get_image_by_hash(db, current_user.id, scan.content_hash)
+    if existing:
+        record_dedup(scan.size)
+        return image_schemas.ImageOut.model_validate(existing, from_attributes=True).model_copy(update={"deduplicated": True})
+
+    # Perceptual hash and color histogram for similarity search
+    with span("image.features"):
+        image_features = await run_in_threadpool(features.compute_features, image_in.file)
+
+    # Upload to storage straight from the spooled buffer, no intermediate copy
+    try:
+        upload_response = await get_storage().upload_image(image_in.file)
+    except StorageError:
+        raise HTTPException(status_code=500, detail="Failed to upload image to storage")
 
     # Save to DB
     img_in = image_schemas.ImageCreate(
         user_id=current_user.id,
         url=upload_response["url"],
         public_id=upload_response["public_id"],
+        content_hash=scan.content_hash,
+        processed=True,
+        **_feature_fields(image_features),
     )
-    image = image_crud.create_image(db=db, image_in=img_in)
+    image = await image_crud.create_image(db=db, image_in=img_in)
     if not image:
         raise HTTPException(status_code=500, detail="Failed to save image details to the database")
+    similarity_index.add(image)
 
     return image
 
 
 
+"""
+Below is the code for asynchronous image upload. The path is POST /images/upload/async.
+The file is validated exactly like POST /images/upload, staged to local disk and an image record is
+created right away with `processed=False`. A background worker uploads it to storage and flips `processed`.
+Field Descriptions:
+- `image_in`: A multipart form data UploadFile containing the image file.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- 202 Accepted with the job ID and image ID; poll GET /images/jobs/{job_id} for progress. A re-upload of bytes the user
+already has returns the existing image ID with `deduplicated` set and no job.
+"""
+@router.post("/upload/async", status_code=status.HTTP_202_ACCEPTED, response_model=image_schemas.UploadJobOut, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def upload_image_async(
+    image_in: UploadFile,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    with span("upload.scan"):
+        scan = await run_in_threadpool(uploads.scan_upload, image_in.file)
+
+    existing = await image_crud.get_image_by_hash(db, current_user.id, scan.content_hash)
+    if existing:
+        record_dedup(scan.size)
+        return {"image_id": existing.id, "state": "done", "deduplicated": True}
+
+    with span("image.features"):
+        image_features = await run_in_threadpool(features.compute_features, image_in.file)
+
+    # Reserve the storage public id up front so the row can be inserted before the upload happens
+    public_id = get_storage().new_public_id()
+    path = await run_in_threadpool(jobs.stage_upload, image_in.file)
+    image = None
+    try:
+        img_in = image_schemas.ImageCreate(
+            user_id=current_user.id,
+            url=get_storage().get_image_url(public_id),
+            public_id=public_id,
+            content_hash=scan.content_hash,
+            **_feature_fields(image_features),
+        )
+        image = await image_crud.create_image(db=db, image_in=img_in)
+        similarity_index.add(image)
+        job_id = await jobs.enqueue_upload(current_user.id, image.id, public_id, path)
+    except Exception as exc:
+        # No job will ever pick the staged file up, and reconcile does not scan the staging directory
+        os.remove(path)
+        if image is not None:
+            await image_crud.delete_image(db, image.id)
+            similarity_index.remove(current_user.id, [image.id])
+        if isinstance(exc, jobs.QueueFull):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Upload queue is full, try again later",
+                headers={"Retry-After": "5"},
+            )
+        raise
+
+    return {"job_id": job_id, "image_id": image.id, "state": "queued"}
+
+"""
+Below is the code for polling an asynchronous upload. The path is GET /images/jobs/{job_id}.
+Field Descriptions:
+- `job_id`: The job ID returned by POST /images/upload/async.
+Returns:
+- The job state (queued, processing, done or failed) and the image ID it belongs to.
+"""
+@router.get("/jobs/{job_id}", response_model=image_schemas.UploadJobOut)
+async def get_upload_job(job_id: str, current_user: models.user.User = Depends(get_current_user)):
+    job = await jobs.get_job(job_id)
+    if not job or int(job["user_id"]) != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload job not found")
+
+    return {"job_id": job_id, "image_id": int(job["image_id"]), "state": job["state"], "error": job.get("error")}
+
+
+"""
+Below is the code for batch image upload. The path is POST /images/batch.
+Many files are sent in one multipart request. Each is validated like POST /images/upload, the valid ones are uploaded
+to storage with at most BATCH_UPLOAD_CONCURRENCY uploads in flight, and all resulting records are inserted in a single
+transaction. Files whose bytes the user already has (or that repeat within the batch) are deduplicated instead of uploaded.
+The whole batch counts as one request for rate limiting.
+Field Descriptions:
+- `files`: The multipart form data UploadFiles, at most MAX_BATCH_FILES of them.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A JSON response with one result per file, in submission order; files that failed do not fail the batch.
+"""
+@router.post("/batch", response_model=image_schemas.BatchUploadOut, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def upload_batch(
+    files: list[UploadFile],
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files. Maximum is {MAX_BATCH_FILES} per batch.")
+
+    storage = get_storage()
+    semaphore = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+
+    async def scan_one(upload: UploadFile):
+        try:
+            with span("upload.scan"):
+                return await run_in_threadpool(uploads.scan_upload, upload.file)
+        except HTTPException as exc:
+            return exc.detail
+
+    async def upload_one(upload: UploadFile, scan: uploads.UploadScan):
+        with span("image.features"):
+            image_features = await run_in_threadpool(features.compute_features, upload.file)
+        async with semaphore:
+            try:
+                response = await storage.upload_image(upload.file)
+            except StorageError:
+                return "Failed to upload image to storage"
+        return image_schemas.ImageCreate(
+            user_id=current_user.id,
+            url=response["url"],
+            public_id=response["public_id"],
+            content_hash=scan.content_hash,
+            processed=True,
+            **_feature_fields(image_features),
+        )
+
+    scans = await asyncio.gather(*(scan_one(upload) for upload in files))
+    hashes = list({scan.content_hash for scan in scans if isinstance(scan, uploads.UploadScan)})
+    existing = {image.content_hash: image for image in await image_crud.get_images_by_hashes(db, current_user.id, hashes)}
+
+    # Upload each new content only once, even if the batch contains it several times
+    first_uploads = {}
+    for upload, scan in zip(files, scans):
+        if isinstance(scan, uploads.UploadScan) and scan.content_hash not in existing:
+            first_uploads.setdefault(scan.content_hash, (upload, scan))
+    outcomes = await asyncio.gather(*(upload_one(upload, scan) for upload, scan in first_uploads.values()))
+    outcomes = dict(zip(first_uploads, outcomes))
+    uploaded = [outcome for outcome in outcomes.values() if isinstance(outcome, image_schemas.ImageCreate)]
+
+    # Save to DB in one statement; on failure, don't leave the uploaded objects behind
+    try:
+        images = await image_crud.create_images(db, uploaded)
+    except Exception:
+        await storage.delete_images([img.public_id for img in uploaded])
+        raise HTTPException(status_code=500, detail="Failed to save image details to the database")
+    for image in images:
+        similarity_index.add(image)
+    existing.update((image.content_hash, image) for image in images)
+
+    results = []
+    for upload, scan in zip(files, scans):
+        if not isinstance(scan, uploads.UploadScan):
+            results.append({"filename": upload.filename, "status": "failed", "error": scan})
+        elif scan.content_hash not in existing:
+            results.append({"filename": upload.filename, "status": "failed", "error": outcomes[scan.content_hash]})
+        elif scan.content_hash in first_uploads and first_uploads[scan.content_hash][0] is upload:
+            results.append({"filename": upload.filename, "status": "created", "image": existing[scan.content_hash]})
+        else:
+            record_dedup(scan.size)
+            image = image_schemas.ImageOut.model_validate(existing[scan.content_hash], from_attributes=True)
+            image = image.model_copy(update={"deduplicated": True})
+            results.append({"filename": upload.filename, "status": "deduplicated", "image": image})
+
+    counts = {outcome: sum(result["status"] == outcome for result in results) for outcome in ("created", "deduplicated", "failed")}
+    return {"results": results, **counts}
+
+def _export_line(row) -> str:
+    return json.dumps({
+        "id": row.id,
+        "user_id": row.user_id,
+        "url": row.url,
+        "public_id": row.public_id,
+        "processed": row.processed,
+        "phash": row.phash,
+        "created_at": row.created_at.isoformat(),
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+    }) + "\n"
+
+"""
+Below is the code for exporting an image library. The path is GET /images/export.
+Every image of the current user is written as newline-delimited JSON, one image per line with the fields of GET
+/images/{image_id}, in ascending ID order. Rows are read from a server-side cursor IMAGE_EXPORT_BATCH_SIZE at a time
+and each batch is written out before the next is fetched, so memory stays flat whatever the size of the library.
+Field Descriptions:
+- `after_id`: Only export images with a higher ID; pass the last `id` received to resume an interrupted export.
+Returns:
+- A newline-delimited JSON stream of the user's images.
+"""
+@router.get("/export", response_class=StreamingResponse, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def export_images(
+    after_id: int = Query(0, ge=0),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    user_id = current_user.id
+
+    async def lines():
+        # The request's session is closed once the handler returns, so the stream opens its own
+        async with ReadSessionLocal() as stream_db:
+            async for batch in image_crud.stream_images_by_user(stream_db, user_id, after_id, IMAGE_EXPORT_BATCH_SIZE):
+                yield "".join(_export_line(row) for row in batch)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 """
 Below is the code for image retrieval. The path is GET /images/{image_id}. It should verify the image belongs 
 to the current user (via get_current_user) and return { "id": ..., "url": ..., "uploaded_at": ... }.
@@ -66,9 +345,9 @@ Returns:
 - A JSON response containing the image details if the retrieval is successful.
 """
 @router.get("/{image_id}", response_model=image_schemas.ImageOut, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
-def get_image(image_id: int, db: Session = Depends(get_db), current_user: models.user.User = Depends(get_current_user)):
+async def get_image(image_id: int, db: AsyncSession = Depends(get_read_db), current_user: models.user.User = Depends(get_current_user)):
     # Check if the image exists
-    image = image_crud.get_image(db, image_id)
+    image = await image_crud.get_image(db, image_id)
     if not image:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
     # Check if the image belongs to the current user
@@ -77,9 +356,117 @@ def get_image(image_id: int, db: Session = Depends(get_db), current_user: models
  
     return image # Return the image details
 
+"""
+Below is the code for image delivery. The path is GET /images/{image_id}/content.
+The bytes are served by the API itself rather than from the storage URL, so access is checked on every request. Originals
+and thumbnails are kept in a size-capped disk cache (see app.core.content_cache): popular images are served from local
+disk, and a miss streams the original in from storage in chunks. Content never changes for a given image, so the ETag
+is known without touching storage, and a matching If-None-Match is answered with 304 straight away. A single byte range
+(`Range: bytes=...`) is served as 206 Partial Content, honouring If-Range.
+Field Descriptions:
+- `image_id`: The ID of the image.
+- `width`: Serve a JPEG thumbnail of this width instead of the original; one of CONTENT_THUMBNAIL_WIDTHS. Images
+narrower than that are re-encoded at their own size.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- The image bytes (200), a part of them (206), 304 Not Modified, or 416 for a range past the end.
+"""
+# Viewing a gallery fetches many images at once, so the limit is higher than for the JSON routes
+@router.get("/{image_id}/content", response_class=StreamingResponse, dependencies=[Depends(RateLimiter(times=120, seconds=60))] )
+async def get_image_content(
+    image_id: int,
+    request: Request,
+    width: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    if width is not None and width not in content_cache.thumbnail_widths:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Thumbnail width must be one of {', '.join(map(str, content_cache.thumbnail_widths))}",
+        )
+    image = await image_crud.get_image(db, image_id)
+    if not image:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    if image.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to access this image")
+
+    etag = f'"{content_cache.key(image.public_id, width)}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable", "Accept-Ranges": "bytes"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    try:
+        if width:
+            cached = await content_cache.thumbnail(image.public_id, width)
+        else:
+            cached = await content_cache.original(image.public_id)
+    except StorageError:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Failed to fetch image from storage")
+    except UnidentifiedImageError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Source image cannot be decoded")
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+
+    # A range only applies to the version the client already has part of
+    if_range = request.headers.get("if-range")
+    try:
+        byte_range = _byte_range(request.headers.get("range"), cached.size) if if_range in (None, etag) else None
+    except HTTPException:
+        cached.file.close()
+        raise
+    start, end = byte_range or (0, cached.size - 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{cached.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _file_chunks(cached.file, start, end - start + 1),
+        status_code=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        media_type=cached.content_type,
+        headers=headers,
+    )
+
+"""
+Below is the code for finding similar images. The path is GET /images/{image_id}/similar.
+Candidates are the current user's images whose perceptual hash is within `max_distance` bits of this image's, found in
+an in-memory index of the user's hashes. They are ordered by hash distance, then by how close their color histograms are.
+Field Descriptions:
+- `image_id`: The ID of the image to find look-alikes of.
+- `max_distance`: The largest Hamming distance (out of 64 bits) still considered similar.
+- `limit`: The maximum number of similar images to return.
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A JSON response with the similar images, closest first, and their distances.
+"""
+@router.get("/{image_id}/similar", response_model=image_schemas.SimilarImagesOut, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def get_similar_images(
+    image_id: int,
+    max_distance: int = Query(SIMILARITY_MAX_DISTANCE, ge=0, le=64),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    image = await image_crud.get_image(db, image_id)
+    if not image:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    if image.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to access this image")
+    if image.phash is None:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Image features are not available")
+
+    matches = await similarity_index.search(db, image, max_distance, limit)
+    images = {similar.id: similar for similar in await image_crud.get_images_by_ids(db, [match[0] for match in matches])}
+    items = [
+        {"image": images[match_id], "distance": distance, "color_distance": color_distance}
+        for match_id, distance, color_distance in matches
+        if match_id in images
+    ]
+    return {"items": items}
+
 """
 Below is the code for image deletion. The path is DELETE /images/{image_id}. It should verify the image belongs
-to the current user (via get_current_user) and delete the image from both Cloudinary and the database.
+to the current user (via get_current_user) and delete the image from both the storage backend and the database,
+along with its edits and edit history.
 Field Descriptions:
 - `image_id`: The ID of the image to delete.
 - `db`: A database session dependency that provides access to the database.
@@ -87,37 +474,109 @@ Returns:
 - A JSON response containing the deleted image details if the deletion is successful.
 """
 @router.delete("/{image_id}", response_model=image_schemas.ImageOut, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
-def delete_image(image_id: int, db: Session = Depends(get_db), current_user: models.user.User = Depends(get_current_user)):
+async def delete_image(image_id: int, db: AsyncSession = Depends(get_db), current_user: models.user.User = Depends(get_current_user)):
     # Check if the image exists
-    image = image_crud.get_image(db, image_id)
+    image = await image_crud.get_image(db, image_id)
     if not image:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
     # Check if the image belongs to the current user
     if image.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to delete this image")
     
-    # Delete the image from Cloudinary
-    cloudinary_client.delete_image(image.public_id)
+    # Delete the image from storage
+    try:
+        await get_storage().delete_image(image.public_id)
+    except StorageError:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Failed to delete image from storage")
     
     # Delete the image from the database
-    deleted_image = image_crud.delete_image(db, image_id)
+    deleted_image = await image_crud.delete_image(db, image_id)
     if not deleted_image:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete image from database")
+    similarity_index.remove(current_user.id, [image_id])
+    await edit_crud.delete_edits_by_images(db, [image_id])
+    await edit_crud.delete_history_by_images(db, [image_id])
+    await asyncio.to_thread(content_cache.discard, [image.public_id])
     
     return deleted_image
 
-"""Below is the code for listing images. The path is GET /images. It should return a list of images uploaded by the current user.
+"""
+Below is the code for bulk image deletion. The path is POST /images/bulk-delete.
+Ownership of every requested image is verified with one query, the storage objects are removed through the provider's
+batch delete API, and the records of the images whose storage object is gone are deleted with a single statement.
+Field Descriptions:
+- `body`: An instance of `schemas.image.BulkDeleteIn` with the IDs to delete (at most 1000).
+- `db`: A database session dependency that provides access to the database.
+Returns:
+- A JSON response with the outcome for each requested ID (deleted, not_found, forbidden or storage_error).
+"""
+@router.post("/bulk-delete", response_model=image_schemas.BulkDeleteOut, dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
+async def bulk_delete_images(
+    body: image_schemas.BulkDeleteIn,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    image_ids = list(dict.fromkeys(body.ids))
+    images = {image.id: image for image in await image_crud.get_images_by_ids(db, image_ids)}
+    owned = [image for image in images.values() if image.user_id == current_user.id]
+
+    # Delete from storage first; rows are only removed once their asset is gone
+    failed = await get_storage().delete_images([image.public_id for image in owned])
+    to_delete = [image.id for image in owned if image.public_id not in failed]
+    await image_crud.delete_images(db, to_delete)
+    similarity_index.remove(current_user.id, to_delete)
+    await edit_crud.delete_edits_by_images(db, to_delete)
+    await edit_crud.delete_history_by_images(db, to_delete)
+    await asyncio.to_thread(content_cache.discard, [image.public_id for image in owned if image.public_id not in failed])
+
+    results = []
+    for image_id in image_ids:
+        image = images.get(image_id)
+        if image is None:
+            outcome = "not_found"
+        elif image.user_id != current_user.id:
+            outcome = "forbidden"
+        elif image.public_id in failed:
+            outcome = "storage_error"
+        else:
+            outcome = "deleted"
+        results.append({"id": image_id, "status": outcome})
+
+    return {"results": results, "deleted": len(to_delete)}
+
+"""Below is the code for listing images. The path is GET /images. It should return a list of images uploaded by the current user, newest first.
+Pagination is keyset based: when another page follows, its cursor is sent in the `X-Next-Cursor` response header; pass it
+back as `cursor`. `skip` (offset pagination) is still accepted for older clients, but gets slower the deeper it goes.
 Field Descriptions:
-- `skip`: The number of images to skip (for pagination).
+- `cursor`: Opaque cursor returned in the `X-Next-Cursor` header of the previous page.
+- `skip`: The number of images to skip (offset pagination, ignored when `cursor` is given).
 - `limit`: The maximum number of images to return (for pagination).
 - `db`: A database session dependency that provides access to the database.
 Returns:
-- A JSON response containing a list of images uploaded by the current user.
+- A JSON response containing a list of images uploaded by the current user, as before cursors existed.
 """
 @router.get("/", response_model=list[image_schemas.ImageOut], dependencies=[Depends(RateLimiter(times=5, seconds=60))] )
-def list_images(skip: int = 0, limit: int = 20, db: Session = Depends(get_db), current_user: models.user.User = Depends(get_current_user)):
-    # Fetch images uploaded by the current user
-    images = image_crud.get_images_by_user(db, user_id=current_user.id, skip=skip, limit=limit)
-    
-    return images
+async def list_images(
+    response: Response,
+    cursor: Optional[str] = None,
+    skip: Optional[int] = Query(None, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.user.User = Depends(get_current_user),
+):
+    # Fetch one extra row to know whether another page follows
+    if cursor is None and skip is not None:
+        images = await image_crud.get_images_by_user(db, user_id=current_user.id, skip=skip, limit=limit + 1)
+    else:
+        try:
+            after = pagination.decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        images = await image_crud.get_images_page(db, user_id=current_user.id, after=after, limit=limit + 1)
+
+    if len(images) > limit:
+        images = images[:limit]
+        # A header rather than a wrapper object keeps the body the bare list existing clients expect
+        response.headers["X-Next-Cursor"] = pagination.encode_cursor(images[-1].created_at, images[-1].id)
 
+    return images
@@ -0,0 +1,89 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import Annotated, Literal, Union
+from datetime import datetime
+from app.core.config import MAX_EDIT_OPERATIONS
+
+class CropOp(BaseModel):
+    op: Literal["crop"]
+    x: int = Field(ge=0)  # Left edge, in pixels of the image at this point in the chain
+    y: int = Field(ge=0)  # Top edge
+    width: int = Field(gt=0)
+    height: int = Field(gt=0)
+
+class ResizeOp(BaseModel):
+    op: Literal["resize"]
+    width: int | None = Field(None, gt=0, le=20000)  # Omit one dimension to keep the aspect ratio
+    height: int | None = Field(None, gt=0, le=20000)
+
+    @model_validator(mode="after")
+    def check_dimensions(self):
+        if self.width is None and self.height is None:
+            raise ValueError("resize needs a width, a height or both")
+        return self
+
+class RotateOp(BaseModel):
+    op: Literal["rotate"]
+    angle: float  # Degrees counter-clockwise
+    expand: bool = True  # Grow the canvas to fit the rotated image instead of clipping its corners
+
+class BrightnessOp(BaseModel):
+    op: Literal["brightness"]
+    factor: float = Field(ge=0, le=4)  # 1 leaves the image unchanged, 0 is black
+
+class ContrastOp(BaseModel):
+    op: Literal["contrast"]
+    factor: float = Field(ge=0, le=4)  # 1 leaves the image unchanged, 0 is flat gray
+
+class CurvesOp(BaseModel):
+    op: Literal["curves"]
+    channel: Literal["rgb", "r", "g", "b"] = "rgb"
+    points: list[tuple[int, int]] = Field(min_length=2, max_length=16)  # (input, output) levels 0-255, interpolated linearly
+
+    @model_validator(mode="after")
+    def check_points(self):
+        if any(not 0 <= level <= 255 for point in self.points for level in point):
+            raise ValueError("curve levels must be between 0 and 255")
+        return self
+
+class BlurOp(BaseModel):
+    op: Literal["blur"]
+    radius: float = Field(gt=0, le=50)  # Gaussian radius in pixels
+
+class SharpenOp(BaseModel):
+    op: Literal["sharpen"]
+    radius: float = Field(2.0, gt=0, le=50)
+    amount: float = Field(1.0, gt=0, le=5)  # Unsharp-mask strength; 1 adds the full high-pass detail back once
+
+EditOperation = Annotated[
+    Union[CropOp, ResizeOp, RotateOp, BrightnessOp, ContrastOp, CurvesOp, BlurOp, SharpenOp],
+    Field(discriminator="op"),
+]
+
+class EditCreate(BaseModel):
+    image_id: int
+    operations: list[EditOperation] = Field(default_factory=list, max_length=MAX_EDIT_OPERATIONS)
+
+class EditUpdate(BaseModel):
+    operations: list[EditOperation] = Field(max_length=MAX_EDIT_OPERATIONS)
+
+class EditOut(BaseModel):
+    id: int
+    user_id: int
+    image_id: int
+    operations: list[EditOperation]
+    created_at: datetime
+    updated_at: datetime | None = None
+
+    class Config:
+        orm_mode = True  # Allows Pydantic to work with SQLAlchemy models
+
+class HistoryAppend(BaseModel):
+    operations: list[EditOperation] = Field(max_length=MAX_EDIT_OPERATIONS)
+
+class HistoryStateOut(BaseModel):
+    image_id: int
+    head_seq: int  # Current version; 0 is the unedited image
+    tip_seq: int  # Latest version number
+    operations: list[EditOperation]  # Operations at the current version
+    can_undo: bool
+    can_redo: bool
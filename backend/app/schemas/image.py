@@ -1,9 +1,15 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Literal
+from datetime import datetime
 
 class ImageCreate(BaseModel):
     user_id: int
     url: str
     public_id: str
+    content_hash: str | None = None
+    phash: str | None = None
+    color_histogram: bytes | None = None
+    processed: bool = False  # True when the object is already in storage at insert time
 
     class Config:
         orm_mode = True  # Allows Pydantic to work with SQLAlchemy models
@@ -14,8 +20,48 @@ class ImageOut(BaseModel):
     url: str
     public_id: str
     processed: bool = False
-    created_at: str
-    updated_at: str | None = None
+    phash: str | None = None  # Perceptual hash in hex; images a few bits apart look alike
+    created_at: datetime
+    updated_at: datetime | None = None
+    deduplicated: bool = False  # True when the upload matched an existing image and nothing new was stored
 
     class Config:
-        orm_mode = True  # Allows Pydantic to work with SQLAlchemy models
\ No newline at end of file
+        orm_mode = True  # Allows Pydantic to work with SQLAlchemy models
+
+class SimilarImage(BaseModel):
+    image: ImageOut
+    distance: int  # Hamming distance between the perceptual hashes, 0-64
+    color_distance: float  # Distance between the color histograms, 0 (same palette) to 1
+
+class SimilarImagesOut(BaseModel):
+    items: list[SimilarImage]  # Closest first
+
+class BatchUploadResult(BaseModel):
+    filename: str | None = None
+    status: Literal["created", "deduplicated", "failed"]
+    image: ImageOut | None = None
+    error: str | None = None
+
+class BatchUploadOut(BaseModel):
+    results: list[BatchUploadResult]  # One entry per submitted file, in submission order
+    created: int
+    deduplicated: int
+    failed: int
+
+class BulkDeleteIn(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=1000)
+
+class BulkDeleteResult(BaseModel):
+    id: int
+    status: Literal["deleted", "not_found", "forbidden", "storage_error"]
+
+class BulkDeleteOut(BaseModel):
+    results: list[BulkDeleteResult]  # One entry per distinct requested ID
+    deleted: int
+
+class UploadJobOut(BaseModel):
+    job_id: str | None = None  # None when the upload was deduplicated and no job was needed
+    image_id: int
+    state: Literal["queued", "processing", "done", "failed"]
+    error: str | None = None
+    deduplicated: bool = False
@@ -0,0 +1,159 @@
+"""
+Load benchmarks for the API, run against SQLite, LocalStorage and fakeredis.
+
+Run from the backend directory:
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks                          # every scenario, printed as a table
+    python -m benchmarks auth uploads --scale 0.5
+    python -m benchmarks --save benchmarks/baselines/local.json
+    python -m benchmarks --compare benchmarks/baselines/local.json
+
+Each scenario runs in a fresh process on a fresh database, so peak RSS is per scenario.
+`--compare` exits with status 1 when a p95 latency or a throughput is worse than the
+baseline by more than `--tolerance`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_worker(scenario: str, seed: int, scale: float, result_path: str) -> None:
+    """Run one scenario in this process and write its summary to `result_path`."""
+    from benchmarks.harness import Recorder, boot, configure
+
+    workdir = tempfile.mkdtemp(prefix=f"bench-{scenario}-")
+    configure(workdir)
+    from benchmarks.workloads import SCENARIOS
+
+    async def main() -> dict:
+        async with boot() as client:
+            recorder = Recorder(client)
+            await SCENARIOS[scenario](recorder, seed, scale)
+        return recorder.summary()
+
+    try:
+        result = asyncio.run(main())
+        # Read after shutdown, once the process pool workers have been joined
+        result.update(Recorder.peak_rss())
+        with open(result_path, "w") as out:
+            json.dump(result, out)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_scenario(scenario: str, seed: int, scale: float) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+        result_path = tmp.name
+    try:
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks", "--worker", scenario, "--seed", str(seed), "--scale", str(scale), "--result", result_path],
+            cwd=BACKEND_DIR,
+            check=True,
+        )
+        with open(result_path) as result:
+            return json.load(result)
+    finally:
+        os.remove(result_path)
+
+
+def print_results(results: dict) -> None:
+    header = f"{'scenario':<10} {'op':<14} {'requests':>8} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak RSS MB':>12}"
+    print(header)
+    print("-" * len(header))
+    for scenario, result in results.items():
+        rows = [("all", result)] + list(result.get("ops", {}).items())
+        for op, row in rows:
+            rss = f"{result['peak_rss_mb']:.0f}" if op == "all" else ""
+            print(
+                f"{scenario:<10} {op:<14} {row['requests']:>8} {row['errors']:>6} {row['throughput_rps']:>9.1f} "
+                f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {rss:>12}"
+            )
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Describe every scenario or operation whose p95 or throughput regressed past `tolerance`."""
+    regressions = []
+    for scenario, result in results.items():
+        base = baseline["scenarios"].get(scenario)
+        if base is None:
+            continue
+        rows = [("all", result, base)] + [
+            (op, row, base["ops"][op]) for op, row in result.get("ops", {}).items() if op in base.get("ops", {})
+        ]
+        for op, row, base_row in rows:
+            if row["p95_ms"] > base_row["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{scenario}/{op}: p95 {base_row['p95_ms']:.1f} ms -> {row['p95_ms']:.1f} ms")
+            if row["throughput_rps"] * (1 + tolerance) < base_row["throughput_rps"]:
+                regressions.append(f"{scenario}/{op}: throughput {base_row['throughput_rps']:.1f} -> {row['throughput_rps']:.1f} req/s")
+    return regressions
+
+
+def main() -> int:
+    from benchmarks.workloads import SCENARIOS
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Load benchmarks for the API.")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario", help=f"Scenarios to run: {', '.join(SCENARIOS)} (default: all).")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for request and row counts.")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed of every random choice and payload.")
+    parser.add_argument("--save", metavar="PATH", help="Write the results as a JSON baseline.")
+    parser.add_argument("--compare", metavar="PATH", help="Baseline to check the results against.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression (default 0.25).")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.seed, args.scale, args.result)
+        return 0
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for scenario in args.scenarios or list(SCENARIOS):
+        print(f"Running {scenario}...", file=sys.stderr)
+        results[scenario] = run_scenario(scenario, args.seed, args.scale)
+    print_results(results)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as out:
+            json.dump(
+                {
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+                    "settings": {"scale": args.scale, "seed": args.seed, "bcrypt_rounds": int(os.getenv("BCRYPT_ROUNDS", 12))},
+                    "scenarios": results,
+                },
+                out,
+                indent=2,
+            )
+        print(f"Saved baseline to {args.save}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["settings"]["scale"] != args.scale or baseline["settings"]["seed"] != args.seed:
+            print("Warning: baseline was recorded with a different scale or seed", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions beyond tolerance.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
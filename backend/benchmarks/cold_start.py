@@ -0,0 +1,110 @@
+"""
+Cold start of the API server: `python -m benchmarks.cold_start [--server gunicorn] [--runs 5]`.
+
+Each run starts a fresh server process on SQLite and LocalStorage (the schema is migrated
+once beforehand, as in production) and times how long it takes to answer /health/live,
+which the server only does after the startup hooks have run; then it sends SIGTERM and
+times the drain. The app's own import and startup timings are read from /metrics, with a
+scrape token made up for the run.
+Redis is not needed: the server starts without it and reports it through /health/ready.
+"""
+import argparse
+import json
+import os
+import secrets
+import re
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.harness import configure
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_METRIC = re.compile(r'^app_startup_seconds\{phase="(\w+)"\} ([0-9.e+-]+)$', re.M)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _command(server: str, port: int) -> list[str]:
+    if server == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "app.main:app"]
+    return [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)]
+
+
+def measure(server: str, timeout: float) -> dict:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(_command(server, port), cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(timeout=1) as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"{server} exited with status {process.returncode} before answering")
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"{server} did not answer within {timeout:.0f} s")
+                try:
+                    if client.get(f"{url}/health/live").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+            ready = time.perf_counter() - started
+            scrape = client.get(f"{url}/metrics", headers={"Authorization": f"Bearer {os.environ['METRICS_TOKEN']}"})
+            phases = {phase: float(value) for phase, value in STARTUP_METRIC.findall(scrape.text)}
+
+        stopping = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=timeout)
+        return {
+            "ready_s": round(ready, 3),
+            "import_s": round(phases.get("import", 0.0), 3),
+            "startup_s": round(phases.get("startup", 0.0), 3),
+            "stop_s": round(time.perf_counter() - stopping, 3),
+        }
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.cold_start", description="Time server cold starts and drains.")
+    parser.add_argument("--server", choices=["uvicorn", "gunicorn"], default="uvicorn")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for each start and stop.")
+    parser.add_argument("--save", metavar="PATH", help="Write the runs and their medians as JSON.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-cold-start-")
+    try:
+        configure(workdir)
+        os.environ["METRICS_TOKEN"] = secrets.token_urlsafe()
+        subprocess.run([sys.executable, "-m", "app.migrate"], cwd=BACKEND_DIR, check=True, stdout=subprocess.DEVNULL)
+        runs = [measure(args.server, args.timeout) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    medians = {key: round(statistics.median(run[key] for run in runs), 3) for key in runs[0]}
+    for number, run in enumerate(runs, 1):
+        print(f"run {number}: " + "  ".join(f"{key}={value:.3f}" for key, value in run.items()))
+    print("median: " + "  ".join(f"{key}={value:.3f}" for key, value in medians.items()))
+    if args.save:
+        with open(args.save, "w") as out:
+            json.dump({"server": args.server, "runs": runs, "median": medians}, out, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import math
+import os
+import resource
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager, contextmanager
+
+import httpx
+
+
+def configure(workdir: str) -> None:
+    """
+    Point the app at throwaway local stand-ins: SQLite and LocalStorage under `workdir`, and
+    per-process rate limits (disabled, or they would throttle the load). Must run before
+    anything under `app` is imported, since the config is read at import time.
+    """
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "STORAGE_BACKEND": "local",
+        "LOCAL_STORAGE_DIR": os.path.join(workdir, "storage"),
+        "UPLOAD_STAGING_DIR": os.path.join(workdir, "staging"),
+        "RENDER_CACHE_DIR": os.path.join(workdir, "render_cache"),
+        "CONTENT_CACHE_DIR": os.path.join(workdir, "content_cache"),
+        "REFRESH_TOKEN_STORE": "redis",
+        "RATE_LIMIT_ENABLED": "false",
+        "RATE_LIMIT_BACKEND": "memory",
+    })
+
+
+@asynccontextmanager
+async def boot():
+    """
+    Start the app in process with fakeredis standing in for Redis, and yield an HTTP client
+    wired straight to it (no sockets, so the numbers are not skewed by the network stack).
+    """
+    import fakeredis.aioredis
+    from app import db
+    from app.core import redis_client
+    from app.main import app
+
+    redis_client._redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    await db.init_db()
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+            yield client
+    finally:
+        await app.router.shutdown()
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    return values[max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))]
+
+
+def _summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def _peak_rss_mb(who: int) -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Recorder:
+    """
+    Latency samples per operation, taken only inside `measure()` blocks so that seeding and
+    other setup stay out of the results.
+    """
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self.windows: dict[str, list[float]] = {}
+        self.elapsed = 0.0
+
+    async def call(self, op: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request and record its latency under `op`; 4xx and 5xx answers count as errors."""
+        start = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        end = time.perf_counter()
+        self.samples[op].append(end - start)
+        window = self.windows.setdefault(op, [start, end])
+        window[1] = max(window[1], end)
+        self.statuses[response.status_code] += 1
+        if response.status_code >= 400:
+            self.errors[op] += 1
+        return response
+
+    @contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+    def summary(self) -> dict:
+        every = [sample for samples in self.samples.values() for sample in samples]
+        if not every:
+            return {"requests": 0}
+        result = _summarize(every, sum(self.errors.values()), self.elapsed)
+        result["elapsed_s"] = round(self.elapsed, 3)
+        result["statuses"] = {str(code): count for code, count in sorted(self.statuses.items())}
+        # Per-operation throughput is taken over the span that operation was running, so phases
+        # that run one after another are not diluted by each other
+        result["ops"] = {
+            op: _summarize(samples, self.errors[op], self.windows[op][1] - self.windows[op][0])
+            for op, samples in sorted(self.samples.items())
+        }
+        return result
+
+    @staticmethod
+    def peak_rss() -> dict:
+        """
+        Peak resident set size of this process (app and load generator together) and of the
+        largest child (the hashing and rendering pool workers, once they have been joined).
+        """
+        return {"peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF), "peak_child_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN)}
@@ -0,0 +1,116 @@
+"""
+Full reconciliation pass over a large library: `python -m benchmarks.reconcile [--objects 1000000]`.
+
+Seeds LocalStorage and SQLite with `--objects` matching objects and records, plus
+`--orphan-rate` of orphans on each side, then times `app.core.reconcile.reconcile` twice:
+a pass that repairs every orphan and a clean pass over the repaired data. Redis (for the
+checkpoint) is fakeredis. Seeding a million objects takes a minute or two and a million
+inodes, so `--workdir` can point at a roomier disk.
+
+On one CPU with an SSD, a million objects take about 80 s to repair (1% orphans on each
+side) and 55 s for a clean pass; the seeded ID lists dominate the peak RSS.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.harness import Recorder, configure
+
+SEED_CHUNK = 10000
+
+
+def seed_storage(root: str, public_ids: list[str]) -> None:
+    # Written straight to LocalStorage's layout: going through upload_image would cost a thread hop per object
+    for public_id in public_ids:
+        shard = os.path.join(root, public_id[:2])
+        os.makedirs(shard, exist_ok=True)
+        with open(os.path.join(shard, public_id), "wb") as out:
+            out.write(public_id.encode())
+
+
+async def seed_rows(public_ids: list[str]) -> None:
+    from sqlalchemy import insert
+
+    from app.db import SessionLocal
+    from app.models.image import Image
+
+    created_at = datetime.utcnow() - timedelta(days=7)
+    async with SessionLocal() as db:
+        for start in range(0, len(public_ids), SEED_CHUNK):
+            await db.execute(insert(Image), [
+                {"user_id": 1, "url": f"http://bench/media/{public_id}", "public_id": public_id, "processed": True, "created_at": created_at}
+                for public_id in public_ids[start:start + SEED_CHUNK]
+            ])
+            await db.commit()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    import fakeredis.aioredis
+
+    from app import db
+    from app.core import config, redis_client
+    from app.core.reconcile import reconcile
+
+    redis_client._redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    await db.init_db()
+
+    rng = random.Random(args.seed)
+    orphans = round(args.objects * args.orphan_rate)
+    public_ids = [f"{rng.getrandbits(128):032x}" for _ in range(args.objects + 2 * orphans)]
+    matched, orphan_objects, orphan_rows = public_ids[:args.objects], public_ids[args.objects:args.objects + orphans], public_ids[args.objects + orphans:]
+
+    started = time.perf_counter()
+    await asyncio.to_thread(seed_storage, config.LOCAL_STORAGE_DIR, matched + orphan_objects)
+    await seed_rows(matched + orphan_rows)
+    print(f"Seeded {len(matched) + len(orphan_objects)} objects and {len(matched) + len(orphan_rows)} rows in {time.perf_counter() - started:.0f} s", file=sys.stderr)
+
+    # Everything was seeded before the pass starts, so no grace period is needed
+    repair = await reconcile(args.batch_size, grace_seconds=0)
+    clean = await reconcile(args.batch_size, grace_seconds=0)
+    await db.close_db()
+    if repair["objects_deleted"] != len(orphan_objects) or repair["rows_deleted"] != len(orphan_rows):
+        raise RuntimeError(f"Repaired the wrong orphans: {repair}")
+    return {"objects": args.objects, "orphans_per_side": orphans, "batch_size": args.batch_size, "repair": repair, "clean": clean}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.reconcile", description="Time a full storage reconciliation pass.")
+    parser.add_argument("--objects", type=int, default=1_000_000, help="Objects with a matching record.")
+    parser.add_argument("--orphan-rate", type=float, default=0.01, help="Orphans on each side, relative to --objects.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--workdir", help="Directory for the throwaway database and storage (default: a temporary one).")
+    parser.add_argument("--save", metavar="PATH", help="Write the results as JSON.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-reconcile-", dir=args.workdir)
+    try:
+        configure(workdir)
+        result = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    result.update(Recorder.peak_rss())
+
+    for name in ("repair", "clean"):
+        report = result[name]
+        rate = (report["objects_scanned"] + report["rows_scanned"]) / report["seconds"]
+        print(
+            f"{name:<7} {report['seconds']:>8.1f} s  {report['objects_scanned']} objects, {report['rows_scanned']} rows "
+            f"({rate:,.0f} items/s), {report['objects_deleted']} objects and {report['rows_deleted']} rows deleted"
+        )
+    print(f"peak RSS {result['peak_rss_mb']:.0f} MB")
+    if args.save:
+        with open(args.save, "w") as out:
+            json.dump(result, out, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+import asyncio
+import io
+import random
+import uuid
+from typing import Awaitable, Callable, Iterable, NamedTuple
+
+import numpy as np
+from jose import jwt
+from PIL import Image
+
+from benchmarks.harness import Recorder
+
+MB = 1024 * 1024
+PASSWORD = "bench-password"
+
+
+class BenchUser(NamedTuple):
+    id: int
+    email: str
+    headers: dict
+
+
+def _scaled(count: int, scale: float) -> int:
+    return max(1, round(count * scale))
+
+
+async def _each(items: Iterable, concurrency: int, fn: Callable[..., Awaitable]) -> list:
+    """Run `fn` over `items` with at most `concurrency` calls in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(item):
+        async with semaphore:
+            return await fn(item)
+
+    return await asyncio.gather(*(bounded(item) for item in items))
+
+
+class Uploads:
+    """
+    Deterministic JPEG payloads of a chosen size.
+
+    A few base photos (a gradient under noise, so they compress like camera output rather
+    than like flat colour) are padded to the requested size. Decoders ignore bytes after the
+    JPEG end marker, and the padding is random, so every payload is unique and upload
+    deduplication never short-circuits the run.
+    """
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        pixels_rng = np.random.default_rng(seed)
+        self.bases = []
+        for width, height in ((640, 480), (1280, 960), (1920, 1440)):
+            y, x = np.mgrid[0:height, 0:width]
+            gradient = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+            pixels = np.clip(gradient + pixels_rng.integers(-40, 40, size=(height, width, 3)), 0, 255).astype(np.uint8)
+            out = io.BytesIO()
+            Image.fromarray(pixels).save(out, "JPEG", quality=92)
+            self.bases.append(out.getvalue())
+        self.bases.sort(key=len)
+
+    def payload(self, min_bytes: int, max_bytes: int) -> bytes:
+        target = self.rng.randint(min_bytes, max_bytes)
+        fitting = [base for base in self.bases if len(base) + 16 <= target]
+        base = fitting[-1] if fitting else self.bases[0]
+        return base + self.rng.randbytes(max(16, target - len(base)))
+
+
+async def signup(rec: Recorder, email: str, op: str = None) -> BenchUser:
+    """Create a user, recording the request under `op` if given."""
+    body = {"email": email, "password": PASSWORD}
+    if op is None:
+        response = await rec.client.post("/auth/signup", json=body)
+    else:
+        response = await rec.call(op, "POST", "/auth/signup", json=body)
+    response.raise_for_status()
+    token = response.json()["access_token"]
+    return BenchUser(int(jwt.get_unverified_claims(token)["sub"]), email, {"Authorization": f"Bearer {token}"})
+
+
+async def seed_images(user: BenchUser, count: int, content: bytes = None) -> list[int]:
+    """Insert image rows straight into the database, storing `content` for each when given."""
+    from app.core.storage import get_storage
+    from app.crud import image as image_crud
+    from app.db import SessionLocal
+    from app.schemas.image import ImageCreate
+
+    storage = get_storage()
+    images_in = []
+    for _ in range(count):
+        public_id = uuid.uuid4().hex
+        if content is not None:
+            await storage.upload_image(io.BytesIO(content), public_id)
+        images_in.append(ImageCreate(user_id=user.id, url=storage.get_image_url(public_id), public_id=public_id))
+    async with SessionLocal() as db:
+        return [image.id for image in await image_crud.create_images(db, images_in)]
+
+
+def _upload_files(content: bytes) -> dict:
+    return {"image_in": ("photo.jpg", content, "image/jpeg")}
+
+
+async def auth(rec: Recorder, seed: int, scale: float) -> None:
+    """A signup burst, then a login burst of five logins per user; both are dominated by bcrypt."""
+    users = _scaled(20, scale)
+    emails = [f"auth{i}@bench.example" for i in range(users)]
+    with rec.measure():
+        await _each(emails, 10, lambda email: signup(rec, email, "signup"))
+        await _each(
+            [emails[i % users] for i in range(users * 5)],
+            10,
+            lambda email: rec.call("login", "POST", "/auth/login", data={"username": email, "password": PASSWORD}),
+        )
+
+
+async def uploads(rec: Recorder, seed: int, scale: float) -> None:
+    """Concurrent 1-10 MB uploads from several users; every third one goes through the background queue."""
+    payloads = Uploads(seed)
+    users = [await signup(rec, f"upload{i}@bench.example") for i in range(5)]
+    count = _scaled(30, scale)
+
+    async def upload(i: int):
+        content = payloads.payload(1 * MB, 10 * MB - 1024)
+        if i % 3 == 2:
+            await rec.call("upload_async", "POST", "/images/upload/async", files=_upload_files(content), headers=users[i % 5].headers)
+        else:
+            await rec.call("upload", "POST", "/images/upload", files=_upload_files(content), headers=users[i % 5].headers)
+
+    with rec.measure():
+        await _each(range(count), 6, upload)
+
+
+async def listing(rec: Recorder, seed: int, scale: float) -> None:
+    """Clients walking every page of large libraries by cursor, plus deep offset pages."""
+    rng = random.Random(seed)
+    per_user = _scaled(1000, scale)
+    users = [await signup(rec, f"list{i}@bench.example") for i in range(4)]
+    for user in users:
+        await seed_images(user, per_user)
+
+    async def walk(i: int):
+        user, cursor = users[i % 4], None
+        while True:
+            params = {"limit": 50, **({"cursor": cursor} if cursor else {})}
+            response = await rec.call("list_cursor", "GET", "/images/", params=params, headers=user.headers)
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                return
+
+    offsets = [(users[i % 4], rng.randrange(0, max(1, per_user - 50))) for i in range(_scaled(40, scale))]
+    with rec.measure():
+        await _each(range(8), 8, walk)
+        await _each(
+            offsets,
+            8,
+            lambda item: rec.call("list_offset", "GET", "/images/", params={"skip": item[1], "limit": 50}, headers=item[0].headers),
+        )
+
+
+async def export(rec: Recorder, seed: int, scale: float) -> None:
+    """Full NDJSON exports of large libraries, and exports resumed from halfway through."""
+    per_user = _scaled(20000, scale)
+    users = [await signup(rec, f"export{i}@bench.example") for i in range(2)]
+    libraries = [(user, await seed_images(user, per_user)) for user in users]
+
+    async def full(user: BenchUser):
+        await rec.call("export", "GET", "/images/export", headers=user.headers)
+
+    async def resumed(item):
+        user, ids = item
+        await rec.call("export_resume", "GET", "/images/export", params={"after_id": ids[len(ids) // 2]}, headers=user.headers)
+
+    with rec.measure():
+        await _each(users * 2, 2, full)
+        await _each(libraries, 2, resumed)
+
+
+async def deletes(rec: Recorder, seed: int, scale: float) -> None:
+    """Single deletes of half of each library, then bulk deletes of the rest in batches of 25."""
+    per_user = _scaled(100, scale)
+    content = random.Random(seed).randbytes(64 * 1024)
+    users = [await signup(rec, f"delete{i}@bench.example") for i in range(4)]
+    libraries = [(user, await seed_images(user, per_user, content)) for user in users]
+
+    singles = [(user, image_id) for user, ids in libraries for image_id in ids[: per_user // 2]]
+    batches = [(user, ids[start:start + 25]) for user, ids in libraries for start in range(per_user // 2, per_user, 25)]
+    with rec.measure():
+        await _each(singles, 8, lambda item: rec.call("delete", "DELETE", f"/images/{item[1]}", headers=item[0].headers))
+        await _each(
+            batches,
+            4,
+            lambda item: rec.call("bulk_delete", "POST", "/images/bulk-delete", json={"ids": item[1]}, headers=item[0].headers),
+        )
+
+
+async def mixed(rec: Recorder, seed: int, scale: float) -> None:
+    """Eight clients each running a weighted mix of listing, reads, 1-3 MB uploads, logins and deletes."""
+    payloads = Uploads(seed)
+    content = random.Random(seed).randbytes(64 * 1024)
+    users = [await signup(rec, f"mixed{i}@bench.example") for i in range(8)]
+    libraries = {user.id: await seed_images(user, 50, content) for user in users}
+    ops = ["list", "get", "upload", "login", "delete"]
+    weights = [45, 20, 15, 10, 10]
+    count = _scaled(60, scale)
+
+    async def client(i: int):
+        rng = random.Random(seed + i)
+        user, library = users[i], libraries[users[i].id]
+        for _ in range(count):
+            op = rng.choices(ops, weights)[0]
+            if op == "list":
+                await rec.call("list", "GET", "/images/", params={"limit": 20}, headers=user.headers)
+            elif op == "get" and library:
+                await rec.call("get", "GET", f"/images/{rng.choice(library)}", headers=user.headers)
+            elif op == "upload":
+                response = await rec.call("upload", "POST", "/images/upload", files=_upload_files(payloads.payload(1 * MB, 3 * MB)), headers=user.headers)
+                if response.status_code == 200:
+                    library.append(response.json()["id"])
+            elif op == "login":
+                await rec.call("login", "POST", "/auth/login", data={"username": user.email, "password": PASSWORD})
+            elif op == "delete" and library:
+                await rec.call("delete", "DELETE", f"/images/{library.pop(rng.randrange(len(library)))}", headers=user.headers)
+
+    with rec.measure():
+        await _each(range(8), 8, client)
+
+
+SCENARIOS = {
+    "auth": auth,
+    "uploads": uploads,
+    "listing": listing,
+    "export": export,
+    "deletes": deletes,
+    "mixed": mixed,
+}
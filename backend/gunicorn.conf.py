@@ -0,0 +1,50 @@
+"""
+Production server settings: `gunicorn -c gunicorn.conf.py app.main:app`.
+
+Every worker is an asyncio (uvicorn) process, so one per CPU of the container's limit is
+enough; CPU-bound work already runs in the hashing and rendering process pools, which are
+split between the workers here instead of each sizing itself to the whole machine.
+"""
+import math
+import os
+import shutil
+
+from app.core.cpus import available_cpus
+
+cpus = available_cpus()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", max(1, math.ceil(cpus))))
+
+# Import the app once in the master and fork the workers from it: workers skip the import
+# and boot in the time their startup hooks take. Nothing opens a connection at import time
+# (the engine, Redis and storage clients connect lazily), so no socket is shared across forks.
+preload_app = True
+
+# On SIGTERM workers stop accepting, finish in-flight requests for up to graceful_timeout
+# seconds, then drain background uploads (UPLOAD_DRAIN_TIMEOUT_SECONDS, keep it shorter)
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))
+keepalive = int(os.getenv("KEEPALIVE", 5))
+accesslog = os.getenv("ACCESS_LOG") or None
+
+# Per-worker process pools sharing the CPU budget; must be set before the app is preloaded
+for _pool in ("PASSWORD_HASH_WORKERS", "RENDER_WORKERS"):
+    os.environ.setdefault(_pool, str(max(1, math.floor(cpus / workers))))
+
+# Let /metrics merge the histograms of every worker. The directory is emptied here, before the
+# app is preloaded, or the series of the previous run's workers would be merged in as well.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+
+def on_starting(server):
+    server.log.info("Sizing for %.2f CPUs: %d workers", cpus, workers)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)